@@ -14,8 +14,11 @@ def _ensure_src_on_path():
 
 _ensure_src_on_path()
 
-from remote_control.server_app import main  # noqa: E402
-
 
 if __name__ == "__main__":
+    # 导入放在入口判断内：捕获子进程以 spawn 启动时会重新执行本文件
+    # startup_timing 最先导入，--profile-startup 的计时从这里开始
+    from remote_control import startup_timing  # noqa: F401
+    from remote_control.server_app import main
+
     main()
@@ -1,5 +1,9 @@
 """Remote control application package."""
 
-from .server_app import main
-
 __all__ = ["main"]
+
+
+def main():
+    # 延迟导入：捕获子进程（spawn）只导入 capture_process，不加载服务端运行时
+    from .server_app import main as _main
+    return _main()
@@ -1,4 +1,5 @@
-from .server_app import main
-
 if __name__ == "__main__":
+    from . import startup_timing  # noqa: F401  计时起点
+    from .server_app import main
+
     main()
@@ -0,0 +1,250 @@
+"""
+asyncio 服务模式（可选，需要 aiohttp）
+python-socketio AsyncServer 挂在 aiohttp 上，Socket.IO 处理函数、aiortc、MJPEG 推流与统计接口
+共用同一个事件循环，不再有 Flask-SocketIO 的每连接线程与 WebRTC 事件循环线程之间的跨线程跳转。
+会阻塞的工作（DXGI 初始化、WebRTC 运行时准备、逐帧截图编码）显式交给线程池执行。
+
+处理逻辑与线程模式共用：会话事件来自 server_app.SESSION_EVENTS，输入事件来自
+server_app.INPUT_CHANNEL_HANDLERS，推送经 server_app.transport（这里替换为 AsyncTransport）。
+
+启用: python server.py --async  或  RC_SERVER_MODE=async
+"""
+
+import asyncio
+import json
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+try:
+    from aiohttp import web
+    import socketio as _socketio
+    from engineio.async_drivers import aiohttp as _eio_aiohttp
+    AIOHTTP_AVAILABLE = True
+except ImportError:
+    web = None
+    _socketio = None
+    _eio_aiohttp = None
+    AIOHTTP_AVAILABLE = False
+
+from . import server_app
+
+# 会调用阻塞操作的会话事件，在线程池中执行（xinput_connect 在 vgamepad 尚未加载时会等待加载）
+EXECUTOR_EVENTS = frozenset(('webrtc_offer', 'set_capture_mode', 'xinput_connect'))
+
+# 线程池大小：每个 MJPEG 观看者在取帧时占用一个线程
+WORKER_THREADS = max(2, int(os.getenv("RC_ASYNC_WORKERS", "8")))
+
+MJPEG_HEADERS = {
+    'Content-Type': 'multipart/x-mixed-replace; boundary=frame',
+    'Cache-Control': 'no-cache, no-store, must-revalidate',
+    'Pragma': 'no-cache',
+    'Expires': '0',
+}
+
+
+class AsyncTransport:
+    """AsyncServer 的推送与房间操作：在事件循环线程内直接创建任务，其它线程（光标采样、
+    显示几何刷新等）通过 run_coroutine_threadsafe 投递"""
+
+    def __init__(self, sio, loop):
+        self.sio = sio
+        self.loop = loop
+        self._loop_thread = threading.get_ident()
+
+    def _submit(self, coro):
+        if threading.get_ident() == self._loop_thread:
+            self.loop.create_task(coro)
+        else:
+            asyncio.run_coroutine_threadsafe(coro, self.loop)
+
+    def _call(self, result):
+        # python-socketio 5.10 起 AsyncServer.enter_room/leave_room 改为协程
+        if asyncio.iscoroutine(result):
+            self._submit(result)
+
+    def emit(self, event, payload=None, to=None):
+        self._submit(self.sio.emit(event, payload, to=to))
+
+    def remote_addr(self, sid):
+        # aiohttp 驱动的 environ 中 REMOTE_ADDR 固定为 127.0.0.1，取原始请求的对端地址
+        environ = self.sio.get_environ(sid) or {}
+        req = environ.get('aiohttp.request')
+        return req.remote if req is not None else None
+
+    def enter_room(self, sid, room):
+        self._call(self.sio.enter_room(sid, room, namespace='/'))
+
+    def leave_room(self, sid, room):
+        self._call(self.sio.leave_room(sid, room, namespace='/'))
+
+
+def _session_handler(fn, executor, blocking):
+    if blocking:
+        async def handler(sid, data=None):
+            await asyncio.get_running_loop().run_in_executor(executor, fn, sid, data)
+    else:
+        def handler(sid, data=None):
+            fn(sid, data)
+    return handler
+
+
+def _input_handler(fn):
+    def handler(sid, data=None):
+        fn(sid, data or {})
+    return handler
+
+
+def register_handlers(sio, executor):
+    """把线程模式的处理逻辑注册到 AsyncServer"""
+    events = dict(server_app.SESSION_EVENTS)
+    on_connect = events.pop('connect')
+    on_disconnect = events.pop('disconnect')
+
+    def connect(sid, environ, auth=None):
+        on_connect(sid, auth)
+
+    def disconnect(sid, *args):
+        on_disconnect(sid, None)
+
+    sio.on('connect', connect)
+    sio.on('disconnect', disconnect)
+    for name, fn in events.items():
+        sio.on(name, _session_handler(fn, executor, name in EXECUTOR_EVENTS))
+    for name, fn in server_app.INPUT_CHANNEL_HANDLERS.items():
+        sio.on(name, _input_handler(fn))
+
+
+SOCKETIO_PATH = '/socket.io/'
+_WEBSOCKET_KEY = 'rc.websocket'
+
+
+def _attach_socketio(app, sio):
+    """等同 sio.attach(app)，但 websocket 请求结束时总是返回 WebSocketResponse
+
+    python-engineio 4.8（requirements.txt 中的版本）升级 websocket 后不返回响应对象（4.9 起修复），
+    aiohttp 会把每次断开记录为 "Missing return statement on request handler" 并尝试回 500。
+    这里记下已就绪的 WebSocketResponse，处理函数返回 None 时补回；新版本 engine.io 下不起作用。
+    """
+    class WebSocket(_eio_aiohttp.WebSocket):
+        async def __call__(self, environ):
+            try:
+                return await super().__call__(environ)
+            finally:
+                environ['aiohttp.request'][_WEBSOCKET_KEY] = self._sock
+
+    sio.eio._async = dict(sio.eio._async, websocket=WebSocket)
+
+    async def handle_request(request):
+        response = await sio.handle_request(request)
+        if response is None:
+            response = request.get(_WEBSOCKET_KEY)
+        return response
+
+    for method in ('GET', 'POST', 'OPTIONS'):
+        app.router.add_route(method, SOCKETIO_PATH, handle_request)
+
+
+def _json(data):
+    return web.json_response(data, dumps=lambda obj: json.dumps(obj, ensure_ascii=False))
+
+
+def create_app(executor):
+    """创建 aiohttp 应用（调用方需已在事件循环中）"""
+    loop = asyncio.get_running_loop()
+    sio = _socketio.AsyncServer(async_mode='aiohttp', cors_allowed_origins='*', async_handlers=False,
+                                logger=False, engineio_logger=False)
+    app = web.Application()
+    _attach_socketio(app, sio)
+
+    server_app.transport = AsyncTransport(sio, loop)
+    # aiortc 直接运行在本事件循环上，ensure_webrtc_runtime 不再另起 WebRTCLoop 线程
+    server_app.webrtc_loop = loop
+    register_handlers(sio, executor)
+
+    index_path = os.path.join(server_app.TEMPLATE_DIR, 'index.html')
+
+    async def index(request):
+        return web.FileResponse(index_path)
+
+    async def video(request):
+        response = web.StreamResponse(headers=MJPEG_HEADERS)
+        await response.prepare(request)
+        stream = server_app.generate_video_stream(server_app.sessions.get(request.query.get('sid')))
+        try:
+            while True:
+                chunk = await loop.run_in_executor(executor, next, stream, None)
+                if chunk is None:
+                    break
+                await response.write(chunk)
+        except (ConnectionResetError, asyncio.CancelledError):
+            pass
+        finally:
+            stream.close()
+        return response
+
+    async def pipeline_stats(request):
+        # 与 /api/metrics 相同，在线程池中生成，不占用本事件循环
+        return _json(await loop.run_in_executor(executor, server_app.pipeline_stats))
+
+    async def input_stats(request):
+        return _json(server_app.input_stats())
+
+    async def server_info(request):
+        return _json(server_app.server_info())
+
+    async def metrics_endpoint(request):
+        # 读取 peer 码率需要等待本事件循环上的 getStats，必须在线程池中生成
+        body, content_type = await loop.run_in_executor(
+            executor, server_app.render_metrics, request.query.get('format', 'prometheus'))
+        return web.Response(body=body.encode('utf-8'), headers={'Content-Type': content_type})
+
+    def admin_endpoint(handler):
+        # 采样 / 录制会阻塞 N 秒，在线程池中执行
+        async def endpoint(request):
+            token = request.query.get('token') or request.headers.get('X-RC-Admin-Token')
+            if not server_app.is_admin_request(request.remote, token):
+                return web.json_response({'error': 'forbidden'}, status=403)
+            status, body, content_type = await loop.run_in_executor(executor, handler, request.query)
+            return web.Response(status=status, body=body.encode('utf-8'), headers={'Content-Type': content_type})
+        return endpoint
+
+    app.router.add_get('/', index)
+    app.router.add_get('/video', video)
+    app.router.add_get('/api/pipeline_stats', pipeline_stats)
+    app.router.add_get('/api/input_stats', input_stats)
+    app.router.add_get('/api/info', server_info)
+    app.router.add_get('/api/metrics', metrics_endpoint)
+    app.router.add_get('/api/profile', admin_endpoint(server_app.run_profile))
+    app.router.add_get('/api/trace', admin_endpoint(server_app.run_trace))
+    app.router.add_static('/static', server_app.STATIC_DIR)
+    return app
+
+
+def run(host='0.0.0.0', port=5000, on_listening=None):
+    """以 asyncio 模式运行服务（阻塞直到退出），端口绑定后调用 on_listening()"""
+    if not AIOHTTP_AVAILABLE:
+        raise RuntimeError("asyncio 服务模式需要 aiohttp: python -m pip install aiohttp")
+
+    executor = ThreadPoolExecutor(max_workers=WORKER_THREADS, thread_name_prefix="AsyncWorker")
+
+    async def _serve():
+        app = create_app(executor)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, host, port)
+        await site.start()
+        print(f"[服务] asyncio 模式（aiohttp），线程池 {WORKER_THREADS} 个线程")
+        if on_listening is not None:
+            on_listening()
+        try:
+            await asyncio.Event().wait()
+        finally:
+            await runner.cleanup()
+
+    try:
+        asyncio.run(_serve())
+    except KeyboardInterrupt:
+        pass
+    finally:
+        executor.shutdown(wait=False)
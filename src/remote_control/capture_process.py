@@ -0,0 +1,385 @@
+"""
+独立捕获进程 - 捕获、RGB 转换与 JPEG 编码放到工作进程，与控制进程的 GIL 隔离
+控制进程（Flask / Socket.IO 输入处理 / aiortc）在编码满载时仍能及时处理输入。
+
+原始帧经 multiprocessing.shared_memory 环形缓冲交接：
+    头部  int64[1 + 槽位数 * 4]：最新序号，随后每个槽位 (序号, 高, 宽, 捕获时间 ns)
+    数据  槽位数 * 每槽字节数（RGB24）
+工作进程写入槽位 seq % 槽位数，写完数据后再写槽位序号与最新序号；
+读取方复制数据后重新检查槽位序号，被覆盖则重读（seqlock）。
+
+MJPEG 帧通过管道按需请求：控制进程发送 ('jpeg', 请求号, 画质, 区域)，
+工作进程用最新帧编码后回传 ('jpeg', 请求号, 序号, 字节)。
+延迟探针开启时（('probe', True)）工作进程在每帧左上角写入捕获时刻的时间条码（frame_marker.py），
+perf_counter 是全系统单调时钟，控制进程可直接计算帧龄。
+
+本模块只依赖标准库、NumPy 与合成画面来源，工作进程以 spawn 方式启动时不会导入 server_app。
+"""
+
+import io
+import multiprocessing
+import os
+import threading
+import time
+
+import numpy as np
+
+from . import frame_marker, metrics, profiler
+from .synthetic_source import SyntheticSource
+
+HEADER_FIELDS = 4
+DEFAULT_SLOTS = 3
+
+
+class SharedFrameRing:
+    """共享内存帧环（创建方负责 unlink）"""
+
+    def __init__(self, name=None, slots=DEFAULT_SLOTS, slot_bytes=0, create=False):
+        from multiprocessing import shared_memory
+
+        header_bytes = (1 + slots * HEADER_FIELDS) * 8
+        if create:
+            self.shm = shared_memory.SharedMemory(create=True, size=header_bytes + slots * slot_bytes)
+        else:
+            # spawn 子进程与创建方共用同一个 resource_tracker，附加时的重复登记由创建方 unlink 时一并注销
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.slots = slots
+        self.slot_bytes = slot_bytes
+        self._owner = create
+        buf = self.shm.buf
+        self._header = np.ndarray((1 + slots * HEADER_FIELDS,), dtype=np.int64, buffer=buf)
+        self._meta = self._header[1:].reshape(slots, HEADER_FIELDS)
+        self._data = np.ndarray((slots, slot_bytes), dtype=np.uint8, buffer=buf, offset=header_bytes)
+        if create:
+            self._header[:] = 0
+
+    def latest_seq(self):
+        header = self._header
+        return int(header[0]) if header is not None else 0
+
+    def write(self, seq, frame, captured_ns):
+        """写入一帧（H x W x 3 uint8），超出槽位大小返回 False"""
+        h, w = frame.shape[:2]
+        nbytes = h * w * 3
+        if nbytes > self.slot_bytes:
+            return False
+        slot = seq % self.slots
+        meta = self._meta[slot]
+        meta[0] = 0  # 写入中
+        self._data[slot, :nbytes] = frame.reshape(-1)
+        meta[1], meta[2], meta[3] = h, w, captured_ns
+        meta[0] = seq
+        self._header[0] = seq
+        return True
+
+    def read(self, retries=3):
+        """读取最新帧的副本：(序号, 帧, 捕获时间秒)，尚无帧或已关闭时返回 (0, None, 0.0)"""
+        # 取局部引用：其他线程 close() 后本次读取仍使用原缓冲（引用存在时共享内存不会被解除映射）
+        header, all_meta, data = self._header, self._meta, self._data
+        if header is None or all_meta is None or data is None:
+            return 0, None, 0.0
+        for _ in range(retries):
+            seq = int(header[0])
+            if seq <= 0:
+                return 0, None, 0.0
+            meta = all_meta[seq % self.slots]
+            if int(meta[0]) != seq:
+                continue
+            h, w, captured_ns = int(meta[1]), int(meta[2]), int(meta[3])
+            frame = data[seq % self.slots, :h * w * 3].copy()
+            if int(meta[0]) == seq:
+                return seq, frame.reshape(h, w, 3), captured_ns / 1e9
+        return 0, None, 0.0
+
+    def close(self):
+        self._header = self._meta = self._data = None
+        try:
+            self.shm.close()
+        except Exception:
+            pass
+        if self._owner:
+            try:
+                self.shm.unlink()
+            except Exception:
+                pass
+
+
+# ============ 工作进程 ============
+
+class _MssSource:
+    def __init__(self):
+        import mss
+        self.inst = mss.mss()
+        self.monitor = self.inst.monitors[0]  # 与控制进程的 mss 路径一致：整个虚拟桌面
+
+    def grab(self):
+        shot = self.inst.grab(self.monitor)
+        bgra = np.frombuffer(shot.bgra, dtype=np.uint8).reshape((shot.height, shot.width, 4))
+        return np.ascontiguousarray(bgra[:, :, [2, 1, 0]])
+
+
+class _DxgiSource:
+    def __init__(self, target_fps):
+        import dxcam
+        self.camera = dxcam.create(output_color="RGB")
+        self.camera.start(target_fps=target_fps)
+
+    def grab(self):
+        frame = self.camera.get_latest_frame()
+        return None if frame is None else np.ascontiguousarray(frame[:, :, :3])
+
+
+def _open_source(source, size, fps):
+    if source == 'dxgi':
+        try:
+            return _DxgiSource(fps)
+        except Exception as e:
+            print(f"[捕获进程] DXGI 不可用，改用 mss: {e}")
+            source = 'mss'
+    if source == 'mss':
+        try:
+            return _MssSource()
+        except Exception as e:
+            print(f"[捕获进程] mss 不可用，改用合成画面: {e}")
+    return SyntheticSource(*size, content=os.getenv("RC_SYNTHETIC_CONTENT", "gradient"))
+
+
+def _encode_jpeg(frame, quality, region, probe=False):
+    from PIL import Image
+
+    if region:
+        x, y, w, h = region
+        full = frame
+        frame = frame[y:y + h, x:x + w, :]
+        if probe and (x or y):
+            frame = frame.copy()
+            frame_marker.carry(full, frame)
+    buffer = io.BytesIO()
+    Image.fromarray(frame).save(buffer, format='JPEG', quality=quality, optimize=False, progressive=False)
+    return buffer.getvalue()
+
+
+def worker_main(ring_name, slots, slot_bytes, conn, source, size, fps, probe=False, base_seq=0):
+    """工作进程入口：按目标帧率捕获写入共享环，空闲时处理管道上的 JPEG 请求
+
+    序号从 base_seq 之后继续，重启前后单调递增（派生帧缓存等按序号去重与淘汰）。
+    """
+    ring = SharedFrameRing(ring_name, slots, slot_bytes)
+    capture = _open_source(source, size, fps)
+    interval = 1.0 / max(1, fps)
+    seq = base_seq
+    latest = None
+    skipped = 0
+    next_tick = time.perf_counter()
+    try:
+        while True:
+            now = time.perf_counter()
+            if now >= next_tick:
+                next_tick = max(next_tick + interval, now)
+                captured_ns = time.time_ns()
+                t0 = time.perf_counter()
+                frame = capture.grab()
+                if frame is not None:
+                    if probe:
+                        frame_marker.stamp(frame, frame_marker.now_value())
+                    seq += 1
+                    latest = frame
+                    if ring.write(seq, frame, captured_ns):
+                        conn.send(('captured', (time.perf_counter() - t0) * 1000.0))
+                    else:
+                        skipped += 1
+                        if skipped == 1:
+                            conn.send(('oversize', frame.shape[1], frame.shape[0]))
+
+            if not conn.poll(max(0.0, next_tick - time.perf_counter())):
+                continue
+            msg = conn.recv()
+            if msg[0] == 'stop':
+                break
+            if msg[0] == 'fps':
+                interval = 1.0 / max(1, int(msg[1]))
+            elif msg[0] == 'probe':
+                probe = bool(msg[1])
+            elif msg[0] == 'jpeg':
+                _, request_id, quality, region = msg
+                data = _encode_jpeg(latest, quality, region, probe) if latest is not None else b''
+                conn.send(('jpeg', request_id, seq, data))
+    except (EOFError, BrokenPipeError, KeyboardInterrupt):
+        pass
+    finally:
+        ring.close()
+
+
+# ============ 控制进程 ============
+
+class CaptureProcess:
+    """捕获工作进程的控制端，接口与 WebRTCFramePump 相同（start / stop / get_latest_entry / wait_newer）
+
+    Args:
+        size: 帧尺寸上限 (宽, 高)，决定共享环槽位大小；显示器变化后需 restart()
+        source: 'dxgi' / 'mss' / 'synthetic'
+        fps: 捕获帧率
+        probe: 是否在帧内写入延迟探针时间条码
+    """
+
+    def __init__(self, size, source='mss', fps=60, slots=DEFAULT_SLOTS, probe=False):
+        self.size = tuple(size)
+        self.source = source
+        self.fps = fps
+        self.probe = probe
+        self.slots = slots
+        self._lock = threading.Lock()
+        self._send_lock = threading.Lock()
+        self._ring = None
+        self._proc = None
+        self._conn = None
+        self._reader = None
+        self._running = False
+        self._last = (0, None, 0.0)
+        self._last_seq = 0
+        self._requests = {}
+        self._request_id = 0
+
+        self.capture_hist = metrics.get_histogram('webrtc.capture_ms')
+        self.jpeg_hist = metrics.get_histogram('capture_process.jpeg_roundtrip_ms')
+        self.read_hist = metrics.get_histogram('capture_process.ring_read_ms')
+
+    def start(self):
+        with self._lock:
+            if self._running:
+                return
+            width, height = self.size
+            slot_bytes = width * height * 3
+            self._ring = SharedFrameRing(slots=self.slots, slot_bytes=slot_bytes, create=True)
+            ctx = multiprocessing.get_context('spawn')
+            parent, child = ctx.Pipe()
+            self._proc = ctx.Process(
+                target=worker_main, name="CaptureWorker", daemon=True,
+                args=(self._ring.name, self.slots, slot_bytes, child, self.source, self.size, self.fps,
+                      self.probe, self._last_seq))
+            self._proc.start()
+            child.close()
+            self._conn = parent
+            self._running = True
+            self._reader = threading.Thread(target=self._read_pipe, daemon=True, name="CaptureProcessPipe")
+            self._reader.start()
+            print(f"[捕获进程] 已启动 pid={self._proc.pid}，来源 {self.source}，{width}x{height}")
+
+    def stop(self):
+        with self._lock:
+            if not self._running:
+                return
+            self._running = False
+            try:
+                with self._send_lock:
+                    self._conn.send(('stop',))
+            except Exception:
+                pass
+            self._proc.join(2.0)
+            if self._proc.is_alive():
+                self._proc.terminate()
+            self._conn.close()
+            # 先摘下再关闭：WebRTC / MJPEG 线程读到 None 时直接返回上一帧
+            ring, self._ring = self._ring, None
+            self._last_seq = max(self._last_seq, ring.latest_seq())
+            ring.close()
+            self._last = (0, None, 0.0)
+            for waiter in list(self._requests.values()):
+                waiter[0].set()
+
+    def restart(self, size=None):
+        self.stop()
+        if size is not None:
+            self.size = tuple(size)
+        self.start()
+
+    def is_running(self):
+        return self._running
+
+    def set_fps(self, fps):
+        self.fps = fps
+        self._send(('fps', fps))
+
+    def set_probe(self, enabled):
+        self.probe = bool(enabled)
+        self._send(('probe', self.probe))
+
+    def _send(self, msg):
+        if not self._running:
+            return False
+        try:
+            with self._send_lock:
+                self._conn.send(msg)
+            return True
+        except Exception:
+            return False
+
+    def _read_pipe(self):
+        conn = self._conn
+        while self._running:
+            try:
+                msg = conn.recv()
+            except (EOFError, OSError):
+                break
+            if msg[0] == 'captured':
+                self.capture_hist.observe(msg[1])
+                # 工作进程中的捕获耗时，时间线上以收到通知的时刻作为结束（近似）
+                now = time.perf_counter()
+                profiler.span('capture', now - msg[1] / 1000.0, now, lane='CaptureWorker')
+            elif msg[0] == 'jpeg':
+                waiter = self._requests.pop(msg[1], None)
+                if waiter is not None:
+                    waiter[1] = msg[3]
+                    waiter[0].set()
+            elif msg[0] == 'oversize':
+                print(f"[捕获进程] 帧尺寸 {msg[1]}x{msg[2]} 超出共享环槽位，等待重启")
+
+    # ---------- 原始帧（WebRTC） ----------
+
+    def get_latest_entry(self):
+        """返回 (序号, 帧, 捕获时间)；同一序号只从共享内存复制一次"""
+        ring = self._ring
+        if ring is None:
+            return self._last
+        seq = ring.latest_seq()
+        if seq == self._last[0]:
+            return self._last
+        t0 = time.perf_counter()
+        entry = ring.read()
+        if entry[1] is not None:
+            self.read_hist.observe((time.perf_counter() - t0) * 1000.0)
+            self._last = entry
+        return self._last
+
+    def get_latest(self):
+        return self.get_latest_entry()[1]
+
+    def wait_newer(self, seq, timeout):
+        """等待比 seq 更新的帧（轮询共享环序号），超时则返回当前最新帧"""
+        deadline = time.perf_counter() + timeout
+        while self._running:
+            ring = self._ring
+            if ring is None or ring.latest_seq() != seq or time.perf_counter() >= deadline:
+                break
+            time.sleep(0.001)
+        return self.get_latest_entry()
+
+    # ---------- JPEG（MJPEG） ----------
+
+    def encode_jpeg(self, quality, region=None, timeout=1.0):
+        """请求工作进程用最新帧编码 JPEG，失败返回 None"""
+        with self._lock:
+            self._request_id += 1
+            request_id = self._request_id
+        waiter = [threading.Event(), None]
+        self._requests[request_id] = waiter
+        t0 = time.perf_counter()
+        if not self._send(('jpeg', request_id, int(quality), tuple(region) if region else None)):
+            self._requests.pop(request_id, None)
+            return None
+        if not waiter[0].wait(timeout):
+            self._requests.pop(request_id, None)
+            return None
+        self.jpeg_hist.observe((time.perf_counter() - t0) * 1000.0)
+        return waiter[1] or None
@@ -0,0 +1,132 @@
+"""
+视频编码器能力探测
+在真实捕获分辨率下对候选编码器做短时基准测试，选出本机能实时编码的编码器，
+代替固定的 H.264 优先策略
+"""
+
+import threading
+import time
+
+import numpy as np
+
+from . import metrics
+
+# 候选编码器（aiortc 支持的视频编码名称）
+CANDIDATE_CODECS = ('H264', 'VP8')
+BENCH_FRAMES = 8          # 计时帧数（不含首帧打开编码器）
+BENCH_PTS_STEP = 1500     # 90kHz 时钟下 60fps 的一帧
+REALTIME_HEADROOM = 0.8   # 平均编码耗时需低于帧间隔的 80% 才算实时
+
+_lock = threading.Lock()
+_selection = None
+
+
+def create_encoder(name):
+    """按编码名称创建 aiortc 编码器"""
+    if name == 'H264':
+        from aiortc.codecs.h264 import H264Encoder
+        return H264Encoder()
+    from aiortc.codecs.vpx import Vp8Encoder
+    return Vp8Encoder()
+
+
+def _bench_frames(frame, count):
+    """生成整屏滚动的测试帧（比静态桌面更苛刻，结果偏保守）"""
+    from av import VideoFrame
+    from aiortc.mediastreams import VIDEO_TIME_BASE
+
+    frames = []
+    for i in range(count):
+        vf = VideoFrame.from_ndarray(np.roll(frame, i * 16, axis=0), format="rgb24").reformat(format="yuv420p")
+        # pts 取负值，基准测试用过的编码器还能作为预热编码器继续使用
+        vf.pts = (i - count) * BENCH_PTS_STEP
+        vf.time_base = VIDEO_TIME_BASE
+        frames.append(vf)
+    return frames
+
+
+def benchmark_encoder(name, frames):
+    """对单个编码器计时，返回 (编码器, 平均耗时毫秒, 打开耗时毫秒)"""
+    encoder = create_encoder(name)
+    t = time.perf_counter()
+    encoder.encode(frames[0], force_keyframe=True)
+    open_ms = (time.perf_counter() - t) * 1000.0
+
+    hist = metrics.get_histogram(f'webrtc.codec_bench.{name.lower()}_ms')
+    total = 0.0
+    for vf in frames[1:]:
+        t = time.perf_counter()
+        encoder.encode(vf)
+        elapsed_ms = (time.perf_counter() - t) * 1000.0
+        hist.observe(elapsed_ms)
+        total += elapsed_ms
+    return encoder, total / max(1, len(frames) - 1), open_ms
+
+
+def select_codec(frame, target_fps):
+    """按实际帧做基准测试并选择编码器
+
+    能实时编码的候选里取平均耗时最短者；都达不到实时时取最快的一个。
+    返回 (选择结果字典, 胜出的已打开编码器)，编码器可直接作为预热编码器使用。
+    """
+    global _selection
+    budget_ms = 1000.0 / max(1, int(target_fps))
+    frames = _bench_frames(frame, BENCH_FRAMES + 1)
+
+    results = {}
+    encoders = {}
+    for name in CANDIDATE_CODECS:
+        try:
+            encoder, avg_ms, open_ms = benchmark_encoder(name, frames)
+        except Exception as e:
+            results[name] = {'error': str(e)}
+            continue
+        encoders[name] = encoder
+        results[name] = {
+            'avg_ms': round(avg_ms, 2),
+            'open_ms': round(open_ms, 1),
+            'realtime': avg_ms <= budget_ms * REALTIME_HEADROOM,
+        }
+
+    timed = [n for n in CANDIDATE_CODECS if 'avg_ms' in results[n]]
+    if not timed:
+        raise RuntimeError('no_video_encoder')
+    realtime = [n for n in timed if results[n]['realtime']] or timed
+    chosen = min(realtime, key=lambda n: results[n]['avg_ms'])
+
+    selection = {
+        'codec': chosen,
+        'resolution': f"{frame.shape[1]}x{frame.shape[0]}",
+        'target_fps': int(target_fps),
+        'results': results,
+    }
+    with _lock:
+        _selection = selection
+    return selection, encoders[chosen]
+
+
+def get_selection():
+    """最近一次选择结果（尚未测试时为 None）"""
+    with _lock:
+        return _selection
+
+
+def selected_codec(resolution=None):
+    """已选编码器名称；分辨率变化或尚未测试时返回 None"""
+    selection = get_selection()
+    if selection is None:
+        return None
+    if resolution is not None and selection['resolution'] != resolution:
+        return None
+    return selection['codec']
+
+
+def codec_preferences(codecs, preferred):
+    """把首选编码器排在最前，其余（含 rtx）保持原顺序作为协商回退"""
+    if not preferred:
+        return list(codecs)
+    preferred = preferred.upper()
+    first = [c for c in codecs if (c.name or "").upper() == preferred]
+    if not first:
+        return list(codecs)
+    return first + [c for c in codecs if c not in first]
@@ -0,0 +1,74 @@
+"""
+光标位置推送
+服务端按固定频率采样光标位置，只在位置变化时向所有订阅的客户端广播一次，
+代替每个客户端每 50ms 请求一次 get_mouse_pos
+"""
+
+import threading
+import time
+
+from . import metrics
+
+
+class CursorWatcher:
+    """光标采样线程
+
+    get_pos() 返回 (x, y)；broadcast(x, y) 负责一次性发送给所有订阅者。
+    有订阅者时才运行采样线程，最后一个订阅者离开后线程退出。
+    """
+
+    def __init__(self, get_pos, broadcast, rate_hz=60, name="CursorWatcher"):
+        self._get_pos = get_pos
+        self._broadcast = broadcast
+        self.interval = 1.0 / max(1, int(rate_hz))
+        self._name = name
+        self._lock = threading.Lock()
+        self._subscribers = set()
+        self._thread = None
+        self._stop = None
+        self.last_pos = None
+
+        self.broadcast_counter = metrics.get_counter('cursor.broadcasts')
+        self.sample_counter = metrics.get_counter('cursor.samples')
+
+    def subscribe(self, sid):
+        with self._lock:
+            self._subscribers.add(sid)
+            # 新订阅者需要拿到当前位置，清空缓存让下一次采样必定广播
+            self.last_pos = None
+            if self._thread is None:
+                # 每个线程使用独立的停止事件，避免旧线程尚未退出时被重新唤醒
+                self._stop = threading.Event()
+                self._thread = threading.Thread(target=self._run, args=(self._stop,), daemon=True, name=self._name)
+                self._thread.start()
+
+    def unsubscribe(self, sid):
+        with self._lock:
+            self._subscribers.discard(sid)
+            if not self._subscribers and self._thread is not None:
+                self._stop.set()
+                self._thread = None
+
+    def subscriber_count(self):
+        return len(self._subscribers)
+
+    def _run(self, stop):
+        next_tick = time.perf_counter()
+        while not stop.is_set():
+            try:
+                pos = self._get_pos()
+                self.sample_counter.inc()
+                if pos != self.last_pos:
+                    self.last_pos = pos
+                    self._broadcast(pos[0], pos[1])
+                    self.broadcast_counter.inc()
+            except Exception as e:
+                print(f"[光标] 采样失败: {e}")
+
+            next_tick += self.interval
+            delay = next_tick - time.perf_counter()
+            if delay > 0:
+                stop.wait(delay)
+            else:
+                # 落后时不追帧
+                next_tick = time.perf_counter()
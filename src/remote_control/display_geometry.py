@@ -0,0 +1,211 @@
+"""
+显示几何信息缓存
+主屏尺寸、虚拟桌面、各显示器矩形、DPI 缩放与局域网 IP 集中保存在一个不可变快照中，
+处理函数与采集/缩放阶段直接读取 current()（只是一次属性读取，无锁）。
+后台线程定期做一次廉价检查（几次 GetSystemMetrics），变化时重新探测并通知监听者，
+代替每个事件调用 pyautogui.size() / GetSystemMetrics、每次请求新建 UDP 套接字查询 IP。
+"""
+
+import collections
+import ctypes
+import os
+import socket
+import threading
+import time
+
+# GetSystemMetrics 索引
+SM_CXSCREEN = 0
+SM_CYSCREEN = 1
+SM_XVIRTUALSCREEN = 76
+SM_YVIRTUALSCREEN = 77
+SM_CXVIRTUALSCREEN = 78
+SM_CYVIRTUALSCREEN = 79
+SM_CMONITORS = 80
+
+LOGPIXELSX = 88
+
+DisplayInfo = collections.namedtuple('DisplayInfo', [
+    'width', 'height',   # 主屏（物理像素）
+    'virtual',           # 虚拟桌面 (x, y, w, h)
+    'monitors',          # 各显示器 ((x, y, w, h), ...)，主屏在前
+    'dpi_scale',         # 系统 DPI / 96
+    'version',           # 每次几何变化 +1，缓存方据此失效
+])
+
+
+def _probe_local_ip():
+    """获取本机局域网IP（UDP connect 不发包，只用来确定出口网卡）"""
+    try:
+        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        try:
+            s.connect(("8.8.8.8", 80))
+            return s.getsockname()[0]
+        finally:
+            s.close()
+    except Exception:
+        return "127.0.0.1"
+
+
+def set_dpi_awareness():
+    """设置进程 DPI 感知，之后 GetSystemMetrics / GetCursorPos / SetCursorPos 均为物理像素
+
+    须在第一次读取几何信息之前调用；重复调用无副作用（已设置时系统返回错误，忽略即可）。
+    """
+    try:
+        ctypes.windll.shcore.SetProcessDpiAwareness(1)  # PROCESS_SYSTEM_DPI_AWARE
+    except Exception:
+        try:
+            ctypes.windll.user32.SetProcessDPIAware()
+        except Exception:
+            pass
+
+
+class _WindowsProbe:
+    """Win32 探测：创建时先设置 DPI 感知，拿到的是物理像素
+
+    输入后端延迟创建，不能依赖它设置：否则第一次读到的是 DPI 虚拟化后的逻辑像素，
+    输入后端创建后尺寸“变化”会误触发一次显示变化处理（释放 DXGI、重启采集进程）。
+    """
+
+    def __init__(self):
+        set_dpi_awareness()
+        self.user32 = ctypes.windll.user32
+        self.gdi32 = ctypes.windll.gdi32
+
+    def signature(self):
+        """廉价检查用的特征值：主屏 + 虚拟桌面 + 显示器数量"""
+        m = self.user32.GetSystemMetrics
+        return (m(SM_CXSCREEN), m(SM_CYSCREEN), m(SM_XVIRTUALSCREEN), m(SM_YVIRTUALSCREEN),
+                m(SM_CXVIRTUALSCREEN), m(SM_CYVIRTUALSCREEN), m(SM_CMONITORS))
+
+    def monitors(self):
+        from ctypes import wintypes
+
+        rects = []
+        proc_type = ctypes.WINFUNCTYPE(wintypes.BOOL, wintypes.HMONITOR, wintypes.HDC,
+                                       ctypes.POINTER(wintypes.RECT), wintypes.LPARAM)
+
+        def callback(hmonitor, hdc, rect, lparam):
+            r = rect.contents
+            rects.append((r.left, r.top, r.right - r.left, r.bottom - r.top))
+            return True
+
+        self.user32.EnumDisplayMonitors(None, None, proc_type(callback), 0)
+        # 主屏原点为 (0, 0)，排在最前
+        rects.sort(key=lambda r: (r[0] != 0 or r[1] != 0, r[1], r[0]))
+        return tuple(rects)
+
+    def dpi_scale(self):
+        try:
+            return self.user32.GetDpiForSystem() / 96.0
+        except Exception:
+            hdc = self.user32.GetDC(None)
+            try:
+                return self.gdi32.GetDeviceCaps(hdc, LOGPIXELSX) / 96.0
+            finally:
+                self.user32.ReleaseDC(None, hdc)
+
+
+class DisplayGeometry:
+    """显示几何信息服务
+
+    Args:
+        fallback_size: 非 Windows 环境下返回 (宽, 高) 的函数（如输入后端的虚拟屏幕）
+        interval: 廉价检查间隔（秒）
+        ip_interval: 局域网 IP 重新探测间隔（秒）
+    """
+
+    def __init__(self, fallback_size=None, interval=2.0, ip_interval=30.0):
+        self._fallback_size = fallback_size
+        self.interval = interval
+        self.ip_interval = ip_interval
+        self._probe = None
+        if os.name == 'nt':
+            try:
+                self._probe = _WindowsProbe()
+            except Exception as e:
+                print(f"[显示] Win32 探测不可用: {e}")
+        self._listeners = []
+        self._lock = threading.Lock()
+        self._thread = None
+        self._signature = None
+        self._info = self._read(0)
+        self._local_ip = _probe_local_ip()
+        self._ip_checked = time.monotonic()
+
+    def current(self):
+        """当前几何快照（DisplayInfo）"""
+        return self._info
+
+    def screen_size(self):
+        info = self._info
+        return info.width, info.height
+
+    def local_ip(self):
+        return self._local_ip
+
+    def add_listener(self, fn):
+        """几何变化时以 fn(旧快照, 新快照) 回调（在刷新线程中执行）"""
+        self._listeners.append(fn)
+
+    def start(self):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="DisplayGeometry")
+                self._thread.start()
+
+    def refresh(self):
+        """立即检查一次，几何变化时返回新快照，否则返回 None"""
+        with self._lock:
+            signature = self._read_signature()
+            if signature == self._signature:
+                return None
+            old = self._info
+            new = self._read(old.version + 1)
+            if new[:-1] == old[:-1]:
+                return None
+            self._info = new
+
+        print(f"[显示] 几何变化: {old.width}x{old.height} -> {new.width}x{new.height}，"
+              f"{len(new.monitors)} 个显示器，DPI 缩放 {new.dpi_scale:g}")
+        for fn in list(self._listeners):
+            try:
+                fn(old, new)
+            except Exception as e:
+                print(f"[显示] 通知失败: {e}")
+        return new
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            try:
+                self.refresh()
+                if time.monotonic() - self._ip_checked >= self.ip_interval:
+                    self._local_ip = _probe_local_ip()
+                    self._ip_checked = time.monotonic()
+            except Exception as e:
+                print(f"[显示] 刷新失败: {e}")
+
+    def _read_signature(self):
+        if self._probe is not None:
+            return self._probe.signature()
+        return tuple(self._fallback_size()) if self._fallback_size else None
+
+    def _read(self, version):
+        signature = self._read_signature()
+        self._signature = signature
+        if self._probe is not None:
+            width, height, vx, vy, vw, vh, _ = signature
+            try:
+                monitors = self._probe.monitors()
+            except Exception:
+                monitors = ((0, 0, width, height),)
+            try:
+                dpi_scale = self._probe.dpi_scale()
+            except Exception:
+                dpi_scale = 1.0
+            return DisplayInfo(width, height, (vx, vy, vw, vh), monitors, dpi_scale, version)
+
+        width, height = signature if signature else (1920, 1080)
+        rect = (0, 0, width, height)
+        return DisplayInfo(width, height, rect, (rect,), 1.0, version)
@@ -0,0 +1,76 @@
+"""
+派生帧缓存 - 共享捕获帧按 (缩放, 区域) 派生的画面每个捕获序号只计算一次
+多个 WebRTC 会话使用相同推流配置时共用同一份裁剪/缩放结果；
+配置不同的会话各自派生，互不影响。只保留最近两个捕获序号的结果。
+"""
+
+import threading
+import time
+
+import numpy as np
+
+from . import frame_marker, metrics, profiler
+
+KEEP_SEQS = 2
+
+
+def derive_frame(frame, scale=1.0, region=None, marker=False):
+    """裁剪区域后按整数步长抽取缩放（0.5 -> 隔行隔列）
+
+    marker 为 True（延迟探针开启）时把整帧左上角的时间条码复制到裁剪后画面的左上角
+    """
+    if region is not None:
+        x, y, w, h = region
+        full = frame
+        frame = frame[y:y + h, x:x + w, :]
+        if marker and (x or y):
+            # 裁剪结果可能是共享帧的视图，先复制再写入
+            frame = frame.copy()
+            frame_marker.carry(full, frame)
+    step = max(1, int(round(1.0 / scale))) if scale > 0 else 1
+    if step > 1:
+        frame = frame[::step, ::step, :]
+    if frame.flags["C_CONTIGUOUS"]:
+        return frame
+    return np.ascontiguousarray(frame)
+
+
+class ScaledFrameCache:
+    """按 (捕获序号, 缩放, 区域) 缓存派生帧"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._frames = {}
+        self._newest = 0
+        self.scale_hist = metrics.get_histogram('webrtc.scale_ms')
+        self.hit_counter = metrics.get_counter('webrtc.scale_cache_hits')
+        self.miss_counter = metrics.get_counter('webrtc.scale_cache_misses')
+
+    def get(self, seq, frame, scale=1.0, region=None, marker=False):
+        if frame is None or (region is None and scale >= 1.0):
+            return frame
+        key = (seq, scale, region)
+        # 在锁内计算：相同配置的并发请求只计算一次（单次抽取仅数毫秒）
+        with self._lock:
+            cached = self._frames.get(key)
+            if cached is not None:
+                self.hit_counter.inc()
+                return cached
+            self.miss_counter.inc()
+            t0 = time.perf_counter()
+            derived = derive_frame(frame, scale, region, marker)
+            t1 = time.perf_counter()
+            self.scale_hist.observe((t1 - t0) * 1000.0)
+            profiler.span('scale', t0, t1, seq=seq, scale=scale)
+            if seq > self._newest:
+                self._newest = seq
+                oldest = seq - KEEP_SEQS + 1
+                for old in [k for k in self._frames if k[0] < oldest]:
+                    del self._frames[old]
+            self._frames[key] = derived
+            return derived
+
+    def clear(self):
+        with self._lock:
+            self._frames.clear()
+            self._newest = 0
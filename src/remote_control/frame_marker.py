@@ -0,0 +1,107 @@
+"""
+帧内时间标记 - 在画面左上角写入可机读的黑白方块条码，接收端解码后得到该帧的捕获时间
+
+条码为一行方块（边长 block 像素）：
+    [白][黑] 参考块，解码时以两者亮度的中点为阈值
+    32 个数据块，捕获时刻的单调毫秒时钟（低 32 位，高位在前）
+    8 个校验块，数据四个字节的异或
+只使用纯黑 / 纯白，经 yuv420 色度抽样和有损编码后仍可按亮度区分；
+缩放后的画面按缩放后的块边长解码（0.5 缩放 -> block / 2）。
+
+时间值取自 time.perf_counter()，只在同一台机器（同一时钟）内有意义：
+    age_ms(value) = 当前 now_value() 与 value 之差（按 32 位回绕）
+"""
+
+import time
+
+import numpy as np
+
+DEFAULT_BLOCK = 16        # 捕获分辨率下的方块边长（像素）
+DATA_BITS = 32
+CHECK_BITS = 8
+REFERENCE_BLOCKS = 2
+MARKER_BLOCKS = REFERENCE_BLOCKS + DATA_BITS + CHECK_BITS
+VALUE_MASK = 0xFFFFFFFF
+
+WHITE = 255
+BLACK = 0
+
+
+def now_value():
+    """当前单调时钟（毫秒，低 32 位）"""
+    return int(time.perf_counter() * 1000.0) & VALUE_MASK
+
+
+def age_ms(value, now=None):
+    """value 距今的毫秒数（按 32 位回绕计算）"""
+    return ((now_value() if now is None else now) - value) & VALUE_MASK
+
+
+def marker_size(block=DEFAULT_BLOCK):
+    """条码占用的 (宽, 高) 像素"""
+    return MARKER_BLOCKS * block, block
+
+
+def _checksum(value):
+    return (value ^ (value >> 8) ^ (value >> 16) ^ (value >> 24)) & 0xFF
+
+
+def _bits(value):
+    word = ((value & VALUE_MASK) << CHECK_BITS) | _checksum(value & VALUE_MASK)
+    return [(word >> (DATA_BITS + CHECK_BITS - 1 - i)) & 1 for i in range(DATA_BITS + CHECK_BITS)]
+
+
+def strip(value, block=DEFAULT_BLOCK):
+    """value 对应的条码图块，(block, 宽, 3) uint8，可直接贴到 PIL 图像左上角"""
+    levels = [WHITE, BLACK] + [WHITE if bit else BLACK for bit in _bits(value)]
+    row = np.repeat(np.asarray(levels, dtype=np.uint8), block)
+    return np.repeat(np.repeat(row[None, :, None], block, axis=0), 3, axis=2)
+
+
+def stamp(frame, value, block=DEFAULT_BLOCK):
+    """把 value 写入 frame 左上角（原地修改，frame 为 (高, 宽, 3) uint8）；画面放不下时不写入，返回 False"""
+    width, height = marker_size(block)
+    if frame.shape[0] < height or frame.shape[1] < width:
+        return False
+    frame[:height, :width, :] = strip(value, block)
+    return True
+
+
+def carry(src, dst, block=DEFAULT_BLOCK):
+    """把 src 左上角的条码复制到 dst 左上角（原地修改 dst）
+
+    条码在捕获时写入整帧左上角，按会话区域裁剪后的画面用它带上同一捕获时刻；
+    dst 放不下时不写入，返回 False
+    """
+    width, height = marker_size(block)
+    if dst.shape[0] < height or dst.shape[1] < width or src.shape[0] < height or src.shape[1] < width:
+        return False
+    dst[:height, :width, :] = src[:height, :width, :]
+    return True
+
+
+def read(frame, block=DEFAULT_BLOCK):
+    """从 frame 左上角解码时间值；frame 可为 RGB (高, 宽, 3) 或亮度平面 (高, 宽)。无效时返回 None"""
+    width, height = marker_size(block)
+    if block < 2 or frame.shape[0] < height or frame.shape[1] < width:
+        return None
+    # 取每个方块中心的一小片，避开块边缘的编码振铃
+    y = block // 2
+    inset = max(1, block // 4)
+    centers = np.arange(MARKER_BLOCKS) * block + block // 2
+    samples = frame[y - inset // 2:y + inset // 2 + 1]
+    if samples.ndim == 3:
+        samples = samples.mean(axis=2)
+    levels = np.array([samples[:, c - inset // 2:c + inset // 2 + 1].mean() for c in centers])
+
+    white, black = levels[0], levels[1]
+    if white - black < 64:
+        return None
+    bits = (levels[REFERENCE_BLOCKS:] > (white + black) / 2.0).astype(np.uint64)
+    word = 0
+    for bit in bits:
+        word = (word << 1) | int(bit)
+    value = word >> CHECK_BITS
+    if word & 0xFF != _checksum(value):
+        return None
+    return value
@@ -0,0 +1,267 @@
+"""
+虚拟手柄池 - 每个 (会话, 客户端手柄序号) 一个 VX360Gamepad，最多 4 个
+- 每个手柄有独立的最新状态槽（见 xinput_slots），互不抢占
+- 单一工作线程以固定上报频率服务所有手柄：每个周期取出全部槽位，
+  按键边沿逐个应用，摇杆只取最新值，状态未变化时不调用 update()
+- 会话断开只把手柄复位并标记为空闲，虚拟设备保持插入；
+  重连的会话优先拿回原来的槽位，游戏端不会看到设备拔插
+"""
+
+import threading
+import time
+
+from . import metrics
+from .xinput_slots import XInputStateSlots
+
+MAX_PADS = 4
+
+
+class MockGamepad:
+    """vgamepad.VX360Gamepad 的替身（测试 / 非 Windows 环境使用）
+
+    只记录调用，report 为最近一次 update() 提交的状态元组 (buttons, lx, ly, rx, ry, lt, rt)
+    """
+
+    def __init__(self):
+        self.buttons = 0
+        self.sticks = [0, 0, 0, 0]
+        self.triggers = [0, 0]
+        self.report = None
+        self.update_count = 0
+
+    def reset(self):
+        self.buttons = 0
+        self.sticks = [0, 0, 0, 0]
+        self.triggers = [0, 0]
+
+    def update(self):
+        self.report = (self.buttons, *self.sticks, *self.triggers)
+        self.update_count += 1
+
+    def left_joystick(self, x_value, y_value):
+        self.sticks[0], self.sticks[1] = x_value, y_value
+
+    def right_joystick(self, x_value, y_value):
+        self.sticks[2], self.sticks[3] = x_value, y_value
+
+    def left_trigger(self, value):
+        self.triggers[0] = value
+
+    def right_trigger(self, value):
+        self.triggers[1] = value
+
+    def press_button(self, button):
+        self.buttons |= button
+
+    def release_button(self, button):
+        self.buttons &= ~button
+
+
+# MockGamepad 直接以按键位作为按钮值
+MOCK_BUTTON_BITS = {1 << i: 1 << i for i in range(16)}
+
+
+class _PadEntry:
+    __slots__ = ('slot', 'pad', 'key', 'last_key', 'last_state')
+
+    def __init__(self, slot, pad):
+        self.slot = slot
+        self.pad = pad
+        self.key = None        # 当前占用者 (sid, 序号)
+        self.last_key = None   # 最近一次的占用者，重连时优先分配
+        self.last_state = None
+
+
+class GamepadPool:
+    """虚拟手柄池
+
+    Args:
+        factory: 创建虚拟手柄的函数（vg.VX360Gamepad 或 MockGamepad）
+        button_bits: 按键位 -> 手柄库的按钮值
+        report_hz: 工作线程最高上报频率
+        max_pads: 最多创建的虚拟手柄数
+    """
+
+    def __init__(self, factory, button_bits, report_hz=250, max_pads=MAX_PADS):
+        self._factory = factory
+        self._button_bits = dict(button_bits)
+        self.interval = 1.0 / max(1, int(report_hz))
+        self.max_pads = max_pads
+        self._lock = threading.RLock()
+        self._entries = []
+        self._by_key = {}
+        self._thread = None
+        self.slots = XInputStateSlots()
+        self.handover_counter = metrics.get_counter('xinput.reattached')
+
+    def set_backend(self, factory, button_bits):
+        """更换虚拟手柄实现（延迟加载 vgamepad 后调用），只影响之后创建的手柄"""
+        with self._lock:
+            self._factory = factory
+            self._button_bits = dict(button_bits)
+
+    # ---------- 分配 ----------
+
+    def attach(self, sid, index=0):
+        """为 (sid, index) 分配手柄，返回槽位号（0 起），池满或创建失败返回 None"""
+        key = (sid, index)
+        with self._lock:
+            entry = self._by_key.get(key)
+            if entry is not None:
+                return entry.slot
+            entry = self._pick_free(key)
+            if entry is None:
+                if len(self._entries) >= self.max_pads:
+                    return None
+                try:
+                    pad = self._factory()
+                except Exception as e:
+                    print(f"[手柄] 创建虚拟手柄失败: {e}")
+                    return None
+                entry = _PadEntry(len(self._entries), pad)
+                self._entries.append(entry)
+                self._neutral(entry)
+                print(f"[手柄] 创建虚拟手柄 #{entry.slot + 1}")
+            elif entry.last_key is not None:
+                self.handover_counter.inc()
+            entry.key = key
+            entry.last_key = key
+            self._by_key[key] = entry
+        self.start()
+        return entry.slot
+
+    def _pick_free(self, key):
+        free = [e for e in self._entries if e.key is None]
+        if not free:
+            return None
+        # 同一 (sid, 序号) 优先；其次同序号（会话重连后 sid 会变化），最后取最小槽位
+        for e in free:
+            if e.last_key == key:
+                return e
+        for e in free:
+            if e.last_key is not None and e.last_key[1] == key[1]:
+                return e
+        return free[0]
+
+    def release(self, sid, index=0):
+        """释放手柄：复位为中立状态并标记空闲，虚拟设备保持插入"""
+        key = (sid, index)
+        self.slots.discard(key)
+        with self._lock:
+            entry = self._by_key.pop(key, None)
+            if entry is None:
+                return
+            entry.key = None
+            self._neutral(entry)
+
+    def release_sid(self, sid):
+        with self._lock:
+            keys = [k for k in self._by_key if k[0] == sid]
+        for key in keys:
+            self.release(*key)
+
+    def slot_of(self, sid, index=0):
+        entry = self._by_key.get((sid, index))
+        return entry.slot if entry is not None else None
+
+    # ---------- 状态 ----------
+
+    def push(self, sid, index, state):
+        """写入 (sid, index) 的最新状态（元组，见 xinput_slots.normalize_state）
+
+        未分配手柄的 (sid, index) 直接丢弃：DataChannel 消息与 Socket.IO 断开互不同步，
+        会话释放后仍可能收到迟到的状态，不能因此重新占用槽位
+        """
+        key = (sid, index)
+        if key not in self._by_key:
+            return
+        self.slots.push(key, state)
+        self.start()
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name="GamepadPool")
+                self._thread.start()
+
+    def _run(self):
+        slots = self.slots
+        while True:
+            slots.event.wait()
+            started = time.perf_counter()
+            for key, states in slots.take():
+                with self._lock:
+                    entry = self._by_key.get(key)
+                    if entry is None:
+                        # push 之后已被释放
+                        continue
+                    for state, enqueued in states:
+                        if state == entry.last_state:
+                            slots.record(enqueued, False)
+                            continue
+                        ok = self._apply(entry, state)
+                        slots.record(enqueued, ok)
+                        if not ok:
+                            self._neutral(entry)
+                            break
+            # 固定上报频率：一个周期内到达的状态在槽位中合并，下个周期再提交
+            delay = self.interval - (time.perf_counter() - started)
+            if delay > 0:
+                time.sleep(delay)
+
+    def _apply(self, entry, state):
+        """提交一个状态元组：只对变化的按键位调用 press/release，最后一次 update()"""
+        pad = entry.pad
+        buttons, lx, ly, rx, ry, lt, rt = state
+        prev = entry.last_state
+        try:
+            if prev is None or prev[1:5] != state[1:5]:
+                pad.left_joystick(x_value=lx, y_value=ly)
+                pad.right_joystick(x_value=rx, y_value=ry)
+            if prev is None or prev[5:] != state[5:]:
+                pad.left_trigger(value=lt)
+                pad.right_trigger(value=rt)
+        except Exception as e:
+            print(f"[手柄] 设置摇杆/扳机失败: {e}")
+            return False
+
+        bits = self._button_bits
+        changed = buttons ^ (prev[0] if prev is not None else 0)
+        while changed:
+            bit = changed & -changed
+            changed ^= bit
+            btn = bits.get(bit)
+            if btn is None:
+                continue
+            try:
+                if buttons & bit:
+                    pad.press_button(button=btn)
+                else:
+                    pad.release_button(button=btn)
+            except Exception:
+                pass
+
+        entry.last_state = state
+        try:
+            pad.update()
+        except Exception as e:
+            print(f"[手柄] 提交手柄状态失败: {e}")
+            return False
+        return True
+
+    @staticmethod
+    def _neutral(entry):
+        try:
+            entry.pad.reset()
+            entry.pad.update()
+        except Exception:
+            pass
+        entry.last_state = None
+
+    def stats(self):
+        stats = self.slots.stats()
+        with self._lock:
+            stats['pads'] = [{'slot': e.slot, 'in_use': e.key is not None} for e in self._entries]
+        return stats
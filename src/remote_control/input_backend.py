@@ -0,0 +1,399 @@
+"""
+输入后端 - 键鼠事件最终注入的位置
+- windows:   SendInput / SetCursorPos（默认，Windows 下使用）
+- recording: 不注入，只记录带时间戳的事件（非 Windows 默认，用于测试与基准）
+- uinput:    Linux /dev/uinput 虚拟设备（需要 python-evdev）
+
+通过环境变量 RC_INPUT_BACKEND 选择，auto 表示按平台自动选择
+事件统一使用元组 (类型, a, b, flags, data)：
+- 鼠标: (INPUT_MOUSE, dx, dy, dwFlags, mouseData)
+- 键盘: (INPUT_KEYBOARD, wVk, wScan, dwFlags, 0)
+"""
+
+import collections
+import ctypes
+import os
+import threading
+import time
+from ctypes import wintypes
+
+from .display_geometry import set_dpi_awareness
+
+# Windows API 常量
+INPUT_MOUSE = 0
+INPUT_KEYBOARD = 1
+
+# 鼠标事件标志
+MOUSEEVENTF_MOVE = 0x0001
+MOUSEEVENTF_ABSOLUTE = 0x8000
+MOUSEEVENTF_LEFTDOWN = 0x0002
+MOUSEEVENTF_LEFTUP = 0x0004
+MOUSEEVENTF_RIGHTDOWN = 0x0008
+MOUSEEVENTF_RIGHTUP = 0x0010
+MOUSEEVENTF_MIDDLEDOWN = 0x0020
+MOUSEEVENTF_MIDDLEUP = 0x0040
+MOUSEEVENTF_WHEEL = 0x0800
+MOUSEEVENTF_HWHEEL = 0x1000
+
+# 键盘事件标志
+KEYEVENTF_EXTENDEDKEY = 0x0001
+KEYEVENTF_KEYUP = 0x0002
+KEYEVENTF_UNICODE = 0x0004
+KEYEVENTF_SCANCODE = 0x0008
+
+WHEEL_DELTA = 120
+
+
+class MOUSEINPUT(ctypes.Structure):
+    _fields_ = [
+        ("dx", wintypes.LONG),
+        ("dy", wintypes.LONG),
+        ("mouseData", wintypes.DWORD),
+        ("dwFlags", wintypes.DWORD),
+        ("time", wintypes.DWORD),
+        ("dwExtraInfo", ctypes.POINTER(wintypes.ULONG)),
+    ]
+
+
+class KEYBDINPUT(ctypes.Structure):
+    _fields_ = [
+        ("wVk", wintypes.WORD),
+        ("wScan", wintypes.WORD),
+        ("dwFlags", wintypes.DWORD),
+        ("time", wintypes.DWORD),
+        ("dwExtraInfo", ctypes.POINTER(wintypes.ULONG)),
+    ]
+
+
+class INPUT(ctypes.Structure):
+    class _INPUT(ctypes.Union):
+        _fields_ = [
+            ("mi", MOUSEINPUT),
+            ("ki", KEYBDINPUT),
+        ]
+
+    _anonymous_ = ("_input",)
+    _fields_ = [
+        ("type", wintypes.DWORD),
+        ("_input", _INPUT),
+    ]
+
+
+class POINT(ctypes.Structure):
+    _fields_ = [("x", wintypes.LONG), ("y", wintypes.LONG)]
+
+
+class InputBackend:
+    """输入后端接口"""
+
+    name = 'base'
+
+    def send_events(self, events):
+        """注入事件序列，返回成功注入的事件数"""
+        raise NotImplementedError
+
+    def get_cursor_pos(self):
+        raise NotImplementedError
+
+    def set_cursor_pos(self, x, y):
+        raise NotImplementedError
+
+    def get_screen_size(self):
+        raise NotImplementedError
+
+    def map_virtual_key(self, vk):
+        """虚拟键码 -> 扫描码"""
+        return 0
+
+    def close(self):
+        pass
+
+
+class WindowsInputBackend(InputBackend):
+    """SendInput 后端：预分配 INPUT 数组，一次 SendInput 提交多个事件"""
+
+    name = 'windows'
+    BATCH_CAPACITY = 64
+    # 整段文本输入时数组按需扩容，一次 SendInput 提交，避免与用户实际输入交错
+    MAX_BATCH_CAPACITY = 4096
+
+    def __init__(self):
+        # 设置 DPI 感知，确保 GetCursorPos 和 SetCursorPos 使用物理坐标（DisplayGeometry 通常已设置过）
+        set_dpi_awareness()
+
+        user32 = ctypes.windll.user32
+        self.user32 = user32
+
+        self.SendInput = user32.SendInput
+        self.SendInput.argtypes = [wintypes.UINT, ctypes.POINTER(INPUT), wintypes.INT]
+        self.SendInput.restype = wintypes.UINT
+
+        self.GetCursorPos = user32.GetCursorPos
+        # 直接使用 ctypes.byref 传递，不需要严格的 POINTER(POINT) 类型检查
+        # 这样可以避免 "expected LP_POINT instance instead of pointer to POINT" 错误
+        self.GetCursorPos.restype = wintypes.BOOL
+
+        self.SetCursorPos = user32.SetCursorPos
+        self.SetCursorPos.argtypes = [wintypes.INT, wintypes.INT]
+        self.SetCursorPos.restype = wintypes.BOOL
+
+        self.MapVirtualKey = user32.MapVirtualKeyW
+        self.MapVirtualKey.argtypes = [wintypes.UINT, wintypes.UINT]
+        self.MapVirtualKey.restype = wintypes.UINT
+
+        self._buffer = (INPUT * self.BATCH_CAPACITY)()
+        self._lock = threading.Lock()
+        self._extra_info = ctypes.pointer(wintypes.ULONG(0))  # 所有事件共用的 dwExtraInfo
+        self._input_size = ctypes.sizeof(INPUT)
+
+    def send_events(self, events):
+        """把事件填入预分配数组，每个数组容量的事件调用一次 SendInput"""
+        sent = 0
+        with self._lock:
+            if len(events) > len(self._buffer) and len(self._buffer) < self.MAX_BATCH_CAPACITY:
+                self._buffer = (INPUT * min(len(events), self.MAX_BATCH_CAPACITY))()
+            capacity = len(self._buffer)
+            for start in range(0, len(events), capacity):
+                chunk = events[start:start + capacity]
+                for inp, (kind, a, b, flags, data) in zip(self._buffer, chunk):
+                    inp.type = kind
+                    if kind == INPUT_MOUSE:
+                        mi = inp.mi
+                        mi.dx = a
+                        mi.dy = b
+                        mi.mouseData = data
+                        mi.dwFlags = flags
+                        mi.time = 0
+                        mi.dwExtraInfo = self._extra_info
+                    else:
+                        ki = inp.ki
+                        ki.wVk = a
+                        ki.wScan = b
+                        ki.dwFlags = flags
+                        ki.time = 0
+                        ki.dwExtraInfo = self._extra_info
+                result = self.SendInput(len(chunk), self._buffer, self._input_size)
+                sent += result
+                if result != len(chunk):
+                    print(f"[SendInput] 失败: {ctypes.get_last_error()} ({result}/{len(chunk)})")
+                    break
+        return sent
+
+    def get_cursor_pos(self):
+        pt = POINT()
+        if self.GetCursorPos(ctypes.byref(pt)):
+            return pt.x, pt.y
+        return 0, 0
+
+    def set_cursor_pos(self, x, y):
+        return bool(self.SetCursorPos(int(x), int(y)))
+
+    def get_screen_size(self):
+        # 0 = SM_CXSCREEN, 1 = SM_CYSCREEN
+        return self.user32.GetSystemMetrics(0), self.user32.GetSystemMetrics(1)
+
+    def map_virtual_key(self, vk):
+        return self.MapVirtualKey(vk, 0)
+
+
+class _VirtualCursorBackend(InputBackend):
+    """没有真实光标可查询的后端：按注入的事件维护一个虚拟光标"""
+
+    def __init__(self, screen_size=None):
+        if screen_size is None:
+            w, h = os.getenv("RC_INPUT_SCREEN_SIZE", "1920x1080").lower().split('x')
+            screen_size = (int(w), int(h))
+        self.screen_size = tuple(screen_size)
+        self.cursor = [self.screen_size[0] // 2, self.screen_size[1] // 2]
+
+    def _track(self, kind, a, b, flags):
+        if kind != INPUT_MOUSE or not flags & MOUSEEVENTF_MOVE:
+            return
+        w, h = self.screen_size
+        if flags & MOUSEEVENTF_ABSOLUTE:
+            x, y = a * w // 65535, b * h // 65535
+        else:
+            x, y = self.cursor[0] + a, self.cursor[1] + b
+        self.cursor[0] = max(0, min(x, w))
+        self.cursor[1] = max(0, min(y, h))
+
+    def get_cursor_pos(self):
+        return self.cursor[0], self.cursor[1]
+
+    def get_screen_size(self):
+        return self.screen_size
+
+
+class RecordingInputBackend(_VirtualCursorBackend):
+    """记录后端：不注入任何输入，只记录 (时间戳, 事件)
+
+    用于在非 Windows 环境下测试输入路径、测量处理函数 -> 注入的延迟与吞吐
+    """
+
+    name = 'recording'
+
+    def __init__(self, screen_size=None, maxlen=100000, on_inject=None):
+        super().__init__(screen_size)
+        self.events = collections.deque(maxlen=maxlen)
+        self.on_inject = on_inject
+        self.total = 0
+
+    def send_events(self, events):
+        now = time.perf_counter()
+        for event in events:
+            self._track(*event[:4])
+            self.events.append((now,) + tuple(event))
+        self.total += len(events)
+        if self.on_inject is not None:
+            self.on_inject(now, events)
+        return len(events)
+
+    def set_cursor_pos(self, x, y):
+        w, h = self.screen_size
+        self.cursor[0] = max(0, min(int(x), w))
+        self.cursor[1] = max(0, min(int(y), h))
+        # SetCursorPos 以像素坐标记录（不换算为 0-65535）
+        now = time.perf_counter()
+        event = (INPUT_MOUSE, self.cursor[0], self.cursor[1], MOUSEEVENTF_MOVE | MOUSEEVENTF_ABSOLUTE, 0)
+        self.events.append((now,) + event)
+        self.total += 1
+        if self.on_inject is not None:
+            self.on_inject(now, (event,))
+        return True
+
+    def map_virtual_key(self, vk):
+        return vk
+
+    def clear(self):
+        self.events.clear()
+        self.total = 0
+
+
+class UInputBackend(_VirtualCursorBackend):
+    """Linux uinput 后端（需要 python-evdev 及 /dev/uinput 写权限）"""
+
+    name = 'uinput'
+
+    def __init__(self, screen_size=None):
+        super().__init__(screen_size)
+        from evdev import UInput, ecodes
+
+        self.ecodes = ecodes
+        self.vk_to_key = self._build_key_map(ecodes)
+        self.mouse_buttons = {
+            MOUSEEVENTF_LEFTDOWN: (ecodes.BTN_LEFT, 1),
+            MOUSEEVENTF_LEFTUP: (ecodes.BTN_LEFT, 0),
+            MOUSEEVENTF_RIGHTDOWN: (ecodes.BTN_RIGHT, 1),
+            MOUSEEVENTF_RIGHTUP: (ecodes.BTN_RIGHT, 0),
+            MOUSEEVENTF_MIDDLEDOWN: (ecodes.BTN_MIDDLE, 1),
+            MOUSEEVENTF_MIDDLEUP: (ecodes.BTN_MIDDLE, 0),
+        }
+        keys = sorted(set(self.vk_to_key.values()) | {ecodes.BTN_LEFT, ecodes.BTN_RIGHT, ecodes.BTN_MIDDLE})
+        self.device = UInput({
+            ecodes.EV_KEY: keys,
+            ecodes.EV_REL: [ecodes.REL_X, ecodes.REL_Y, ecodes.REL_WHEEL, ecodes.REL_HWHEEL],
+        }, name='remote-control-input')
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def _build_key_map(ecodes):
+        key_map = {}
+        for c in 'ABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789':
+            key_map[ord(c)] = getattr(ecodes, f'KEY_{c}')
+        key_map.update({
+            0x0D: ecodes.KEY_ENTER, 0x20: ecodes.KEY_SPACE, 0x09: ecodes.KEY_TAB,
+            0x08: ecodes.KEY_BACKSPACE, 0x2E: ecodes.KEY_DELETE, 0x1B: ecodes.KEY_ESC,
+            0x26: ecodes.KEY_UP, 0x28: ecodes.KEY_DOWN, 0x25: ecodes.KEY_LEFT, 0x27: ecodes.KEY_RIGHT,
+            0x11: ecodes.KEY_LEFTCTRL, 0x12: ecodes.KEY_LEFTALT, 0x10: ecodes.KEY_LEFTSHIFT,
+            0x5B: ecodes.KEY_LEFTMETA,
+        })
+        return key_map
+
+    def send_events(self, events):
+        e = self.ecodes
+        write = self.device.write
+        with self._lock:
+            for kind, a, b, flags, data in events:
+                if kind == INPUT_KEYBOARD:
+                    if flags & KEYEVENTF_UNICODE:
+                        # evdev 只有物理按键，无法注入任意字符
+                        continue
+                    key = self.vk_to_key.get(a or b)
+                    if key is not None:
+                        write(e.EV_KEY, key, 0 if flags & KEYEVENTF_KEYUP else 1)
+                    continue
+                if flags & MOUSEEVENTF_MOVE:
+                    x0, y0 = self.cursor
+                    self._track(kind, a, b, flags)
+                    if flags & MOUSEEVENTF_ABSOLUTE:
+                        # 相对设备只能移动：按虚拟光标换算为位移
+                        dx, dy = self.cursor[0] - x0, self.cursor[1] - y0
+                    else:
+                        dx, dy = a, b
+                    if dx:
+                        write(e.EV_REL, e.REL_X, dx)
+                    if dy:
+                        write(e.EV_REL, e.REL_Y, dy)
+                if flags & MOUSEEVENTF_WHEEL:
+                    write(e.EV_REL, e.REL_WHEEL, int(ctypes.c_int32(data).value / WHEEL_DELTA))
+                if flags & MOUSEEVENTF_HWHEEL:
+                    write(e.EV_REL, e.REL_HWHEEL, int(ctypes.c_int32(data).value / WHEEL_DELTA))
+                for flag, (button, value) in self.mouse_buttons.items():
+                    if flags & flag:
+                        write(e.EV_KEY, button, value)
+            self.device.syn()
+        return len(events)
+
+    def set_cursor_pos(self, x, y):
+        w, h = self.screen_size
+        x = max(0, min(int(x), w))
+        y = max(0, min(int(y), h))
+        dx, dy = x - self.cursor[0], y - self.cursor[1]
+        if dx or dy:
+            self.send_events(((INPUT_MOUSE, dx, dy, MOUSEEVENTF_MOVE, 0),))
+        return True
+
+    def map_virtual_key(self, vk):
+        return vk
+
+    def close(self):
+        self.device.close()
+
+
+BACKENDS = {
+    'windows': WindowsInputBackend,
+    'recording': RecordingInputBackend,
+    'uinput': UInputBackend,
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+
+def create_backend(name=None):
+    """按名称创建后端；未指定时读取 RC_INPUT_BACKEND（默认 auto）"""
+    name = (name or os.getenv("RC_INPUT_BACKEND", "auto")).lower()
+    if name == 'auto':
+        name = 'windows' if os.name == 'nt' else 'recording'
+    if name not in BACKENDS:
+        raise ValueError(f"unknown input backend: {name}")
+    return BACKENDS[name]()
+
+
+def get_backend():
+    """获取全局输入后端（首次调用时创建）"""
+    global _backend
+    if _backend is None:
+        with _backend_lock:
+            if _backend is None:
+                _backend = create_backend()
+    return _backend
+
+
+def set_backend(backend):
+    """替换全局输入后端（测试/基准使用），返回旧后端"""
+    global _backend
+    with _backend_lock:
+        old = _backend
+        _backend = backend
+    return old
@@ -0,0 +1,167 @@
+"""
+输入注入队列 - 单一注入线程按到达顺序执行
+Socket.IO / DataChannel 处理函数只负责入队，注入线程每轮取空队列：
+- 连续的相对移动合并为一次位移（同一 raw 模式下）
+- 连续的绝对移动只保留最后一个位置（同一 raw 模式下）
+- 点击、按键等边沿事件严格保序，遇到边沿前先把已合并的移动注入
+
+每个事件可附带来源 (事件类型, 客户端时间戳)，客户端时间戳为已按时钟偏移换算到
+服务端 time.time() 的毫秒值。注入后按事件类型记录各阶段延迟：
+    input.latency.<类型>.client_ms  客户端发出 -> 服务端接收（入队）
+    input.latency.<类型>.queue_ms   入队 -> 注入线程取出
+    input.latency.<类型>.inject_ms  取出 -> SendInput 返回
+    input.latency.<类型>.total_ms   客户端发出 -> SendInput 返回
+"""
+
+import collections
+import threading
+import time
+
+from . import metrics
+
+# 队列深度直方图桶（每轮取出的事件数）
+QUEUE_DEPTH_BUCKETS = (1, 2, 3, 4, 6, 8, 12, 16, 32, 64, 128, 256)
+
+LATENCY_STAGES = ('client_ms', 'queue_ms', 'inject_ms', 'total_ms')
+
+_MOVE_RELATIVE = 0
+_MOVE_ABSOLUTE = 1
+_CALL = 2
+
+
+class InputInjector:
+    """单线程输入注入器
+
+    入队只做 deque.append（CPython 下线程安全，无需加锁）和 Event.set，
+    处理函数线程不再直接调用 SendInput / SetCursorPos。
+    """
+
+    def __init__(self, move_relative, move_absolute, name="InputInjector"):
+        self._move_relative = move_relative
+        self._move_absolute = move_absolute
+        self._name = name
+        self._queue = collections.deque()
+        self._event = threading.Event()
+        self._thread = None
+        self._start_lock = threading.Lock()
+
+        self.depth_hist = metrics.get_histogram('input.queue_depth', QUEUE_DEPTH_BUCKETS)
+        self.latency_hist = metrics.get_histogram('input.inject_latency_ms')
+        self.merged_counter = metrics.get_counter('input.moves_merged')
+        self.injected_counter = metrics.get_counter('input.injected')
+        self.enqueued_meter = metrics.get_meter('input.enqueued')
+        self._type_hists = {}
+
+    def start(self):
+        if self._thread is not None:
+            return
+        with self._start_lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, daemon=True, name=self._name)
+                self._thread.start()
+
+    def submit_move(self, dx, dy, raw=False, source=None):
+        """相对移动（可合并）"""
+        self._put((_MOVE_RELATIVE, (dx, dy, bool(raw)), time.perf_counter(), source))
+
+    def submit_absolute(self, x, y, raw=False, source=None):
+        """绝对移动（只保留最新位置）；raw 为 True 时以 SendInput 绝对移动注入（游戏模式）"""
+        self._put((_MOVE_ABSOLUTE, (x, y, bool(raw)), time.perf_counter(), source))
+
+    def submit(self, fn, *args, source=None):
+        """边沿事件：按入队顺序执行 fn(*args)"""
+        self._put((_CALL, (fn, args), time.perf_counter(), source))
+
+    def depth(self):
+        return len(self._queue)
+
+    def _put(self, item):
+        self._queue.append(item)
+        self.enqueued_meter.inc()
+        self._event.set()
+        if self._thread is None:
+            self.start()
+
+    def _run(self):
+        while True:
+            self._event.wait()
+            # 先清除再取队列：取队列期间的新入队会重新置位，不会丢失唤醒
+            self._event.clear()
+            depth = len(self._queue)
+            if depth:
+                self.depth_hist.observe(depth)
+                self._drain()
+
+    def _drain(self):
+        queue = self._queue
+        pending_kind = None
+        pending_args = None
+        pending_items = []
+
+        while True:
+            try:
+                kind, args, enqueued, source = queue.popleft()
+            except IndexError:
+                break
+            item = (enqueued, time.perf_counter(), source)
+
+            if kind == _MOVE_RELATIVE and pending_kind == _MOVE_RELATIVE and pending_args[2] == args[2]:
+                pending_args = (pending_args[0] + args[0], pending_args[1] + args[1], args[2])
+                pending_items.append(item)
+                self.merged_counter.inc()
+                continue
+            if kind == _MOVE_ABSOLUTE and pending_kind == _MOVE_ABSOLUTE and pending_args[2] == args[2]:
+                pending_args = args
+                pending_items.append(item)
+                self.merged_counter.inc()
+                continue
+
+            if pending_kind is not None:
+                self._inject(pending_kind, pending_args, pending_items)
+                pending_kind = None
+
+            if kind == _CALL:
+                self._inject(kind, args, (item,))
+            else:
+                pending_kind = kind
+                pending_args = args
+                pending_items = [item]
+
+        if pending_kind is not None:
+            self._inject(pending_kind, pending_args, pending_items)
+
+    def _inject(self, kind, args, items):
+        try:
+            if kind == _MOVE_RELATIVE:
+                self._move_relative(*args)
+            elif kind == _MOVE_ABSOLUTE:
+                self._move_absolute(*args)
+            else:
+                fn, fn_args = args
+                fn(*fn_args)
+        except Exception as e:
+            print(f"[输入注入] 错误: {e}")
+        now = time.perf_counter()
+        wall_ms = time.time() * 1000.0
+        hist = self.latency_hist
+        for enqueued, dequeued, source in items:
+            hist.observe((now - enqueued) * 1000.0)
+            if source is not None:
+                self._observe_source(source, enqueued, dequeued, now, wall_ms)
+        self.injected_counter.inc()
+
+    def _observe_source(self, source, enqueued, dequeued, now, wall_ms):
+        event_type, client_ms = source
+        hists = self._type_hists.get(event_type)
+        if hists is None:
+            hists = tuple(metrics.get_histogram(f'input.latency.{event_type}.{stage}')
+                          for stage in LATENCY_STAGES)
+            self._type_hists[event_type] = hists
+        client_hist, queue_hist, inject_hist, total_hist = hists
+        queue_hist.observe((dequeued - enqueued) * 1000.0)
+        inject_hist.observe((now - dequeued) * 1000.0)
+        if client_ms:
+            total_ms = wall_ms - client_ms
+            # 时钟偏移估计误差可能让极小的延迟变成负数，按 0 计
+            client_hist.observe(max(0.0, total_ms - (now - enqueued) * 1000.0))
+            total_hist.observe(max(0.0, total_ms))
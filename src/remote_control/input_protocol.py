@@ -0,0 +1,109 @@
+"""
+二进制输入协议（指针类事件）
+一个 WebSocket / DataChannel 帧携带多条定长记录，客户端每个动画帧发送一次：
+
+    帧头   <BBHI     版本, 保留, 记录数, 序号
+    记录   <BBHffd   类型, 标志, 保留, a, b, 客户端时间戳(ms, performance.timeOrigin + now)
+
+记录类型：
+    MOVE_RELATIVE  a=dx, b=dy；标志 bit0=携带 raw，bit1=raw 值
+    MOVE_ABSOLUTE  a=x, b=y
+    CLICK          标志低 2 位=按键(0 左/1 右/2 中)，bit7=按下
+    SCROLL         a=dx, b=dy
+
+序号与 DataChannel 上 JSON 消息的 seq 共用同一计数：纯移动帧走无序通道，
+迟到帧中的绝对移动按序号丢弃（相对移动是增量，仍然累加）。
+
+按键事件仍使用 JSON（key_event），不在此协议内
+"""
+
+import struct
+
+import numpy as np
+
+PROTOCOL_VERSION = 2
+
+HEADER = struct.Struct('<BBHI')
+
+RECORD_DTYPE = np.dtype([
+    ('type', 'u1'),
+    ('flags', 'u1'),
+    ('reserved', '<u2'),
+    ('a', '<f4'),
+    ('b', '<f4'),
+    ('t', '<f8'),
+])
+
+MOVE_RELATIVE = 1
+MOVE_ABSOLUTE = 2
+CLICK = 3
+SCROLL = 4
+
+FLAG_RAW_SET = 0x01
+FLAG_RAW = 0x02
+FLAG_DOWN = 0x80
+CLICK_BUTTONS = ('left', 'right', 'middle')
+
+MAX_RECORDS = 1024
+
+
+class ProtocolError(ValueError):
+    pass
+
+
+def decode(payload):
+    """解析一帧，返回 (序号, 结构化数组（零拷贝视图）)"""
+    if len(payload) < HEADER.size:
+        raise ProtocolError('short_frame')
+    version, _, count, seq = HEADER.unpack_from(payload)
+    if version != PROTOCOL_VERSION:
+        raise ProtocolError(f'unsupported_version:{version}')
+    if count > MAX_RECORDS or len(payload) < HEADER.size + count * RECORD_DTYPE.itemsize:
+        raise ProtocolError('bad_length')
+    return seq, np.frombuffer(payload, dtype=RECORD_DTYPE, count=count, offset=HEADER.size)
+
+
+def encode(records, seq=0):
+    """把 (类型, 标志, a, b, t) 序列编码为一帧（测试/基准工具使用）"""
+    arr = np.zeros(len(records), dtype=RECORD_DTYPE)
+    for i, (kind, flags, a, b, t) in enumerate(records):
+        arr[i] = (kind, flags, 0, a, b, t)
+    return HEADER.pack(PROTOCOL_VERSION, 0, len(records), seq) + arr.tobytes()
+
+
+def commands(records):
+    """向量化合并记录，按原顺序返回命令列表
+
+    连续的相对移动（raw 标志相同）求和为一条，连续的绝对移动只保留最后一条，
+    点击与滚轮逐条保留。返回 [(类型, 标志, a, b, 最早客户端时间戳), ...]
+    """
+    n = len(records)
+    if n == 0:
+        return []
+    types = records['type']
+    flags = records['flags']
+
+    # 与前一条类型或标志不同、或本身不可合并时开始新的一段
+    mergeable = (types == MOVE_RELATIVE) | (types == MOVE_ABSOLUTE)
+    starts = np.empty(n, dtype=bool)
+    starts[0] = True
+    starts[1:] = (types[1:] != types[:-1]) | (flags[1:] != flags[:-1]) | ~mergeable[1:]
+    idx = np.flatnonzero(starts)
+    ends = np.append(idx[1:], n) - 1
+
+    a = records['a'].astype(np.float64)
+    b = records['b'].astype(np.float64)
+    sum_a = np.add.reduceat(a, idx)
+    sum_b = np.add.reduceat(b, idx)
+    t = records['t']
+
+    out = []
+    for k, start in enumerate(idx.tolist()):
+        kind = int(types[start])
+        if kind == MOVE_RELATIVE:
+            out.append((kind, int(flags[start]), float(sum_a[k]), float(sum_b[k]), float(t[start])))
+        else:
+            # 绝对移动取段内最后一条；点击/滚轮段长度恒为 1
+            last = int(ends[k])
+            out.append((kind, int(flags[last]), float(a[last]), float(b[last]), float(t[start])))
+    return out
@@ -1,13 +1,34 @@
 """
 底层输入模拟模块 - 使用 Windows SendInput API
 比 pyautogui 更底层，能更好地支持游戏窗口
+事件最终由 input_backend 中选定的后端注入（非 Windows 下可使用记录后端）
 """
 
-import ctypes
 import os
-from ctypes import wintypes
+import threading
 import time
 
+from .input_backend import (
+    INPUT_KEYBOARD,
+    INPUT_MOUSE,
+    KEYEVENTF_KEYUP,
+    KEYEVENTF_SCANCODE,
+    KEYEVENTF_UNICODE,
+    MOUSEEVENTF_ABSOLUTE,
+    MOUSEEVENTF_HWHEEL,
+    MOUSEEVENTF_LEFTDOWN,
+    MOUSEEVENTF_LEFTUP,
+    MOUSEEVENTF_MIDDLEDOWN,
+    MOUSEEVENTF_MIDDLEUP,
+    MOUSEEVENTF_MOVE,
+    MOUSEEVENTF_RIGHTDOWN,
+    MOUSEEVENTF_RIGHTUP,
+    MOUSEEVENTF_WHEEL,
+    WHEEL_DELTA,
+    get_backend,
+)
+from .keymap import VK_RETURN, VK_TAB, KeyTable
+
 DEBUG_LOG_ENABLED = os.getenv("RC_DEBUG", "0") == "1"
 
 
@@ -15,192 +36,74 @@ def debug_log(message):
     if DEBUG_LOG_ENABLED:
         print(message)
 
-# Windows API 常量
-INPUT_MOUSE = 0
-INPUT_KEYBOARD = 1
-
-# 鼠标事件标志
-MOUSEEVENTF_MOVE = 0x0001
-MOUSEEVENTF_ABSOLUTE = 0x8000
-MOUSEEVENTF_LEFTDOWN = 0x0002
-MOUSEEVENTF_LEFTUP = 0x0004
-MOUSEEVENTF_RIGHTDOWN = 0x0008
-MOUSEEVENTF_RIGHTUP = 0x0010
-MOUSEEVENTF_MIDDLEDOWN = 0x0020
-MOUSEEVENTF_MIDDLEUP = 0x0040
-MOUSEEVENTF_WHEEL = 0x0800
-MOUSEEVENTF_HWHEEL = 0x1000
-
-# 键盘事件标志
-KEYEVENTF_KEYUP = 0x0002
-KEYEVENTF_SCANCODE = 0x0008
-
-# 虚拟键码映射
-VK_MAP = {
-    'return': 0x0D,
-    'space': 0x20,
-    'tab': 0x09,
-    'backspace': 0x08,
-    'delete': 0x2E,
-    'esc': 0x1B,
-    'up': 0x26,
-    'down': 0x28,
-    'left': 0x25,
-    'right': 0x27,
-    'ctrl': 0x11,
-    'alt': 0x12,
-    'shift': 0x10,
-    'win': 0x5B,
-    'w': 0x57,
-    'a': 0x41,
-    's': 0x53,
-    'd': 0x44,
-    'e': 0x45,
-    'r': 0x52,
-    'q': 0x51,
-    'f': 0x46,
-}
-
-
-class MOUSEINPUT(ctypes.Structure):
-    _fields_ = [
-        ("dx", wintypes.LONG),
-        ("dy", wintypes.LONG),
-        ("mouseData", wintypes.DWORD),
-        ("dwFlags", wintypes.DWORD),
-        ("time", wintypes.DWORD),
-        ("dwExtraInfo", ctypes.POINTER(wintypes.ULONG)),
-    ]
-
-
-class KEYBDINPUT(ctypes.Structure):
-    _fields_ = [
-        ("wVk", wintypes.WORD),
-        ("wScan", wintypes.WORD),
-        ("dwFlags", wintypes.DWORD),
-        ("time", wintypes.DWORD),
-        ("dwExtraInfo", ctypes.POINTER(wintypes.ULONG)),
-    ]
-
-
-class INPUT(ctypes.Structure):
-    class _INPUT(ctypes.Union):
-        _fields_ = [
-            ("mi", MOUSEINPUT),
-            ("ki", KEYBDINPUT),
-        ]
-
-    _anonymous_ = ("_input",)
-    _fields_ = [
-        ("type", wintypes.DWORD),
-        ("_input", _INPUT),
-    ]
-
-
-class POINT(ctypes.Structure):
-    _fields_ = [("x", wintypes.LONG), ("y", wintypes.LONG)]
-
-
-# 加载 SendInput 函数
-user32 = ctypes.windll.user32
-SendInput = user32.SendInput
-SendInput.argtypes = [wintypes.UINT, ctypes.POINTER(INPUT), wintypes.INT]
-SendInput.restype = wintypes.UINT
-
-GetCursorPos = user32.GetCursorPos
-# 直接使用 ctypes.byref 传递，不需要严格的 POINTER(POINT) 类型检查
-# 这样可以避免 "expected LP_POINT instance instead of pointer to POINT" 错误
-# GetCursorPos.argtypes = [ctypes.POINTER(POINT)]
-GetCursorPos.restype = wintypes.BOOL
-
-SetCursorPos = user32.SetCursorPos
-SetCursorPos.argtypes = [wintypes.INT, wintypes.INT]
-SetCursorPos.restype = wintypes.BOOL
-
-MapVirtualKey = user32.MapVirtualKeyW
-MapVirtualKey.argtypes = [wintypes.UINT, wintypes.UINT]
-MapVirtualKey.restype = wintypes.UINT
+
+def mouse_event(dx, dy, flags, data=0):
+    """构造一个鼠标事件（供 send_batch 使用）"""
+    return (INPUT_MOUSE, dx, dy, flags, data)
+
+
+def keyboard_event(vk, flags=0, use_scancode=False, backend=None):
+    """构造一个键盘事件（供 send_batch 使用）"""
+    if use_scancode:
+        scan = (backend or get_backend()).map_virtual_key(vk)
+        return (INPUT_KEYBOARD, 0, scan, flags | KEYEVENTF_SCANCODE, 0)
+    return (INPUT_KEYBOARD, vk, 0, flags, 0)
+
+
+def send_events(events):
+    """通过当前输入后端注入事件，返回成功注入的事件数"""
+    return get_backend().send_events(events)
 
 
 def send_mouse_input(dx, dy, flags, data=0):
     """发送鼠标输入"""
-    extra = ctypes.pointer(wintypes.ULONG(0))
-    inp = INPUT()
-    inp.type = INPUT_MOUSE
-    inp.mi.dx = dx
-    inp.mi.dy = dy
-    inp.mi.mouseData = data
-    inp.mi.dwFlags = flags
-    inp.mi.time = 0
-    inp.mi.dwExtraInfo = extra
-
-    result = SendInput(1, ctypes.pointer(inp), ctypes.sizeof(inp))
-    if result != 1:
-        print(f"[SendInput] 失败: {ctypes.get_last_error()}")
-    return result == 1
+    return send_events((mouse_event(dx, dy, flags, data),)) == 1
 
 
 def send_keyboard_input(vk, flags=0, use_scancode=False):
     """发送键盘输入"""
-    extra = ctypes.pointer(wintypes.ULONG(0))
-    inp = INPUT()
-    inp.type = INPUT_KEYBOARD
-    if use_scancode:
-        inp.ki.wVk = 0
-        inp.ki.wScan = MapVirtualKey(vk, 0)
-        inp.ki.dwFlags = flags | KEYEVENTF_SCANCODE
-    else:
-        inp.ki.wVk = vk
-        inp.ki.wScan = 0
-        inp.ki.dwFlags = flags
-    inp.ki.time = 0
-    inp.ki.dwExtraInfo = extra
-
-    result = SendInput(1, ctypes.pointer(inp), ctypes.sizeof(inp))
-    return result == 1
+    return send_events((keyboard_event(vk, flags, use_scancode),)) == 1
 
 
 class InputSender:
     """底层输入发送器"""
 
-    def __init__(self):
-        # 0 = SM_CXSCREEN, 1 = SM_CYSCREEN
-        self.screen_width = ctypes.windll.user32.GetSystemMetrics(0)
-        self.screen_height = ctypes.windll.user32.GetSystemMetrics(1)
-        
-        # 处理 DPI 缩放
-        # 设置 DPI 感知，确保 GetCursorPos 和 SetCursorPos 使用物理坐标
-        try:
-            ctypes.windll.shcore.SetProcessDpiAwareness(1) # PROCESS_SYSTEM_DPI_AWARE
-        except Exception:
-            try:
-                ctypes.windll.user32.SetProcessDPIAware()
-            except Exception:
-                pass
-                
-        # 重新获取物理分辨率
-        self.screen_width = ctypes.windll.user32.GetSystemMetrics(0)
-        self.screen_height = ctypes.windll.user32.GetSystemMetrics(1)
+    def __init__(self, backend=None):
+        # 后端创建时已处理 DPI 感知，这里拿到的是物理分辨率
+        self.backend = backend or get_backend()
+        self.screen_width, self.screen_height = self.backend.get_screen_size()
+        # 按键表在创建时一次性算好扫描码，注入时不再调用 MapVirtualKey
+        self.keys = KeyTable(self.backend)
+        # 高精度滚轮尚未发送的余量（WHEEL_DELTA 单位），[垂直, 水平]
+        self._wheel_rest = [0.0, 0.0]
+
+    def send_batch(self, events):
+        """一次 SendInput 提交多个事件
+
+        Args:
+            events: mouse_event() / keyboard_event() 或 key_event() 构造的事件序列
+        Returns:
+            全部注入成功返回 True
+        """
+        events = [e for e in events if e is not None]
+        if not events:
+            return True
+        return self.backend.send_events(events) == len(events)
 
     def get_screen_size(self):
         """获取屏幕尺寸"""
-        self.screen_width = ctypes.windll.user32.GetSystemMetrics(0)
-        self.screen_height = ctypes.windll.user32.GetSystemMetrics(1)
+        self.screen_width, self.screen_height = self.backend.get_screen_size()
         return (self.screen_width, self.screen_height)
 
     def get_mouse_pos(self):
         """获取当前鼠标位置 (底层 API)"""
-        pt = POINT()
-        # 使用 ctypes.byref 传递 POINT 实例的引用，这与 GetCursorPos.argtypes = [ctypes.POINTER(POINT)] 匹配
-        if GetCursorPos(ctypes.byref(pt)):
-            return pt.x, pt.y
-        return 0, 0
+        return self.backend.get_cursor_pos()
 
     def set_mouse_pos(self, x, y):
         """设置鼠标位置 (底层 API)"""
         # SetCursorPos 使用物理坐标，但可能受 DPI 缩放影响
         # 如果我们已经开启了 DPI 感知，这里的坐标应该是准确的物理像素
-        return SetCursorPos(int(x), int(y))
+        return self.backend.set_cursor_pos(x, y)
 
     def move_relative(self, dx, dy, raw_input=False):
         """相对移动鼠标
@@ -285,43 +188,111 @@ class InputSender:
         """中键抬起"""
         return send_mouse_input(0, 0, MOUSEEVENTF_MIDDLEUP)
 
-    def scroll(self, dy, dx=0):
-        """滚轮滚动"""
-        result = True
+    def scroll_events(self, dy, dx=0):
+        """滚轮事件（单位：格，WHEEL_DELTA = 120）"""
+        events = []
         if dy != 0:
-            # WHEEL_DELTA = 120
-            result &= send_mouse_input(0, 0, MOUSEEVENTF_WHEEL, int(dy * 120))
+            events.append(mouse_event(0, 0, MOUSEEVENTF_WHEEL, int(dy * WHEEL_DELTA)))
         if dx != 0:
-            result &= send_mouse_input(0, 0, MOUSEEVENTF_HWHEEL, int(dx * 120))
-        return result
+            events.append(mouse_event(0, 0, MOUSEEVENTF_HWHEEL, int(dx * WHEEL_DELTA)))
+        return events
+
+    def scroll(self, dy, dx=0):
+        """滚轮滚动（单位：格）"""
+        return self.send_batch(self.scroll_events(dy, dx))
+
+    def smooth_scroll_events(self, dy, dx=0, notch_only=False):
+        """高精度滚轮事件（单位：WHEEL_DELTA 的 1/120，可为小数）
+
+        不足一个单位的余量累积到下次；notch_only 时只发送整格（兼容只认整格的旧程序）。
+        方向反转时丢弃旧余量，避免反向滚动开头被抵消。
+        """
+        step = WHEEL_DELTA if notch_only else 1
+        events = []
+        for axis, delta, flag in ((0, dy, MOUSEEVENTF_WHEEL), (1, dx, MOUSEEVENTF_HWHEEL)):
+            if not delta:
+                continue
+            rest = self._wheel_rest[axis]
+            if rest * delta < 0:
+                rest = 0.0
+            total = rest + delta
+            amount = int(total / step) * step
+            self._wheel_rest[axis] = total - amount
+            if amount:
+                events.append(mouse_event(0, 0, flag, amount))
+        return events
+
+    def smooth_scroll(self, dy, dx=0, notch_only=False):
+        """高精度滚轮滚动（单位：WHEEL_DELTA 的 1/120）"""
+        return self.send_batch(self.smooth_scroll_events(dy, dx, notch_only))
+
+    def key_event(self, key, down=True):
+        """构造按键事件
+
+        表内按键使用预先计算的 (vk, 扫描码, 扩展键标志)；表外的单个字符以
+        KEYEVENTF_UNICODE 注入（不依赖键盘布局）；其他未知按键返回 None
+        """
+        entry = self.keys.lookup(key)
+        if entry is not None:
+            vk, scan, flags = entry
+            return (INPUT_KEYBOARD, vk, scan, flags if down else flags | KEYEVENTF_KEYUP, 0)
+        if len(key) == 1 and ord(key) < 0x10000:
+            return (INPUT_KEYBOARD, 0, ord(key), KEYEVENTF_UNICODE if down else KEYEVENTF_UNICODE | KEYEVENTF_KEYUP, 0)
+        return None
+
+    def text_events(self, text):
+        """整段文本 -> KEYEVENTF_UNICODE 事件序列
+
+        每个 UTF-16 码元一对按下/抬起（BMP 以外的字符拆成代理对）；
+        换行与制表符改用回车/Tab 键，很多程序不接受 Unicode 形式的控制字符
+        """
+        events = []
+        append = events.append
+        text = text.replace('\r\n', '\n').replace('\r', '\n')
+        data = text.encode('utf-16-le')
+        for i in range(0, len(data), 2):
+            unit = data[i] | (data[i + 1] << 8)
+            if unit == 0x0A or unit == 0x09:
+                vk = VK_RETURN if unit == 0x0A else VK_TAB
+                append((INPUT_KEYBOARD, vk, 0, 0, 0))
+                append((INPUT_KEYBOARD, vk, 0, KEYEVENTF_KEYUP, 0))
+            else:
+                append((INPUT_KEYBOARD, 0, unit, KEYEVENTF_UNICODE, 0))
+                append((INPUT_KEYBOARD, 0, unit, KEYEVENTF_UNICODE | KEYEVENTF_KEYUP, 0))
+        return events
+
+    def type_text(self, text):
+        """输入整段文本，一次 SendInput 提交"""
+        return self.send_batch(self.text_events(text))
 
     def key_down(self, key):
         """按键按下"""
-        key_lower = key.lower()
-        vk = VK_MAP.get(key_lower, ord(key.upper()) if len(key) == 1 else 0)
-        if vk:
-            use_scancode = key_lower in ('shift', 'ctrl', 'alt')
-            return send_keyboard_input(vk, 0, use_scancode=use_scancode)
-        return False
+        event = self.key_event(key, True)
+        return event is not None and self.send_batch((event,))
 
     def key_up(self, key):
         """按键抬起"""
-        key_lower = key.lower()
-        vk = VK_MAP.get(key_lower, ord(key.upper()) if len(key) == 1 else 0)
-        if vk:
-            use_scancode = key_lower in ('shift', 'ctrl', 'alt')
-            return send_keyboard_input(vk, KEYEVENTF_KEYUP, use_scancode=use_scancode)
-        return False
+        event = self.key_event(key, False)
+        return event is not None and self.send_batch((event,))
+
+    def key_combo(self, keys):
+        """组合键：依次按下，再逆序抬起，一次 SendInput 提交"""
+        events = [self.key_event(k, True) for k in keys]
+        events += [self.key_event(k, False) for k in reversed(keys)]
+        return self.send_batch(events)
 
 
-# 全局实例
+# 全局实例（首次使用时创建，服务端启动后在后台线程中预先创建）
 _input_sender = None
+_input_sender_lock = threading.Lock()
 
 def get_input_sender():
     """获取全局 InputSender 实例"""
     global _input_sender
     if _input_sender is None:
-        _input_sender = InputSender()
+        with _input_sender_lock:
+            if _input_sender is None:
+                _input_sender = InputSender()
     return _input_sender
 
 
@@ -0,0 +1,100 @@
+"""
+按键表 - 按键名 -> 虚拟键码 / 扩展键标志
+键名使用小写；浏览器 KeyboardEvent.key 名称通过 KEY_ALIASES 归一化。
+扫描码由 KeyTable 在创建时按输入后端一次性计算，注入时只做一次字典查找。
+"""
+
+from .input_backend import KEYEVENTF_EXTENDEDKEY, KEYEVENTF_SCANCODE
+
+VK_RETURN = 0x0D
+VK_TAB = 0x09
+
+# 标准键
+KEY_VK = {
+    'backspace': 0x08, 'tab': 0x09, 'clear': 0x0C, 'return': 0x0D,
+    'shift': 0x10, 'ctrl': 0x11, 'alt': 0x12, 'pause': 0x13, 'capslock': 0x14,
+    'esc': 0x1B, 'space': 0x20,
+    'pageup': 0x21, 'pagedown': 0x22, 'end': 0x23, 'home': 0x24,
+    'left': 0x25, 'up': 0x26, 'right': 0x27, 'down': 0x28,
+    'printscreen': 0x2C, 'insert': 0x2D, 'delete': 0x2E,
+    'win': 0x5B, 'lwin': 0x5B, 'rwin': 0x5C, 'apps': 0x5D, 'sleep': 0x5F,
+    # 小键盘
+    'num0': 0x60, 'num1': 0x61, 'num2': 0x62, 'num3': 0x63, 'num4': 0x64,
+    'num5': 0x65, 'num6': 0x66, 'num7': 0x67, 'num8': 0x68, 'num9': 0x69,
+    'multiply': 0x6A, 'add': 0x6B, 'separator': 0x6C, 'subtract': 0x6D,
+    'decimal': 0x6E, 'divide': 0x6F, 'numenter': 0x0D,
+    'numlock': 0x90, 'scrolllock': 0x91,
+    # 左右修饰键
+    'shiftleft': 0xA0, 'shiftright': 0xA1, 'ctrlleft': 0xA2, 'ctrlright': 0xA3,
+    'altleft': 0xA4, 'altright': 0xA5,
+    # 浏览器 / 媒体键
+    'browserback': 0xA6, 'browserforward': 0xA7, 'browserrefresh': 0xA8,
+    'browserstop': 0xA9, 'browsersearch': 0xAA, 'browserfavorites': 0xAB, 'browserhome': 0xAC,
+    'volumemute': 0xAD, 'volumedown': 0xAE, 'volumeup': 0xAF,
+    'nexttrack': 0xB0, 'prevtrack': 0xB1, 'stop': 0xB2, 'playpause': 0xB3,
+    'launchmail': 0xB4, 'launchmediaplayer': 0xB5, 'launchapp1': 0xB6, 'launchapp2': 0xB7,
+    # OEM 标点键（美式布局）
+    ';': 0xBA, '=': 0xBB, ',': 0xBC, '-': 0xBD, '.': 0xBE, '/': 0xBF, '`': 0xC0,
+    '[': 0xDB, '\\': 0xDC, ']': 0xDD, "'": 0xDE,
+}
+KEY_VK.update({f'f{i}': 0x70 + i - 1 for i in range(1, 25)})
+KEY_VK.update({chr(c): c for c in range(ord('0'), ord('9') + 1)})
+KEY_VK.update({chr(c).lower(): c for c in range(ord('A'), ord('Z') + 1)})
+
+# 需要 KEYEVENTF_EXTENDEDKEY 的键（方向键/编辑键区、右侧修饰键、小键盘除号与回车等）
+EXTENDED_KEYS = frozenset((
+    'pageup', 'pagedown', 'end', 'home', 'left', 'up', 'right', 'down',
+    'insert', 'delete', 'printscreen', 'win', 'lwin', 'rwin', 'apps',
+    'divide', 'numenter', 'numlock', 'ctrlright', 'altright',
+    'browserback', 'browserforward', 'browserrefresh', 'browserstop', 'browsersearch',
+    'browserfavorites', 'browserhome', 'volumemute', 'volumedown', 'volumeup',
+    'nexttrack', 'prevtrack', 'stop', 'playpause',
+    'launchmail', 'launchmediaplayer', 'launchapp1', 'launchapp2',
+))
+
+# 以扫描码注入的修饰键（游戏通常只读扫描码）
+SCANCODE_KEYS = frozenset(('shift', 'ctrl', 'alt'))
+
+# 浏览器 KeyboardEvent.key / code 名称 -> 表内键名
+KEY_ALIASES = {
+    'enter': 'return', 'escape': 'esc', ' ': 'space',
+    'arrowup': 'up', 'arrowdown': 'down', 'arrowleft': 'left', 'arrowright': 'right',
+    'control': 'ctrl', 'meta': 'win', 'windows': 'win', 'os': 'win', 'contextmenu': 'apps',
+    'del': 'delete', 'ins': 'insert', 'prtsc': 'printscreen',
+    'audiovolumemute': 'volumemute', 'audiovolumedown': 'volumedown', 'audiovolumeup': 'volumeup',
+    'mediatracknext': 'nexttrack', 'mediatrackprevious': 'prevtrack',
+    'mediastop': 'stop', 'mediaplaypause': 'playpause',
+    'controlleft': 'ctrlleft', 'controlright': 'ctrlright',
+    'numpadmultiply': 'multiply', 'numpadadd': 'add', 'numpadsubtract': 'subtract',
+    'numpaddecimal': 'decimal', 'numpaddivide': 'divide', 'numpadenter': 'numenter',
+}
+KEY_ALIASES.update({f'numpad{i}': f'num{i}' for i in range(10)})
+
+
+def normalize_key(key):
+    """浏览器键名 -> 表内键名（未知键原样返回小写）"""
+    name = key.lower() if len(key) > 1 else key
+    name = KEY_ALIASES.get(name, name)
+    return name.lower() if len(name) == 1 and name.isalpha() and name.isascii() else name
+
+
+class KeyTable:
+    """按后端预先计算的按键表：键名 -> (vk, 扫描码, 按下时的 dwFlags)"""
+
+    def __init__(self, backend):
+        self.entries = {}
+        for name, vk in KEY_VK.items():
+            scan = backend.map_virtual_key(vk)
+            flags = KEYEVENTF_EXTENDEDKEY if name in EXTENDED_KEYS else 0
+            if name in SCANCODE_KEYS and scan:
+                # 只发扫描码，vk 置 0
+                self.entries[name] = (0, scan, flags | KEYEVENTF_SCANCODE)
+            else:
+                self.entries[name] = (vk, scan, flags)
+
+    def lookup(self, key):
+        """返回 (vk, 扫描码, flags)，未知按键返回 None"""
+        entry = self.entries.get(key)
+        if entry is None:
+            entry = self.entries.get(normalize_key(key))
+        return entry
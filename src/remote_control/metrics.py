@@ -0,0 +1,274 @@
+"""
+运行时指标 - 直方图、计数器、速率与瞬时值
+桶计数使用预分配列表，记录一次样本只做一次二分查找和几次整数加法；
+瞬时值（队列深度、退避状态等）只在导出时读取，不占热路径。
+render_prometheus() 按 Prometheus 文本格式导出，snapshot() 导出 JSON。
+"""
+
+import bisect
+import math
+import re
+import threading
+import time
+
+# 毫秒级默认桶边界（近似对数分布，覆盖 0.25ms ~ 1s）
+DEFAULT_MS_BUCKETS = (
+    0.25, 0.5, 1.0, 2.0, 4.0, 6.0, 8.0, 12.0, 16.0, 24.0,
+    33.0, 50.0, 75.0, 100.0, 150.0, 250.0, 500.0, 1000.0,
+)
+
+
+class Histogram:
+    """固定桶直方图
+
+    为了让热路径开销可控，记录时不加锁：极端并发下可能丢失个别样本，
+    对统计分布没有实际影响。
+    """
+
+    def __init__(self, name, bounds=DEFAULT_MS_BUCKETS):
+        self.name = name
+        self.bounds = tuple(bounds)
+        self.counts = [0] * (len(self.bounds) + 1)
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.count += 1
+        self.total += value
+        if value > self.max:
+            self.max = value
+
+    def percentile(self, q):
+        """按桶估算分位数（桶内线性插值）"""
+        count = self.count
+        if count <= 0:
+            return 0.0
+        target = q * count
+        seen = 0
+        lower = 0.0
+        for i, c in enumerate(self.counts):
+            upper = self.bounds[i] if i < len(self.bounds) else self.max
+            if c and seen + c >= target:
+                frac = (target - seen) / c
+                return lower + (max(upper, lower) - lower) * frac
+            seen += c
+            lower = upper
+        return self.max
+
+    def reset(self):
+        for i in range(len(self.counts)):
+            self.counts[i] = 0
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+
+    def snapshot(self):
+        count = self.count
+        return {
+            'count': count,
+            'sum': round(self.total, 3),
+            'avg': round(self.total / count, 3) if count else 0.0,
+            'p50': round(self.percentile(0.50), 3),
+            'p95': round(self.percentile(0.95), 3),
+            'p99': round(self.percentile(0.99), 3),
+            'max': round(self.max, 3),
+            'buckets': list(zip(self.bounds, self.counts)) + [('+Inf', self.counts[-1])],
+        }
+
+
+class Counter:
+    """单调递增计数器"""
+
+    def __init__(self, name):
+        self.name = name
+        self.value = 0
+
+    def inc(self, n=1):
+        self.value += n
+
+
+class Meter(Counter):
+    """计数器 + 最近一个统计窗口内的每秒速率（帧率、事件/秒）"""
+
+    def __init__(self, name, window=1.0):
+        super().__init__(name)
+        self.window = window
+        self.rate = 0.0
+        self._window_start = time.perf_counter()
+        self._window_value = 0
+
+    def inc(self, n=1):
+        self.value += n
+        now = time.perf_counter()
+        elapsed = now - self._window_start
+        if elapsed >= self.window:
+            self.rate = (self.value - self._window_value) / elapsed
+            self._window_start = now
+            self._window_value = self.value
+
+    def per_second(self):
+        elapsed = time.perf_counter() - self._window_start
+        # 超过一个窗口没有新事件时按当前窗口计算，避免显示过期的速率
+        if elapsed >= self.window:
+            return (self.value - self._window_value) / elapsed
+        return self.rate
+
+
+class Gauge:
+    """瞬时值：set() 写入，或在导出时调用 fn()
+
+    fn 可以返回数值，或 {标签值: 数值}（配合 label 导出为多条带标签的样本）
+    """
+
+    def __init__(self, name, fn=None, label=None):
+        self.name = name
+        self.fn = fn
+        self.label = label
+        self.value = 0.0
+
+    def set(self, value):
+        self.value = value
+
+    def read(self):
+        if self.fn is None:
+            return self.value
+        try:
+            return self.fn()
+        except Exception:
+            return None
+
+
+_registry_lock = threading.Lock()
+_histograms = {}
+_counters = {}
+_gauges = {}
+
+
+def get_histogram(name, bounds=DEFAULT_MS_BUCKETS):
+    """获取（必要时创建）命名直方图"""
+    hist = _histograms.get(name)
+    if hist is None:
+        with _registry_lock:
+            hist = _histograms.get(name)
+            if hist is None:
+                hist = Histogram(name, bounds)
+                _histograms[name] = hist
+    return hist
+
+
+def get_counter(name):
+    """获取（必要时创建）命名计数器"""
+    counter = _counters.get(name)
+    if counter is None:
+        with _registry_lock:
+            counter = _counters.get(name)
+            if counter is None:
+                counter = Counter(name)
+                _counters[name] = counter
+    return counter
+
+
+def get_meter(name, window=1.0):
+    """获取（必要时创建）带速率的计数器"""
+    counter = _counters.get(name)
+    if not isinstance(counter, Meter):
+        with _registry_lock:
+            counter = _counters.get(name)
+            if not isinstance(counter, Meter):
+                meter = Meter(name, window)
+                if counter is not None:
+                    meter.value = meter._window_value = counter.value
+                counter = meter
+                _counters[name] = counter
+    return counter
+
+
+def register_gauge(name, fn=None, label=None):
+    """注册瞬时值（同名重复注册时替换读取函数）"""
+    with _registry_lock:
+        gauge = Gauge(name, fn, label)
+        _gauges[name] = gauge
+    return gauge
+
+
+def _registered(prefix):
+    with _registry_lock:
+        hists = [h for h in _histograms.values() if h.name.startswith(prefix)]
+        counters = [c for c in _counters.values() if c.name.startswith(prefix)]
+        gauges = [g for g in _gauges.values() if g.name.startswith(prefix)]
+    return hists, counters, gauges
+
+
+def snapshot(prefix='', gauges=True):
+    """导出所有（或指定前缀的）指标快照
+
+    gauges=False 时不读取瞬时值：部分瞬时值的读取函数会阻塞（如 WebRTC peer 码率需要等待 getStats），
+    且带有状态（两次读取之间的差值），只应由 /api/metrics 读取。
+    """
+    hists, counters, registered_gauges = _registered(prefix)
+    return {
+        'histograms': {h.name: h.snapshot() for h in hists},
+        'counters': {c.name: c.value for c in counters},
+        'rates': {c.name: round(c.per_second(), 2) for c in counters if isinstance(c, Meter)},
+        'gauges': {g.name: g.read() for g in registered_gauges} if gauges else {},
+    }
+
+
+# ============ Prometheus 文本格式 ============
+
+_NAME_RE = re.compile(r'[^a-zA-Z0-9_]')
+
+
+def _metric_name(namespace, name):
+    return f"{namespace}_{_NAME_RE.sub('_', name)}"
+
+
+def _label_value(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _number(value):
+    if isinstance(value, bool):
+        return '1' if value else '0'
+    if isinstance(value, float) and not math.isfinite(value):
+        return '+Inf' if value > 0 else ('-Inf' if value < 0 else 'NaN')
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+def render_prometheus(prefix='', namespace='rc'):
+    """按 Prometheus 文本格式（0.0.4）导出"""
+    hists, counters, gauges = _registered(prefix)
+    lines = []
+    for h in sorted(hists, key=lambda h: h.name):
+        name = _metric_name(namespace, h.name)
+        lines.append(f"# TYPE {name} histogram")
+        cumulative = 0
+        for bound, count in zip(h.bounds, h.counts):
+            cumulative += count
+            lines.append(f'{name}_bucket{{le="{_number(float(bound))}"}} {cumulative}')
+        lines.append(f'{name}_bucket{{le="+Inf"}} {h.count}')
+        lines.append(f"{name}_sum {_number(float(h.total))}")
+        lines.append(f"{name}_count {h.count}")
+    for c in sorted(counters, key=lambda c: c.name):
+        name = _metric_name(namespace, c.name)
+        lines.append(f"# TYPE {name}_total counter")
+        lines.append(f"{name}_total {c.value}")
+        if isinstance(c, Meter):
+            lines.append(f"# TYPE {name}_per_second gauge")
+            lines.append(f"{name}_per_second {_number(float(c.per_second()))}")
+    for g in sorted(gauges, key=lambda g: g.name):
+        value = g.read()
+        if value is None:
+            continue
+        name = _metric_name(namespace, g.name)
+        lines.append(f"# TYPE {name} gauge")
+        if isinstance(value, dict):
+            label = g.label or 'key'
+            for key, v in value.items():
+                lines.append(f'{name}{{{label}="{_label_value(key)}"}} {_number(v)}')
+        else:
+            lines.append(f"{name} {_number(value)}")
+    lines.append('')
+    return '\n'.join(lines)
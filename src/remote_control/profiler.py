@@ -0,0 +1,214 @@
+"""
+采样分析器与逐帧时间线 - 卡顿排查用，按需开启，未开启时不产生开销
+
+采样分析（sample）:
+    后台线程每隔 interval 秒读取一次 sys._current_frames()，记录所有线程（或名称匹配的线程）的调用栈，
+    持续 duration 秒。被采样线程无需配合；等待锁 / IO 的线程同样会被记录（栈顶为 wait / select 等）。
+    结果按线程名聚合：
+        collapsed()   折叠栈文本，每行 "线程;文件:函数;...;文件:函数 次数"（flamegraph.pl、speedscope 可读）
+        speedscope()  speedscope 文件格式，每个线程一个 sampled profile
+
+逐帧时间线（record_trace）:
+    流水线各阶段调用 span(名称, 开始, 结束) 报告 perf_counter 起止时间，只在录制期间写入有界缓冲；
+    导出为 Chrome trace event 格式（chrome://tracing、ui.perfetto.dev 可直接打开），
+    每个线程（或指定的 lane）一行，args 中带帧序号 / peer。
+
+同一时间只允许一个采样或录制，否则抛出 ProfilerBusy。本模块只依赖标准库。
+"""
+
+import collections
+import os
+import sys
+import threading
+import time
+
+DEFAULT_INTERVAL = 0.005        # 采样间隔（秒），200Hz
+THREAD_NAMES_REFRESH = 0.5      # 线程名表刷新间隔（秒）
+TRACE_MAX_EVENTS = 200000       # 时间线缓冲上限，超过后丢弃最早的事件
+
+SPEEDSCOPE_SCHEMA = "https://www.speedscope.app/file-format-schema.json"
+
+
+class ProfilerBusy(RuntimeError):
+    """已有采样或时间线录制在进行"""
+
+
+_busy = threading.Lock()
+
+# 时间线录制状态：span() 只读取 _trace_active，未录制时立即返回
+_trace_active = False
+_trace_events = collections.deque(maxlen=TRACE_MAX_EVENTS)
+
+
+class Profile:
+    """一次采样的结果：{(线程名, 栈): 次数}，栈为从根到叶的帧下标元组"""
+
+    def __init__(self, interval, duration, samples, frames, stacks):
+        self.interval = interval
+        self.duration = duration
+        self.samples = samples
+        self.frames = frames          # [(函数名, 文件, 首行号)]
+        self.stacks = stacks
+
+    def threads(self):
+        """各线程的采样次数，从多到少"""
+        counts = collections.Counter()
+        for (thread, _), count in self.stacks.items():
+            counts[thread] += count
+        return counts.most_common()
+
+    def _label(self, index):
+        name, filename, _ = self.frames[index]
+        return f"{os.path.basename(filename)}:{name}"
+
+    def collapsed(self):
+        lines = []
+        for (thread, stack), count in sorted(self.stacks.items(), key=lambda item: -item[1]):
+            path = ';'.join([thread.replace(';', '_')] + [self._label(i) for i in stack])
+            lines.append(f"{path} {count}")
+        return '\n'.join(lines) + '\n'
+
+    def speedscope(self, name='remote-control'):
+        interval_ms = self.interval * 1000.0
+        profiles = []
+        for thread, total in self.threads():
+            samples = []
+            weights = []
+            for (owner, stack), count in self.stacks.items():
+                if owner == thread:
+                    samples.append(list(stack))
+                    weights.append(round(count * interval_ms, 3))
+            profiles.append({
+                'type': 'sampled',
+                'name': f"{thread} ({total} samples)",
+                'unit': 'milliseconds',
+                'startValue': 0,
+                'endValue': round(total * interval_ms, 3),
+                'samples': samples,
+                'weights': weights,
+            })
+        return {
+            '$schema': SPEEDSCOPE_SCHEMA,
+            'name': name,
+            'exporter': 'remote_control.profiler',
+            'activeProfileIndex': 0,
+            'shared': {'frames': [{'name': n, 'file': f, 'line': line} for n, f, line in self.frames]},
+            'profiles': profiles,
+        }
+
+
+def _thread_names():
+    return {t.ident: t.name for t in threading.enumerate()}
+
+
+def sample(duration, interval=DEFAULT_INTERVAL, threads=None):
+    """阻塞采样 duration 秒；threads 为线程名子串列表，None 表示全部线程"""
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy("profiler busy")
+    try:
+        return _sample(duration, interval, threads)
+    finally:
+        _busy.release()
+
+
+def _sample(duration, interval, threads):
+    me = threading.get_ident()
+    frame_index = {}   # code -> 帧下标
+    frames = []
+    stacks = collections.Counter()
+    names = _thread_names()
+    names_at = time.perf_counter()
+    samples = 0
+
+    started = time.perf_counter()
+    deadline = started + duration
+    next_tick = started
+    while True:
+        now = time.perf_counter()
+        if now >= deadline:
+            break
+        if now - names_at >= THREAD_NAMES_REFRESH:
+            names = _thread_names()
+            names_at = now
+        for ident, frame in sys._current_frames().items():
+            if ident == me:
+                continue
+            name = names.get(ident) or f"thread-{ident}"
+            if threads and not any(t in name for t in threads):
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                index = frame_index.get(code)
+                if index is None:
+                    index = frame_index[code] = len(frames)
+                    frames.append((code.co_name, code.co_filename, code.co_firstlineno))
+                stack.append(index)
+                frame = frame.f_back
+            stack.reverse()
+            stacks[(name, tuple(stack))] += 1
+        samples += 1
+        next_tick += interval
+        delay = next_tick - time.perf_counter()
+        if delay > 0:
+            time.sleep(delay)
+        else:
+            # 采样跟不上（线程很多或 GIL 被长时间占用）时不追赶
+            next_tick = time.perf_counter()
+    return Profile(interval, time.perf_counter() - started, samples, frames, stacks)
+
+
+# ============ 逐帧时间线 ============
+
+def tracing():
+    return _trace_active
+
+
+def span(name, start, end, lane=None, **args):
+    """记录一个阶段 [start, end]（perf_counter 秒）；lane 为空时取当前线程名"""
+    if not _trace_active:
+        return
+    _trace_events.append((name, lane or threading.current_thread().name, start, end, args))
+
+
+def record_trace(duration):
+    """阻塞录制 duration 秒的时间线，返回 Chrome trace event 格式的 dict"""
+    global _trace_active
+    if not _busy.acquire(blocking=False):
+        raise ProfilerBusy("profiler busy")
+    try:
+        _trace_events.clear()
+        started = time.perf_counter()
+        _trace_active = True
+        try:
+            time.sleep(duration)
+        finally:
+            _trace_active = False
+        events = list(_trace_events)
+        _trace_events.clear()
+    finally:
+        _busy.release()
+    return chrome_trace(events, started)
+
+
+def chrome_trace(events, origin):
+    """(名称, lane, 开始, 结束, args) 列表 -> Chrome trace event 格式，时间相对 origin（微秒）"""
+    pid = os.getpid()
+    lanes = {}
+    trace_events = []
+    for name, lane, start, end, args in events:
+        tid = lanes.get(lane)
+        if tid is None:
+            tid = lanes[lane] = len(lanes) + 1
+            trace_events.append({'name': 'thread_name', 'ph': 'M', 'pid': pid, 'tid': tid, 'args': {'name': lane}})
+        trace_events.append({
+            'name': name,
+            'cat': 'pipeline',
+            'ph': 'X',
+            'pid': pid,
+            'tid': tid,
+            'ts': round((start - origin) * 1e6, 1),
+            'dur': round(max(0.0, end - start) * 1e6, 1),
+            'args': args,
+        })
+    return {'traceEvents': trace_events, 'displayTimeUnit': 'ms'}
@@ -7,18 +7,25 @@
 import asyncio
 import base64
 import ctypes
+import hmac
 import io
 import json
 import os
 import sys
 import threading
 import time
-from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
+from . import startup_timing
+
+startup_timing.mark('标准库（asyncio 等）')
+
 import mss
 import numpy as np
 
+startup_timing.mark('numpy / mss')
+
 DEBUG_LOG_ENABLED = os.getenv("RC_DEBUG", "0") == "1"
 
 
@@ -51,16 +58,51 @@ except ImportError as e:
     print(f"[错误] 无法导入 Pillow: {e}")
     print("请运行: python -m pip install Pillow")
     exit(1)
+startup_timing.mark('Pillow')
 
 PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
 VENDOR_DIR = os.path.join(PROJECT_ROOT, "vendor", "py312")
-if os.path.isdir(VENDOR_DIR) and VENDOR_DIR not in sys.path:
+# 内置依赖为 Windows 版二进制（cp312-win_amd64），其它平台使用系统安装的 aiortc / av
+if os.name == 'nt' and os.path.isdir(VENDOR_DIR) and VENDOR_DIR not in sys.path:
     sys.path.insert(0, VENDOR_DIR)
 
 from flask import Flask, Response, render_template, request
 from flask_cors import CORS
-from flask_socketio import SocketIO, emit
-import pyautogui
+from flask_socketio import SocketIO
+
+startup_timing.mark('Flask / Flask-SocketIO')
+
+# pyautogui 仅作为底层输入不可用时的最后回退，首次需要时才加载
+pyautogui = None
+_pyautogui_load_failed = False
+
+
+def _get_pyautogui():
+    """延迟加载 pyautogui，不可用时返回 None"""
+    global pyautogui, _pyautogui_load_failed
+    if pyautogui is None and not _pyautogui_load_failed:
+        try:
+            import pyautogui as pg
+            pg.FAILSAFE = True
+            # 默认 PAUSE 会让每次调用额外休眠，回退路径同样不需要
+            pg.PAUSE = 0
+            pyautogui = pg
+            print("[输入] 已加载 pyautogui 回退")
+        except Exception as e:
+            _pyautogui_load_failed = True
+            print(f"[输入] pyautogui 未启用: {e}")
+    return pyautogui
+
+
+from . import codec_select, frame_marker, input_protocol, keymap, metrics, profiler
+from .capture_process import CaptureProcess
+from .cursor_watcher import CursorWatcher
+from .display_geometry import DisplayGeometry
+from .frame_cache import ScaledFrameCache
+from .input_injector import InputInjector
+from .gamepad_pool import MOCK_BUTTON_BITS, GamepadPool, MockGamepad
+from .sessions import DEFAULT_WEBRTC_SCALE, SessionRegistry
+from .xinput_slots import normalize_state as xinput_normalize_state
 
 # 导入底层输入模块
 try:
@@ -71,52 +113,122 @@ except Exception as e:
     print(f"[输入] 底层 SendInput API 加载失败: {e}")
     INPUT_SENDER_AVAILABLE = False
 
-XINPUT_AVAILABLE = False
+startup_timing.mark('项目模块')
+
+# vgamepad 导入时会连接 ViGEmBus 驱动，首次需要虚拟手柄时（或启动后的后台预热中）才加载，见 load_vgamepad()
+XINPUT_MOCK = os.getenv("RC_XINPUT_MOCK", "0") == "1"  # 使用 MockGamepad（测试 / 非 Windows）
+XINPUT_AVAILABLE = XINPUT_MOCK
 vg = None
-XUSB_BUTTON = None
-try:
-    if os.name == 'nt':
-        import vgamepad as _vg
-        vg = _vg
-        XUSB_BUTTON = vg.XUSB_BUTTON
-        XINPUT_AVAILABLE = True
-except Exception as e:
-    print(f"[手柄] vgamepad 未启用: {e}")
+_vgamepad_load_failed = os.name != 'nt' or XINPUT_MOCK
+_vgamepad_lock = threading.Lock()
 
+# aiortc / av 导入需要数百毫秒，首次需要 WebRTC 时（或启动后的后台预热中）才加载，见 load_webrtc()
 WEBRTC_AVAILABLE = False
-try:
-    from aiortc import RTCPeerConnection, RTCSessionDescription
-    from aiortc.rtcrtpsender import RTCRtpSender
-    from aiortc.mediastreams import VideoStreamTrack
-    from av import VideoFrame
-    WEBRTC_AVAILABLE = True
-except Exception as e:
-    print(f"[WebRTC] 依赖加载失败: {e}")
+_webrtc_load_failed = False
+_webrtc_import_lock = threading.Lock()
+RTCConfiguration = RTCPeerConnection = RTCSessionDescription = None
+candidate_from_sdp = RTCRtpSender = aiortc_vpx = None
+VIDEO_TIME_BASE = VideoStreamTrack = VideoFrame = None
+ScreenVideoTrack = None
 
 # 配置
 STATIC_DIR = os.path.join(PROJECT_ROOT, 'static')
 TEMPLATE_DIR = os.path.join(PROJECT_ROOT, 'templates')
 app = Flask(__name__, static_folder=STATIC_DIR, template_folder=TEMPLATE_DIR)
 CORS(app)
-socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading', logger=False, engineio_logger=False)
+# async_handlers=False：事件在连接的接收线程中按到达顺序处理，不再每个事件新开线程
+socketio = SocketIO(app, cors_allowed_origins="*", async_mode='threading', async_handlers=False,
+                    logger=False, engineio_logger=False)
+startup_timing.mark('Flask 应用', kind='init')
+
+
+class ThreadingTransport:
+    """Flask-SocketIO（threading 模式）下的推送与房间操作，可在任意线程调用"""
+
+    def emit(self, event, payload=None, to=None):
+        socketio.emit(event, payload, to=to)
+
+    def remote_addr(self, sid):
+        environ = socketio.server.get_environ(sid, namespace='/') or {}
+        return environ.get('REMOTE_ADDR')
+
+    def enter_room(self, sid, room):
+        socketio.server.enter_room(sid, room, namespace='/')
 
-# 设置 pyautogui 安全模式（防止失控）
-pyautogui.FAILSAFE = True
-pyautogui.PAUSE = 0.01
+    def leave_room(self, sid, room):
+        socketio.server.leave_room(sid, room, namespace='/')
+
+
+# 所有推送都经过 transport；asyncio 服务模式（async_server.py）会替换为 AsyncTransport
+transport = ThreadingTransport()
+
+# 会话事件 fn(sid, data)：线程模式与 asyncio 服务模式共用同一份处理逻辑
+SESSION_EVENTS = {}
+
+
+def session_event(name):
+    """注册会话事件，同时注册为 Flask-SocketIO 处理函数"""
+    def decorator(fn):
+        SESSION_EVENTS[name] = fn
+        socketio.on_event(name, lambda data=None: fn(request.sid, data))
+        return fn
+    return decorator
+
+
+# 输入事件 fn(sid, data)：Socket.IO 与 WebRTC DataChannel 共用，只负责入队
+INPUT_CHANNEL_HANDLERS = {}
+
+
+def input_event(name):
+    """注册输入事件（DataChannel 分发表 + Flask-SocketIO 处理函数）"""
+    def decorator(fn):
+        INPUT_CHANNEL_HANDLERS[name] = fn
+        socketio.on_event(name, lambda data=None: fn(request.sid, data or {}))
+        return fn
+    return decorator
 
 # 全局状态
-connected_clients = 0
+SERVER_PORT = int(os.getenv("RC_PORT", "5000"))
+# 每个连接一个会话：画质、帧率、缩放、捕获区域、输入模式互相独立（见 sessions.py）
+sessions = SessionRegistry()
 screen_capture_running = False
-quality = 60  # 图像质量 1-95
-fps = 30      # 目标帧率
+TYPE_TEXT_MAX_CHARS = 10000  # 单次 type_text 的最大字符数
+scroll_notch_only = os.getenv("RC_SCROLL_NOTCH_ONLY", "0") == "1"  # 桌面滚动只发送整格（兼容旧程序）
 
 webrtc_enabled = True
 webrtc_target_fps = 60
-webrtc_scale = 0.5
 webrtc_peers = {}
 webrtc_loop = None
 webrtc_loop_thread = None
 webrtc_frame_pump = None
+# 捕获/JPEG 编码放到独立进程（共享内存交接帧），控制进程只处理输入与信令，见 capture_process.py
+capture_process_enabled = os.getenv("RC_CAPTURE_PROCESS", "0") == "1"
+capture_source = os.getenv("RC_CAPTURE_SOURCE", "")  # 捕获来源: dxgi / mss / synthetic，默认按 DXGI 开关选择
+synthetic_content = os.getenv("RC_SYNTHETIC_CONTENT", "gradient")  # 合成画面类型，见 synthetic_source.py
+synthetic_source = None
+# 延迟探针：捕获后在画面左上角写入时间条码，客户端解码显示中的条码并回报，见 frame_marker.py
+latency_probe_enabled = os.getenv("RC_LATENCY_PROBE", "0") == "1"
+capture_proc = None
+capture_proc_lock = threading.Lock()
+mjpeg_streams = 0
+webrtc_runtime_lock = threading.Lock()
+webrtc_pending_candidates = {}
+webrtc_offer_times = {}
+webrtc_offers_in_flight = set()  # 已收到、answer 尚未发出的 offer（sid），期间不停止 pump
+webrtc_lan_only = os.getenv("RC_WEBRTC_LAN_ONLY", "0") == "1"  # 可选：仅收集局域网网卡 host 候选，不走 STUN
+webrtc_host_limit_warned = False
+webrtc_max_frame_age = float(os.getenv("RC_WEBRTC_MAX_FRAME_AGE", "0.05"))  # 秒，超过则丢弃旧帧
+webrtc_vp8_screen_content = os.getenv("RC_VP8_SCREEN_CONTENT", "1") == "1"  # VP8 使用屏幕内容编码配置
+webrtc_default_codec = os.getenv("RC_WEBRTC_CODEC", "H264").upper()  # 基准测试完成前的首选编码器
+# 预热状态：idle / warming / ready / failed
+webrtc_warmup_lock = threading.Lock()
+webrtc_warmup_state = 'idle'
+webrtc_warmup_report = {}
+webrtc_warm_encoder = None
+webrtc_warm_codec = None
+WEBRTC_WARMUP_PTS_STEP = 1500  # 90kHz 时钟下 60fps 的一帧
+# 预热完成后这么久（秒）仍没有 offer（客户端停留在 MJPEG）时停止 pump 并释放预热编码器
+webrtc_warm_idle_s = float(os.getenv("RC_WEBRTC_WARM_IDLE", "30"))
 
 # DXGI 相机实例
 dxgi_camera = None
@@ -127,24 +239,35 @@ dxgi_retry_after = 0.0
 
 mss_local = threading.local()
 
-# 输入模式
-game_mode = False  # 游戏模式：使用底层 SendInput，禁用鼠标同步
-input_sender = None
-if INPUT_SENDER_AVAILABLE:
-    input_sender = get_input_sender()
 
-xinput_lock = threading.RLock()
-xinput_pad = None
-xinput_owner_sid = None
-xinput_last_buttons = 0
+def _input_sender():
+    """底层输入发送器，首次使用时创建（选择输入后端、设置 DPI 感知、计算扫描码表）"""
+    return get_input_sender() if INPUT_SENDER_AVAILABLE else None
+
+
+def _probe_screen_size():
+    """非 Windows 环境的屏幕尺寸探测，优先使用输入后端"""
+    input_sender = _input_sender()
+    if input_sender:
+        return input_sender.get_screen_size()
+    pg = _get_pyautogui()
+    return tuple(pg.size()) if pg is not None else (1920, 1080)
+
+
+# 显示几何信息由后台线程定期检查，处理函数只读取缓存快照
+display_geometry = DisplayGeometry(
+    fallback_size=_probe_screen_size,
+    interval=float(os.getenv("RC_DISPLAY_CHECK_INTERVAL", "2.0")),
+)
+
+
+def get_screen_size():
+    """屏幕尺寸（物理像素，缓存）"""
+    return display_geometry.screen_size()
+
 xinput_state_count = 0
 xinput_state_last_log = 0.0
-xinput_state_queue = deque(maxlen=256)
-xinput_state_event = threading.Event()
-xinput_worker_started = False
-xinput_apply_count = 0
-xinput_apply_nonzero = 0
-xinput_apply_last_log = 0.0
+xinput_report_hz = int(os.getenv("RC_XINPUT_REPORT_HZ", "250"))  # 虚拟手柄最高上报频率
 
 def is_running_as_admin():
     try:
@@ -152,9 +275,6 @@ def is_running_as_admin():
     except Exception:
         return False
 
-if not is_running_as_admin():
-    print("[提示] 当前未以管理员权限运行：对管理员权限窗口的鼠标/按键注入可能会失效")
-    print("[提示] 请使用 start_admin.bat 以管理员模式启动")
 
 def init_dxgi_camera():
     """初始化 DXGI 相机"""
@@ -209,6 +329,7 @@ def release_dxgi_camera():
 def handle_dxgi_error(err):
     """记录 DXGI 错误并进入退避，避免失败后高频重建导致屏闪。"""
     global dxgi_failure_count, dxgi_retry_after
+    metrics.get_counter('capture.dxgi_errors').inc()
     dxgi_failure_count = min(dxgi_failure_count + 1, 8)
     backoff = min(30.0, float(2 ** (dxgi_failure_count - 1)))
     dxgi_retry_after = time.time() + backoff
@@ -223,33 +344,74 @@ def should_try_dxgi():
 
 
 def get_local_ip():
-    """获取本机局域网IP"""
-    import socket
-    try:
-        s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
-        s.connect(("8.8.8.8", 80))
-        ip = s.getsockname()[0]
-        s.close()
-        return ip
-    except:
-        return "127.0.0.1"
+    """获取本机局域网IP（缓存，由显示几何刷新线程定期更新）"""
+    return display_geometry.local_ip()
 
 
 def get_mss():
     inst = getattr(mss_local, "inst", None)
     monitor = getattr(mss_local, "monitor", None)
-    if inst is None or monitor is None:
+    version = display_geometry.current().version
+    if inst is None or monitor is None or getattr(mss_local, "version", None) != version:
+        # 显示器布局变化后 mss 缓存的 monitors 已失效，重新创建
+        if inst is not None:
+            try:
+                inst.close()
+            except Exception:
+                pass
         inst = mss.mss()
         monitor = inst.monitors[0]
         mss_local.inst = inst
         mss_local.monitor = monitor
+        mss_local.version = version
     return inst, monitor
 
 
+def display_payload(info=None):
+    """发送给客户端的显示几何信息"""
+    info = info or display_geometry.current()
+    return {
+        'screen_width': info.width,
+        'screen_height': info.height,
+        'virtual': list(info.virtual),
+        'monitors': [list(m) for m in info.monitors],
+        'dpi_scale': info.dpi_scale,
+    }
+
+
+def _on_display_changed(old, new):
+    """分辨率/显示器布局变化：更新输入坐标范围、重建 DXGI 相机并通知所有客户端"""
+    input_sender = _input_sender()
+    if input_sender:
+        input_sender.screen_width, input_sender.screen_height = new.width, new.height
+    if dxgi_camera is not None:
+        release_dxgi_camera()
+    if capture_proc is not None and capture_proc.is_running():
+        capture_proc.restart(new.virtual[2:])
+    # 旧尺寸的派生帧不再有效（区域也按新尺寸重新计算）
+    frame_cache.clear()
+    transport.emit('display_changed', display_payload(new))
+
+
+display_geometry.add_listener(_on_display_changed)
+
+
+def _synthetic_frame():
+    """合成画面（RC_CAPTURE_SOURCE=synthetic，无显示环境与自动化测试）"""
+    global synthetic_source
+    if synthetic_source is None:
+        from .synthetic_source import SyntheticSource
+        synthetic_source = SyntheticSource(*get_screen_size(), content=synthetic_content)
+    return synthetic_source.grab()
+
+
 def capture_screen():
     """捕获屏幕 - 优先使用 DXGI，失败时回退到 mss"""
     global dxgi_camera
 
+    if capture_source == 'synthetic':
+        return Image.fromarray(_synthetic_frame())
+
     # 尝试使用 DXGI 捕获
     if should_try_dxgi():
         try:
@@ -294,6 +456,9 @@ def capture_screen():
 def capture_screen_rgb_np():
     global dxgi_camera
 
+    if capture_source == 'synthetic':
+        return _synthetic_frame()
+
     if should_try_dxgi():
         try:
             with dxgi_lock:
@@ -329,30 +494,54 @@ def capture_screen_rgb_np():
 
 class WebRTCFramePump:
     def __init__(self):
-        self._lock = threading.Lock()
+        self._cond = threading.Condition()
         self._latest = None
+        self._latest_time = 0.0
+        self._seq = 0
         self._running = False
+        self._generation = 0
         self._thread = None
 
     def start(self):
         if self._running:
             return
         self._running = True
-        self._thread = threading.Thread(target=self._run, daemon=True)
+        # stop 后立即 start 时旧线程可能仍在休眠，按代数区分，旧线程醒来后自行退出
+        self._generation += 1
+        self._thread = threading.Thread(target=self._run, args=(self._generation,), daemon=True,
+                                        name="WebRTCFramePump")
         self._thread.start()
 
     def stop(self):
         self._running = False
+        with self._cond:
+            self._cond.notify_all()
 
     def get_latest(self):
-        with self._lock:
+        with self._cond:
             return self._latest
 
-    def _run(self):
-        global webrtc_target_fps, webrtc_scale
-        while self._running:
+    def get_latest_entry(self):
+        """返回 (序号, 帧, 捕获时间)"""
+        with self._cond:
+            return self._seq, self._latest, self._latest_time
+
+    def wait_newer(self, seq, timeout):
+        """等待比 seq 更新的帧，超时则返回当前最新帧"""
+        with self._cond:
+            if self._seq == seq and self._running:
+                self._cond.wait(timeout)
+            return self._seq, self._latest, self._latest_time
+
+    def _run(self, generation):
+        capture_hist = metrics.get_histogram('webrtc.capture_ms')
+        while self._running and self._generation == generation:
             t0 = time.time()
+            p0 = time.perf_counter()
             frame = capture_screen_rgb_np()
+            p1 = time.perf_counter()
+            if frame is not None and latency_probe_enabled:
+                frame_marker.stamp(frame, frame_marker.now_value())
             if frame is None:
                 interval = 1.0 / max(1, int(webrtc_target_fps))
                 dt = time.time() - t0
@@ -360,11 +549,15 @@ class WebRTCFramePump:
                 if sleep_time > 0:
                     time.sleep(sleep_time)
                 continue
-            if webrtc_scale == 0.5 and frame is not None:
-                frame = frame[::2, ::2, :]
-                frame = np.ascontiguousarray(frame)
-            with self._lock:
+            # 保存原始分辨率帧，各会话按自己的缩放/区域经 frame_cache 派生
+            capture_hist.observe((p1 - p0) * 1000.0)
+            with self._cond:
                 self._latest = frame
+                self._latest_time = t0
+                self._seq += 1
+                seq = self._seq
+                self._cond.notify_all()
+            profiler.span('capture', p0, p1, seq=seq)
 
             interval = 1.0 / max(1, int(webrtc_target_fps))
             dt = time.time() - t0
@@ -373,33 +566,163 @@ class WebRTCFramePump:
                 time.sleep(sleep_time)
 
 
-if WEBRTC_AVAILABLE:
+# 共享捕获帧按 (缩放, 区域) 派生的画面，相同推流配置的会话共用
+frame_cache = ScaledFrameCache()
+
+
+class WebRTCStageRecorder:
+    """记录单个 peer 各流水线阶段耗时，并统计编码与发送的重叠时间"""
+
+    def __init__(self, peer=''):
+        self._peer = peer
+        # 时间线上每个 peer 的编码 / 发送各占一行（回调在事件循环线程中调用，不能按线程区分）
+        self._lanes = {stage: f"peer {peer[:8]} {stage}" for stage in ('encode', 'send', 'encoder_open')}
+        self._last = {}
+        self._hists = {
+            'encode': metrics.get_histogram('webrtc.encode_ms'),
+            'send': metrics.get_histogram('webrtc.send_ms'),
+        }
+        self._overlap_hist = metrics.get_histogram('webrtc.encode_send_overlap_ms')
+        self._open_hist = metrics.get_histogram('webrtc.encoder_open_ms')
+        self._open_counter = metrics.get_counter('webrtc.encoder_opens')
+
+    def __call__(self, stage, start, end):
+        profiler.span(stage, start, end, lane=self._lanes.get(stage), peer=self._peer)
+        if stage == 'encoder_open':
+            # 首帧或分辨率/码率变化时编码器被（重新）创建，耗时包含该帧编码
+            self._open_counter.inc()
+            self._open_hist.observe((end - start) * 1000.0)
+            return
+        hist = self._hists.get(stage)
+        if hist is not None:
+            hist.observe((end - start) * 1000.0)
+        other = self._last.get('send' if stage == 'encode' else 'encode')
+        self._last[stage] = (start, end)
+        if other is not None:
+            overlap = min(end, other[1]) - max(start, other[0])
+            if overlap > 0:
+                self._overlap_hist.observe(overlap * 1000.0)
+
+
+def _define_screen_video_track():
+    """ScreenVideoTrack 继承 aiortc 的 VideoStreamTrack，在 load_webrtc() 导入 aiortc 后才能定义"""
+
     class ScreenVideoTrack(VideoStreamTrack):
-        def __init__(self, pump: WebRTCFramePump):
+        """屏幕视频轨道
+
+        转换阶段（RGB -> YUV420）在独立线程中预取下一帧，
+        与 aiortc 编码线程池、发送协程形成 捕获→转换→编码→发送 流水线。
+        每帧按会话当前的推流配置从共享捕获帧派生（缩放/区域），配置可随时修改。
+        """
+
+        def __init__(self, pump: WebRTCFramePump, session, on_first_frame=None):
             super().__init__()
             self._pump = pump
+            self._session = session
+            self._on_first_frame = on_first_frame
             self._last = None
+            self._seq = 0
+            self._pending = None
+            self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="WebRTCConvert")
+            self._convert_hist = metrics.get_histogram('webrtc.convert_ms')
+            self._age_hist = metrics.get_histogram('webrtc.frame_age_ms')
+            self._dropped = metrics.get_counter('webrtc.frames_dropped_age')
+            self._duplicated = metrics.get_counter('webrtc.frames_duplicated')
+            self._delivered = metrics.get_meter('stream.webrtc_frames')
+
+        def _convert_next(self):
+            """在转换线程中等待新帧并转换为编码器输入格式"""
+            interval = 1.0 / max(1, int(webrtc_target_fps))
+            seq, frame, captured_at = self._pump.wait_newer(self._seq, interval * 2)
+            if frame is not None and seq != self._seq:
+                scale, region = self._session.stream_profile()
+                frame = frame_cache.get(seq, frame, scale, region, latency_probe_enabled)
+            if frame is None or seq == self._seq:
+                frame = self._last
+                if frame is None:
+                    frame = np.zeros((720, 1280, 3), dtype=np.uint8)
+                else:
+                    self._duplicated.inc()
+                captured_at = time.time()
+            self._seq = seq
+            self._last = frame
+
+            t0 = time.perf_counter()
+            vf = VideoFrame.from_ndarray(frame, format="rgb24").reformat(format="yuv420p")
+            t1 = time.perf_counter()
+            self._convert_hist.observe((t1 - t0) * 1000.0)
+            profiler.span('convert', t0, t1, seq=seq)
+            return vf, captured_at
 
         async def recv(self):
-            global webrtc_target_fps
             pts, time_base = await self.next_timestamp()
-            frame = self._pump.get_latest()
-            if frame is None:
-                frame = self._last
-            if frame is None:
-                await asyncio.sleep(0.005)
-                frame = self._pump.get_latest()
+            loop = asyncio.get_running_loop()
+
+            pending = self._pending
+            if pending is None:
+                pending = loop.run_in_executor(self._executor, self._convert_next)
+            vf, captured_at = await pending
+
+            # 编码跟不上时按帧龄丢弃，直接换成最新捕获的帧
+            age = time.time() - captured_at
+            if age > webrtc_max_frame_age and self._pump.get_latest_entry()[0] != self._seq:
+                self._dropped.inc()
+                vf, captured_at = await loop.run_in_executor(self._executor, self._convert_next)
+                age = time.time() - captured_at
+            self._age_hist.observe(age * 1000.0)
+
+            # 当前帧送去编码的同时，预取并转换下一帧
+            self._pending = loop.run_in_executor(self._executor, self._convert_next)
+            self._delivered.inc()
+
+            if self._on_first_frame is not None:
+                callback = self._on_first_frame
+                self._on_first_frame = None
+                callback()
 
-            if frame is None:
-                h, w = 720, 1280
-                frame = np.zeros((h, w, 3), dtype=np.uint8)
-            self._last = frame
-
-            vf = VideoFrame.from_ndarray(frame, format="rgb24")
             vf.pts = pts
             vf.time_base = time_base
             return vf
 
+        def stop(self):
+            super().stop()
+            pending = self._pending
+            self._pending = None
+            if pending is not None:
+                pending.cancel()
+            self._executor.shutdown(wait=False)
+
+    return ScreenVideoTrack
+
+
+def load_webrtc():
+    """延迟加载 aiortc / av 并定义 ScreenVideoTrack，返回 WebRTC 是否可用（结果会缓存）"""
+    global WEBRTC_AVAILABLE, _webrtc_load_failed, ScreenVideoTrack
+    global RTCConfiguration, RTCPeerConnection, RTCSessionDescription, candidate_from_sdp, RTCRtpSender
+    global aiortc_vpx, VIDEO_TIME_BASE, VideoStreamTrack, VideoFrame
+    if WEBRTC_AVAILABLE or _webrtc_load_failed:
+        return WEBRTC_AVAILABLE
+    with _webrtc_import_lock:
+        if WEBRTC_AVAILABLE or _webrtc_load_failed:
+            return WEBRTC_AVAILABLE
+        try:
+            from aiortc import RTCConfiguration, RTCPeerConnection, RTCSessionDescription
+            from aiortc.sdp import candidate_from_sdp
+            from aiortc.rtcrtpsender import RTCRtpSender
+            from aiortc.codecs import vpx as aiortc_vpx
+            from aiortc.mediastreams import VIDEO_TIME_BASE, VideoStreamTrack
+            from av import VideoFrame
+        except Exception as e:
+            _webrtc_load_failed = True
+            print(f"[WebRTC] 依赖加载失败: {e}")
+            return False
+        # 屏幕内容配置只存在于内置的 aiortc（vendor/py312），系统安装的 aiortc 使用默认配置
+        if hasattr(aiortc_vpx, 'configure_screen_content'):
+            aiortc_vpx.configure_screen_content(webrtc_vp8_screen_content, webrtc_target_fps)
+        ScreenVideoTrack = _define_screen_video_track()
+        WEBRTC_AVAILABLE = True
+    return True
+
 
 def screen_to_bytes(img, quality=60):
     """将图像转换为JPEG字节流"""
@@ -408,30 +731,64 @@ def screen_to_bytes(img, quality=60):
     return buffer.getvalue()
 
 
-def generate_video_stream():
-    """生成 MJPEG 视频流 - 优化版本"""
-    global screen_capture_running, quality, fps
+def generate_video_stream(session=None):
+    """生成 MJPEG 视频流 - 画质、帧率与捕获区域取自会话，每帧重新读取以便随时调整"""
+    global screen_capture_running, mjpeg_streams
+    session = session or sessions.get(None)
     screen_capture_running = True
     last_error_time = 0
     error_count = 0
     last_img = None
+    proc = get_capture_process() if capture_process_enabled else None
+    delivered = metrics.get_meter('stream.mjpeg_frames')
+    mjpeg_streams += 1
 
     while screen_capture_running:
         try:
             loop_start = time.time()
 
+            frame = proc.encode_jpeg(session.quality, session.region) if proc is not None else None
+            if frame is not None:
+                # 捕获进程已完成截图与编码
+                delivered.inc()
+                yield (b'--frame\r\n'
+                       b'Content-Type: image/jpeg\r\n'
+                       b'Content-Length: ' + str(len(frame)).encode() + b'\r\n'
+                       b'\r\n' + frame + b'\r\n')
+                sleep_time = 1.0 / session.fps - (time.time() - loop_start)
+                if sleep_time > 0:
+                    time.sleep(sleep_time)
+                continue
+
             # 捕获屏幕
+            p0 = time.perf_counter()
             img = capture_screen()
+            profiler.span('capture', p0, time.perf_counter())
+            if img is not None and latency_probe_enabled:
+                img.paste(Image.fromarray(frame_marker.strip(frame_marker.now_value())), (0, 0))
             if img is None:
                 img = last_img
             if img is None:
                 img = Image.new('RGB', (1280, 720), color=(0, 0, 0))
             last_img = img
 
+            region = session.region
+            if region is not None:
+                x, y, w, h = region
+                full = img
+                img = img.crop((x, y, x + w, y + h))
+                if latency_probe_enabled and (x or y):
+                    # 条码写在整帧左上角，裁剪后复制到区域左上角
+                    mw, mh = frame_marker.marker_size()
+                    img.paste(full.crop((0, 0, mw, mh)), (0, 0))
+
             # 压缩为JPEG - 使用更快的参数
             buffer = io.BytesIO()
-            img.save(buffer, format='JPEG', quality=quality, optimize=False, progressive=False)
+            p0 = time.perf_counter()
+            img.save(buffer, format='JPEG', quality=session.quality, optimize=False, progressive=False)
             frame = buffer.getvalue()
+            profiler.span('jpeg', p0, time.perf_counter())
+            delivered.inc()
 
             yield (b'--frame\r\n'
                    b'Content-Type: image/jpeg\r\n'
@@ -443,7 +800,7 @@ def generate_video_stream():
 
             # 精确帧率控制
             elapsed = time.time() - loop_start
-            target_interval = 1.0 / fps
+            target_interval = 1.0 / session.fps
             sleep_time = target_interval - elapsed
 
             if sleep_time > 0:
@@ -462,6 +819,7 @@ def generate_video_stream():
                 last_error_time = now
                 error_count = 0
             time.sleep(0.05)
+    mjpeg_streams -= 1
 
 
 # ============ HTTP 路由 ============
@@ -474,9 +832,9 @@ def index():
 
 @app.route('/video')
 def video_feed():
-    """视频流接口"""
+    """视频流接口（?sid= 指定所属会话，使用该会话的画质/帧率/区域）"""
     return Response(
-        generate_video_stream(),
+        generate_video_stream(sessions.get(request.args.get('sid'))),
         mimetype='multipart/x-mixed-replace; boundary=frame',
         headers={
             'Cache-Control': 'no-cache, no-store, must-revalidate',
@@ -486,125 +844,486 @@ def video_feed():
     )
 
 
+@app.route('/api/pipeline_stats')
+def pipeline_stats():
+    """WebRTC 流水线各阶段耗时直方图"""
+    # 不读取瞬时值：peer 码率的读取会等待 WebRTC 事件循环，并会改变 /api/metrics 的码率基准
+    stats = metrics.snapshot('webrtc.', gauges=False)
+    stats['peers'] = len(webrtc_peers)
+    stats['warmup'] = {'state': webrtc_warmup_state, 'last': webrtc_warmup_report}
+    stats['codec'] = codec_select.get_selection()
+    stats['latency_probe'] = latency_probe_summary()
+    return stats
+
+
+@app.route('/api/input_stats')
+def input_stats():
+    """输入注入队列深度与注入延迟直方图"""
+    stats = metrics.snapshot('input.')
+    stats['queue_depth_now'] = input_injector.depth()
+    stats['latency'] = input_latency_summary()
+    stats['xinput'] = gamepad_pool.stats()
+    return stats
+
+
 @app.route('/api/info')
 def server_info():
     """服务器信息"""
     return {
         'ip': get_local_ip(),
-        'port': 5000,
-        'clients': connected_clients,
-        'screen_size': pyautogui.size(),
-        'quality': quality,
-        'fps': fps
+        'port': SERVER_PORT,
+        'clients': len(sessions),
+        'screen_size': get_screen_size(),
+        'sessions': sessions.stats(),
+        'profiles': len(sessions.profiles()),
     }
 
 
+# ============ 指标 ============
+
+# 瞬时值只在导出时读取；每秒速率（帧率、输入事件/秒）由 Meter 计数器维护
+metrics.register_gauge('capture.dxgi_failure_count', lambda: dxgi_failure_count)
+metrics.register_gauge('capture.dxgi_backoff_s', lambda: round(max(0.0, dxgi_retry_after - time.time()), 3))
+metrics.register_gauge('capture.dxgi_active', lambda: dxgi_camera is not None)
+metrics.register_gauge('input.queue_depth_now', lambda: input_injector.depth())
+metrics.register_gauge('xinput.pending', lambda: gamepad_pool.slots.depth())
+metrics.register_gauge('sessions.clients', lambda: len(sessions))
+metrics.register_gauge('sessions.by_transport', lambda: _sessions_by_transport(), label='transport')
+metrics.register_gauge('webrtc.peers', lambda: len(webrtc_peers))
+metrics.register_gauge('webrtc.peer_bitrate_kbps', lambda: _webrtc_peer_bitrates(), label='peer')
+
+# sid -> (采样时间, 已发送字节)，两次导出之间的差值即码率
+webrtc_peer_bytes = {}
+
+
+def _sessions_by_transport():
+    counts = {'mjpeg': 0, 'webrtc': 0}
+    for session in sessions.sessions():
+        counts[session.transport] = counts.get(session.transport, 0) + 1
+    return counts
+
+
+async def _webrtc_collect_bitrates():
+    """各 peer 视频发送码率（kbps），来自 RTCRtpSender.getStats() 的 bytesSent"""
+    now = time.perf_counter()
+    bitrates = {}
+    for sid, pc in list(webrtc_peers.items()):
+        sent = 0
+        for sender in pc.getSenders():
+            if sender.kind != 'video':
+                continue
+            report = await sender.getStats()
+            sent += sum(getattr(stats, 'bytesSent', 0) for stats in report.values()
+                        if getattr(stats, 'type', '') == 'outbound-rtp')
+        prev = webrtc_peer_bytes.get(sid)
+        webrtc_peer_bytes[sid] = (now, sent)
+        if prev is not None and now > prev[0]:
+            bitrates[sid] = round((sent - prev[1]) * 8 / 1000.0 / (now - prev[0]), 1)
+    for sid in [sid for sid in webrtc_peer_bytes if sid not in webrtc_peers]:
+        webrtc_peer_bytes.pop(sid, None)
+    return bitrates
+
+
+def _webrtc_peer_bitrates():
+    if not WEBRTC_AVAILABLE or webrtc_loop is None or not webrtc_peers:
+        return {}
+    try:
+        on_webrtc_loop = asyncio.get_running_loop() is webrtc_loop
+    except RuntimeError:
+        on_webrtc_loop = False
+    if on_webrtc_loop:
+        # 在 WebRTC 事件循环中同步等待自身会阻塞整个循环直到超时
+        print("[Metrics] peer 码率不能在 WebRTC 事件循环中读取，已跳过")
+        return None
+    # 每次导出每个 peer 只查询一次 getStats，在 WebRTC 事件循环中执行
+    return asyncio.run_coroutine_threadsafe(_webrtc_collect_bitrates(), webrtc_loop).result(timeout=1.0)
+
+
+def render_metrics(fmt='prometheus'):
+    """/api/metrics 内容：(正文, Content-Type)"""
+    if fmt == 'json':
+        return json.dumps(metrics.snapshot(), ensure_ascii=False), 'application/json'
+    return metrics.render_prometheus(), 'text/plain; version=0.0.4; charset=utf-8'
+
+
+@app.route('/api/metrics')
+def metrics_endpoint():
+    """全部指标：默认 Prometheus 文本格式，?format=json 返回 JSON"""
+    body, content_type = render_metrics(request.args.get('format', 'prometheus'))
+    return Response(body, content_type=content_type)
+
+
+# ============ 性能分析 ============
+
+# /api/profile（采样分析）与 /api/trace（逐帧时间线）只对管理员开放：
+# 设置 RC_ADMIN_TOKEN 时需带 ?token= 或 X-RC-Admin-Token 请求头，否则只允许本机访问
+admin_token = os.getenv("RC_ADMIN_TOKEN", "")
+PROFILE_MAX_SECONDS = 60.0
+LOOPBACK_ADDRS = ('127.0.0.1', '::1', '::ffff:127.0.0.1')
+
+
+def is_admin_request(remote_addr, token):
+    if admin_token:
+        return hmac.compare_digest((token or '').encode('utf-8'), admin_token.encode('utf-8'))
+    return remote_addr in LOOPBACK_ADDRS
+
+
+def _json_response_body(status, payload):
+    return status, json.dumps(payload, ensure_ascii=False), 'application/json'
+
+
+def _profile_seconds(args, default):
+    seconds = float(args.get('seconds', default))
+    if not 0 < seconds <= PROFILE_MAX_SECONDS:
+        raise ValueError(f"seconds 需在 (0, {PROFILE_MAX_SECONDS:g}] 之间")
+    return seconds
+
+
+def run_profile(args):
+    """/api/profile 内容：(状态码, 正文, Content-Type)
+
+    参数: seconds（默认 5）、interval 毫秒（默认 5）、threads 线程名子串（逗号分隔）、
+          format=speedscope（默认）/ collapsed
+    """
+    try:
+        seconds = _profile_seconds(args, 5)
+        interval = min(100.0, max(1.0, float(args.get('interval', 5)))) / 1000.0
+    except ValueError as e:
+        return _json_response_body(400, {'error': str(e)})
+    threads = [t.strip() for t in args.get('threads', '').split(',') if t.strip()] or None
+    fmt = args.get('format', 'speedscope')
+    try:
+        result = profiler.sample(seconds, interval, threads)
+    except profiler.ProfilerBusy:
+        return _json_response_body(409, {'error': 'profiler_busy'})
+    print(f"[分析] 采样 {result.duration:.1f}s，{result.samples} 次，{len(result.threads())} 个线程")
+    if fmt == 'collapsed':
+        return 200, result.collapsed(), 'text/plain; charset=utf-8'
+    return _json_response_body(200, result.speedscope())
+
+
+def run_trace(args):
+    """/api/trace 内容：录制 seconds 秒（默认 3）的逐帧时间线，Chrome trace event 格式"""
+    try:
+        seconds = _profile_seconds(args, 3)
+    except ValueError as e:
+        return _json_response_body(400, {'error': str(e)})
+    try:
+        trace = profiler.record_trace(seconds)
+    except profiler.ProfilerBusy:
+        return _json_response_body(409, {'error': 'profiler_busy'})
+    return _json_response_body(200, trace)
+
+
+def _admin_endpoint(handler):
+    token = request.args.get('token') or request.headers.get('X-RC-Admin-Token')
+    if not is_admin_request(request.remote_addr, token):
+        status, body, content_type = _json_response_body(403, {'error': 'forbidden'})
+    else:
+        status, body, content_type = handler(request.args)
+    return Response(body, status=status, content_type=content_type)
+
+
+@app.route('/api/profile')
+def profile_endpoint():
+    """对所有（或指定）线程采样分析 N 秒，返回 speedscope JSON 或折叠栈"""
+    return _admin_endpoint(run_profile)
+
+
+@app.route('/api/trace')
+def trace_endpoint():
+    """录制 N 秒的捕获/缩放/转换/编码/发送时间线（Chrome trace event 格式）"""
+    return _admin_endpoint(run_trace)
+
+
 # ============ WebSocket 事件 ============
 
-@socketio.on('connect')
-def handle_connect():
-    """客户端连接"""
-    global connected_clients
-    connected_clients += 1
-    print(f"[+] 客户端连接，当前连接数: {connected_clients}")
-    emit('connected', {
+@session_event('connect')
+def handle_connect(sid, data=None):
+    """客户端连接；data 为握手 auth，可带管理员令牌 {token}"""
+    session = sessions.open(sid)
+    token = data.get('token') if isinstance(data, dict) else None
+    session.admin = is_admin_request(transport.remote_addr(sid), token)
+    print(f"[+] 客户端连接，当前连接数: {len(sessions)}")
+    display_geometry.start()
+    payload = display_payload()
+    payload.update({
         'status': 'ok',
-        'screen_width': pyautogui.size().width,
-        'screen_height': pyautogui.size().height
+        'input_protocol': input_protocol.PROTOCOL_VERSION,
     })
-    emit('xinput_status', {'available': bool(XINPUT_AVAILABLE)})
+    transport.emit('connected', payload, to=sid)
+    if vgamepad_loaded():
+        transport.emit('xinput_status', {'available': XINPUT_AVAILABLE}, to=sid)
+    else:
+        # 加载 vgamepad 会连接 ViGEmBus 驱动，不能在连接处理函数（--async 时为事件循环）中等待
+        threading.Thread(target=_emit_xinput_status, args=(sid,), daemon=True, name="VGamepadLoad").start()
+    transport.emit('latency_probe_state', dict(latency_probe_payload(), admin=session.admin), to=sid)
+    _subscribe_cursor(sid)
+    # 页面一连上就开始预热，等 offer 到达时编码器已就绪
+    start_webrtc_warmup()
 
 
-@socketio.on('disconnect')
-def handle_disconnect():
+@session_event('disconnect')
+def handle_disconnect(sid, data=None):
     """客户端断开"""
-    global connected_clients
-    connected_clients = max(0, connected_clients - 1)
-    print(f"[-] 客户端断开，当前连接数: {connected_clients}")
-
-    sid = request.sid
-    global xinput_pad, xinput_owner_sid, xinput_last_buttons
-    if sid == xinput_owner_sid:
-        with xinput_lock:
+    session = sessions.close(sid)
+    print(f"[-] 客户端断开，当前连接数: {len(sessions)}")
+
+    if session is not None and session.held_keys():
+        # 松开该会话虚拟摇杆按住的 WASD，避免断线后角色一直移动
+        input_injector.submit(send_keys, [(key, False) for key in session.held_keys()])
+    cursor_watcher.unsubscribe(sid)
+    gamepad_pool.release_sid(sid)
+    if WEBRTC_AVAILABLE and webrtc_loop is not None:
+        if sid in webrtc_peers or sid in webrtc_pending_candidates:
+            asyncio.run_coroutine_threadsafe(_webrtc_close_peer(sid), webrtc_loop)
+        elif not sessions:
+            # 未发送 offer 就断开：预热时启动的 pump 与编码器没有 peer 关闭来回收
+            webrtc_loop.call_soon_threadsafe(_webrtc_release_idle)
+
+
+def _record_startup_stage(report, stage, start):
+    """记录首帧启动阶段耗时（毫秒），返回当前时间点"""
+    now = time.perf_counter()
+    elapsed_ms = (now - start) * 1000.0
+    metrics.get_histogram(f'webrtc.startup.{stage}_ms').observe(elapsed_ms)
+    if report is not None:
+        report[stage] = round(elapsed_ms, 1)
+    return now
+
+
+def ensure_webrtc_runtime(report=None):
+    global webrtc_loop, webrtc_loop_thread, webrtc_frame_pump, dxgi_capture_enabled
+    if not webrtc_enabled:
+        return False
+    if not WEBRTC_AVAILABLE:
+        # 启动后的后台预热通常已导入完毕，否则在这里（首个 offer / 预热线程）导入
+        t = time.perf_counter()
+        if not load_webrtc():
+            return False
+        _record_startup_stage(report, 'webrtc_import', t)
+
+    with webrtc_runtime_lock:
+        t = time.perf_counter()
+        if not dxgi_capture_enabled and not capture_process_enabled and capture_source != 'synthetic':
+            dxgi_capture_enabled = True
             try:
-                if xinput_pad is not None:
-                    xinput_pad.reset()
-                    xinput_pad.update()
+                if dxgi_camera is None:
+                    init_dxgi_camera()
             except Exception:
                 pass
-            if xinput_state_queue:
-                xinput_state_queue.clear()
-            xinput_owner_sid = None
-            xinput_last_buttons = 0
-    if WEBRTC_AVAILABLE and sid in webrtc_peers and webrtc_loop is not None:
-        asyncio.run_coroutine_threadsafe(_webrtc_close_peer(sid), webrtc_loop)
+            t = _record_startup_stage(report, 'dxgi_init', t)
 
+        if webrtc_loop is None:
+            webrtc_loop = asyncio.new_event_loop()
 
-def ensure_webrtc_runtime():
-    global webrtc_loop, webrtc_loop_thread, webrtc_frame_pump, dxgi_capture_enabled
-    if not (WEBRTC_AVAILABLE and webrtc_enabled):
-        return False
+            def _run():
+                asyncio.set_event_loop(webrtc_loop)
+                webrtc_loop.run_forever()
 
-    if not dxgi_capture_enabled:
-        dxgi_capture_enabled = True
-        try:
-            if dxgi_camera is None:
-                init_dxgi_camera()
-        except Exception:
-            pass
+            webrtc_loop_thread = threading.Thread(target=_run, daemon=True, name="WebRTCLoop")
+            webrtc_loop_thread.start()
+            t = _record_startup_stage(report, 'event_loop', t)
 
-    if webrtc_loop is None:
-        webrtc_loop = asyncio.new_event_loop()
+        if webrtc_frame_pump is None:
+            webrtc_frame_pump = get_capture_process() if capture_process_enabled else WebRTCFramePump()
+        # 最后一个 peer 关闭时 pump 会停止，新 offer 到来时需要重新启动
+        webrtc_frame_pump.start()
 
-        def _run():
-            asyncio.set_event_loop(webrtc_loop)
-            webrtc_loop.run_forever()
+    return True
 
-        webrtc_loop_thread = threading.Thread(target=_run, daemon=True)
-        webrtc_loop_thread.start()
 
-    if webrtc_frame_pump is None:
-        webrtc_frame_pump = WebRTCFramePump()
-        webrtc_frame_pump.start()
+def get_capture_process():
+    """捕获进程（首次调用时启动，停止后再次调用会重新启动）"""
+    global capture_proc
+    with capture_proc_lock:
+        if capture_proc is None:
+            source = capture_source or ('dxgi' if dxgi_capture_enabled else 'mss')
+            capture_proc = CaptureProcess(display_geometry.current().virtual[2:], source=source,
+                                          fps=webrtc_target_fps, probe=latency_probe_enabled)
+    capture_proc.start()
+    return capture_proc
 
-    return True
+
+def start_webrtc_warmup():
+    """后台预热 WebRTC 流水线：事件循环、捕获、编码器"""
+    global webrtc_warmup_state
+    # aiortc 尚未导入时由预热线程导入，调用方（连接处理函数）不等待
+    if not webrtc_enabled or _webrtc_load_failed:
+        return
+    with webrtc_warmup_lock:
+        if webrtc_warmup_state in ('warming', 'ready'):
+            return
+        webrtc_warmup_state = 'warming'
+    threading.Thread(target=_webrtc_warmup, daemon=True, name="WebRTCWarmup").start()
 
 
-async def _webrtc_wait_ice_complete(pc: RTCPeerConnection, timeout_s: float = 2.0):
-    if pc.iceGatheringState == "complete":
+def _webrtc_warmup():
+    global webrtc_warmup_state, webrtc_warm_encoder, webrtc_warm_codec, webrtc_warmup_report
+    report = {}
+    started = time.perf_counter()
+    try:
+        ensure_webrtc_runtime(report)
+        t = time.perf_counter()
+
+        seq, frame, _ = webrtc_frame_pump.wait_newer(0, 2.0)
+        if frame is None:
+            raise RuntimeError('no_frame')
+        # 按新会话的默认缩放派生，预热编码器的分辨率与首个 peer 一致
+        frame = frame_cache.get(seq, frame, DEFAULT_WEBRTC_SCALE)
+        t = _record_startup_stage(report, 'first_capture', t)
+
+        resolution = f"{frame.shape[1]}x{frame.shape[0]}"
+        codec = codec_select.selected_codec(resolution)
+        if codec is None:
+            # 首次（或分辨率变化）时对候选编码器做基准测试，胜出的编码器直接作为预热编码器
+            selection, encoder = codec_select.select_codec(frame, webrtc_target_fps)
+            codec = selection['codec']
+            t = _record_startup_stage(report, 'codec_bench', t)
+            print(f"[WebRTC] 编码器基准测试 {resolution}: {selection['results']} -> {codec}")
+        else:
+            # 按预期分辨率打开编码器，并编码两帧丢弃帧（pts 为负，不影响后续真实帧）
+            encoder = codec_select.create_encoder(codec)
+            for i, pts in enumerate((-2 * WEBRTC_WARMUP_PTS_STEP, -WEBRTC_WARMUP_PTS_STEP)):
+                vf = VideoFrame.from_ndarray(frame, format="rgb24").reformat(format="yuv420p")
+                vf.pts = pts
+                vf.time_base = VIDEO_TIME_BASE
+                encoder.encode(vf)
+                t = _record_startup_stage(report, 'encoder_open' if i == 0 else 'warm_encode', t)
+
+        report['total'] = round((time.perf_counter() - started) * 1000.0, 1)
+        report['resolution'] = resolution
+        report['codec'] = codec
+        with webrtc_warmup_lock:
+            webrtc_warm_encoder = encoder
+            webrtc_warm_codec = codec
+            webrtc_warmup_report = report
+            webrtc_warmup_state = 'ready'
+        debug_log(f"[WebRTC] 预热完成: {report}")
+        if webrtc_warm_idle_s > 0:
+            webrtc_loop.call_soon_threadsafe(webrtc_loop.call_later, webrtc_warm_idle_s, _webrtc_warm_expire, encoder)
+    except Exception as e:
+        report['error'] = str(e)
+        with webrtc_warmup_lock:
+            webrtc_warmup_report = report
+            webrtc_warmup_state = 'failed'
+        print(f"[WebRTC] 预热失败: {e}")
+
+
+def _webrtc_take_warm_encoder():
+    """取走预热好的编码器（只能被一个 peer 使用），返回 (编码名称, 编码器)"""
+    global webrtc_warm_encoder, webrtc_warmup_state
+    with webrtc_warmup_lock:
+        encoder = webrtc_warm_encoder
+        webrtc_warm_encoder = None
+        if encoder is not None:
+            webrtc_warmup_state = 'idle'
+        return webrtc_warm_codec, encoder
+
+
+def _webrtc_warm_expire(encoder):
+    """预热后一直没有 offer 取走编码器：释放编码器并停止 pump（在 WebRTC 事件循环中调用）"""
+    if webrtc_warm_encoder is encoder:
+        debug_log(f"[WebRTC] 预热后 {webrtc_warm_idle_s:.0f}s 内没有 offer，停止捕获")
+        _webrtc_release_idle(force=True)
+
+
+def _webrtc_release_idle(force=False):
+    """没有 peer 与进行中的 offer 时停止 pump；没有会话（或 force）时同时释放预热编码器
+
+    在 WebRTC 事件循环中调用，与 offer 处理、peer 关闭串行执行
+    """
+    global webrtc_warm_encoder, webrtc_warmup_state
+    if webrtc_peers or webrtc_offers_in_flight:
         return
-    done = asyncio.Event()
+    if force or not sessions:
+        with webrtc_warmup_lock:
+            if webrtc_warmup_state == 'ready':
+                webrtc_warm_encoder = None
+                webrtc_warmup_state = 'idle'
+    # 捕获进程同时为 MJPEG 供帧，仍有 MJPEG 观看者时保持运行
+    if webrtc_frame_pump is not None and not (webrtc_frame_pump is capture_proc and mjpeg_streams):
+        try:
+            webrtc_frame_pump.stop()
+        except Exception:
+            pass
 
-    @pc.on("icegatheringstatechange")
-    def _on_state_change():
-        if pc.iceGatheringState == "complete":
-            done.set()
 
+def _webrtc_parse_candidate(data):
+    """解析浏览器 RTCIceCandidate.toJSON() 结构，结束标记返回 None"""
+    cand = (data or {}).get('candidate') or ''
+    if not cand:
+        return None
+    if cand.startswith('candidate:'):
+        cand = cand[len('candidate:'):]
+    candidate = candidate_from_sdp(cand)
+    candidate.sdpMid = data.get('sdpMid')
+    candidate.sdpMLineIndex = data.get('sdpMLineIndex')
+    return candidate
+
+
+async def _webrtc_add_remote_candidate(sid: str, data):
+    pc = webrtc_peers.get(sid)
+    if pc is None or pc.remoteDescription is None:
+        # offer 尚未处理完成，先缓存，待 setRemoteDescription 后统一添加
+        webrtc_pending_candidates.setdefault(sid, []).append(data)
+        return
     try:
-        await asyncio.wait_for(done.wait(), timeout=timeout_s)
-    except Exception:
+        candidate = _webrtc_parse_candidate(data)
+        if candidate is not None:
+            await pc.addIceCandidate(candidate)
+    except Exception as e:
+        debug_log(f"[WebRTC] 添加远端候选失败: {e}")
+
+
+def _webrtc_limit_host_candidates(pc):
+    """局域网快速路径：只在 get_local_ip() 对应的网卡上收集 host 候选
+
+    依赖 vendor/py312 中 aioice 的 Connection.host_addresses，其他版本没有该钩子时在所有网卡上收集
+    """
+    global webrtc_host_limit_warned
+    ip = get_local_ip()
+    if ip == "127.0.0.1":
         return
+    for transceiver in pc.getTransceivers():
+        try:
+            connection = transceiver.sender.transport.transport.iceGatherer._connection
+        except AttributeError:
+            connection = None
+        if connection is None or not hasattr(connection, 'host_addresses'):
+            if not webrtc_host_limit_warned:
+                webrtc_host_limit_warned = True
+                print("[WebRTC] 当前 aiortc/aioice 不支持限制 host 候选网卡，将在所有网卡上收集")
+            return
+        connection.host_addresses = [ip]
 
 
-async def _webrtc_close_peer(sid: str):
+async def _webrtc_close_peer(sid: str, reoffer=False):
+    """关闭 peer；reoffer 为新 offer 替换旧连接：保留已缓存的候选，且不停止 pump"""
     pc = webrtc_peers.pop(sid, None)
+    sessions.get(sid).transport = 'mjpeg'
+    if not reoffer:
+        webrtc_pending_candidates.pop(sid, None)
+    webrtc_offer_times.pop(sid, None)
     if pc:
         try:
             await pc.close()
         except Exception:
             pass
 
-    if not webrtc_peers and webrtc_frame_pump is not None:
-        try:
-            webrtc_frame_pump.stop()
-        except Exception:
-            pass
+    if not reoffer:
+        _webrtc_release_idle()
 
 
 async def _webrtc_handle_offer(sid: str, offer_sdp: str, offer_type: str):
-    await _webrtc_close_peer(sid)
+    # 保留已缓存的候选：Socket.IO 多线程分发时候选可能先于 offer 到达
+    await _webrtc_close_peer(sid, reoffer=True)
+    webrtc_offer_times[sid] = time.perf_counter()
 
-    pc = RTCPeerConnection()
+    if webrtc_lan_only:
+        pc = RTCPeerConnection(RTCConfiguration(iceServers=[]))
+    else:
+        pc = RTCPeerConnection()
     webrtc_peers[sid] = pc
 
     @pc.on("connectionstatechange")
@@ -612,136 +1331,271 @@ async def _webrtc_handle_offer(sid: str, offer_sdp: str, offer_type: str):
         if pc.connectionState in ("failed", "closed", "disconnected"):
             await _webrtc_close_peer(sid)
 
+    input_last_seq = {}
+
+    @pc.on("datachannel")
+    def _on_datachannel(channel):
+        if channel.label.startswith("input"):
+            _webrtc_bind_input_channel(sid, channel, input_last_seq)
+
     await pc.setRemoteDescription(RTCSessionDescription(sdp=offer_sdp, type=offer_type))
+    if webrtc_lan_only:
+        _webrtc_limit_host_candidates(pc)
 
     if webrtc_frame_pump is not None:
-        track = ScreenVideoTrack(webrtc_frame_pump)
-        attached = False
-        for transceiver in pc.getTransceivers():
-            if transceiver.kind == "video":
-                try:
-                    await transceiver.sender.replaceTrack(track)
-                    attached = True
-                    break
-                except Exception:
-                    pass
-        if not attached:
-            pc.addTrack(track)
-
+        session = sessions.get(sid)
+        session.transport = 'webrtc'
+        track = ScreenVideoTrack(webrtc_frame_pump, session, on_first_frame=lambda: _webrtc_on_first_frame(sid))
+        # addTrack 复用 offer 中的视频 transceiver 并把方向改为可发送；
+        # 只调用 replaceTrack 时方向仍为 recvonly，answer 协商为不发送
+        sender = pc.addTrack(track)
+        sender.stage_observer = WebRTCStageRecorder(sid)
+        warm_codec, warm_encoder = _webrtc_take_warm_encoder()
+        if warm_encoder is not None and hasattr(sender, 'preloadEncoder'):
+            sender.preloadEncoder(f"video/{warm_codec}", warm_encoder)
+
+    # 按基准测试结果排序编码器偏好，其余编码器保留作为浏览器不支持时的回退
     try:
         caps = RTCRtpSender.getCapabilities("video").codecs
-        h264 = [c for c in caps if (c.name or "").upper() == "H264"]
+        preferred = codec_select.selected_codec() or webrtc_default_codec
         for transceiver in pc.getTransceivers():
-            if transceiver.kind == "video" and hasattr(transceiver, "setCodecPreferences") and h264:
-                transceiver.setCodecPreferences(h264)
+            if transceiver.kind == "video" and hasattr(transceiver, "setCodecPreferences"):
+                transceiver.setCodecPreferences(codec_select.codec_preferences(caps, preferred))
                 break
     except Exception:
         pass
 
+    # aiortc 在 setLocalDescription 内同步完成候选收集（仅 host 时耗时极短），
+    # 服务端候选随 answer 一起下发，无需再额外等待 ICE 收集完成
     answer = await pc.createAnswer()
     await pc.setLocalDescription(answer)
-    await _webrtc_wait_ice_complete(pc)
+
+    for data in webrtc_pending_candidates.pop(sid, []):
+        await _webrtc_add_remote_candidate(sid, data)
+
+    metrics.get_histogram('webrtc.offer_to_answer_ms').observe(
+        (time.perf_counter() - webrtc_offer_times.get(sid, time.perf_counter())) * 1000.0)
     return {"sdp": pc.localDescription.sdp, "type": pc.localDescription.type}
 
 
-@socketio.on('webrtc_offer')
-def handle_webrtc_offer(data):
-    if not ensure_webrtc_runtime():
-        emit('webrtc_error', {'error': 'webrtc_not_available'})
+def _webrtc_bind_input_channel(sid, channel, last_seq):
+    """WebRTC DataChannel 输入通道
+
+    消息格式为 JSON 数组 [event, data, seq]：
+    - input-unreliable（无序、maxRetransmits=0）：指针移动、摇杆状态
+    - input-reliable（有序、可靠）：按键/按钮边沿，以及改变按下状态的摇杆消息（含松开）
+    与 Socket.IO 使用相同的处理函数，注入由 input_injector 线程顺序执行，不阻塞事件循环
+    last_seq 由同一 peer 的两个通道共享，只丢弃无序通道上迟到的状态消息
+    """
+    unordered = not channel.ordered
+
+    @channel.on("message")
+    def _on_message(message):
+        if isinstance(message, bytes):
+            metrics.get_counter('input.datachannel_events').inc()
+            _dispatch_input_batch(sid, message, last_seq, unordered)
+            return
+        try:
+            event, data, seq = (json.loads(message) + [None, None])[:3]
+        except Exception:
+            return
+        if event == 'input_ping':
+            channel.send(json.dumps(['input_pong', data]))
+            return
+        seq_key = _input_state_key(event, data) if seq is not None else None
+        if seq_key is not None:
+            # 无序通道上迟到的旧状态直接丢弃，可靠通道的消息（含按钮边沿）始终处理
+            if unordered and seq <= last_seq.get(seq_key, -1):
+                metrics.get_counter('input.datachannel_stale_dropped').inc()
+                return
+            last_seq[seq_key] = max(seq, last_seq.get(seq_key, -1))
+        metrics.get_counter('input.datachannel_events').inc()
+        # 处理函数只做入队，直接在事件循环中调用，不再额外切换线程
+        _dispatch_input_event(sid, event, data)
+
+
+def _webrtc_on_first_frame(sid):
+    offer_at = webrtc_offer_times.get(sid)
+    if offer_at is None:
         return
+    elapsed_ms = (time.perf_counter() - offer_at) * 1000.0
+    metrics.get_histogram('webrtc.offer_to_first_frame_ms').observe(elapsed_ms)
+    debug_log(f"[WebRTC] {sid} offer -> 首帧送编码 {elapsed_ms:.0f}ms")
+
+
+def _webrtc_emit_answer(sid, fut):
+    webrtc_offers_in_flight.discard(sid)
+    try:
+        answer = fut.result()
+        transport.emit('webrtc_answer', answer, to=sid)
+    except Exception as e:
+        transport.emit('webrtc_error', {'error': str(e)}, to=sid)
+
 
-    sid = request.sid
+@session_event('webrtc_offer')
+def handle_webrtc_offer(sid, data):
     offer_sdp = data.get('sdp', '')
     offer_type = data.get('type', 'offer')
     if not offer_sdp:
-        emit('webrtc_error', {'error': 'empty_offer'})
+        transport.emit('webrtc_error', {'error': 'empty_offer'}, to=sid)
         return
 
+    # 先登记再启动 pump：事件循环中的空闲回收看到进行中的 offer 时不会停止 pump
+    webrtc_offers_in_flight.add(sid)
+    if not ensure_webrtc_runtime():
+        webrtc_offers_in_flight.discard(sid)
+        transport.emit('webrtc_error', {'error': 'webrtc_not_available'}, to=sid)
+        return
+
+    # 不阻塞 Socket.IO 工作线程，answer 就绪后异步推送
     fut = asyncio.run_coroutine_threadsafe(_webrtc_handle_offer(sid, offer_sdp, offer_type), webrtc_loop)
-    try:
-        answer = fut.result(timeout=15)
-        emit('webrtc_answer', answer)
-    except Exception as e:
-        emit('webrtc_error', {'error': str(e)})
+    fut.add_done_callback(lambda f: _webrtc_emit_answer(sid, f))
+
+
+@session_event('webrtc_ice_candidate')
+def handle_webrtc_ice_candidate(sid, data):
+    """浏览器 trickle ICE 候选"""
+    if not WEBRTC_AVAILABLE or webrtc_loop is None:
+        return
+    asyncio.run_coroutine_threadsafe(_webrtc_add_remote_candidate(sid, data or {}), webrtc_loop)
+
+
+@session_event('webrtc_first_frame')
+def handle_webrtc_first_frame(sid, data):
+    """客户端上报 连接 -> 首帧 耗时"""
+    data = data or {}
+    for key in ('connect_to_first_frame_ms', 'offer_to_first_frame_ms'):
+        try:
+            value = float(data.get(key))
+        except (TypeError, ValueError):
+            continue
+        metrics.get_histogram(f'webrtc.client_{key}').observe(value)
+    print(f"[WebRTC] 首帧耗时: 连接->首帧 {data.get('connect_to_first_frame_ms')}ms, "
+          f"offer->首帧 {data.get('offer_to_first_frame_ms')}ms")
 
 
-@socketio.on('set_mode')
-def handle_set_mode(data):
-    """客户端切换模式"""
-    global game_mode
+@session_event('set_mode')
+def handle_set_mode(sid, data):
+    """客户端切换模式（只影响该会话的输入）"""
+    session = sessions.get(sid)
     mode = data.get('mode', 'touch')
 
     if mode == 'gamepad':
-        game_mode = True
-        debug_log(f"[Mode] gamepad enabled, input_sender={input_sender is not None}")
+        session.game_mode = True
+        debug_log(f"[Mode] gamepad enabled, input_sender={INPUT_SENDER_AVAILABLE}")
     else:
-        game_mode = False
+        session.game_mode = False
         debug_log(f"[Mode] switched to {mode}")
 
-    emit('mode_changed', {'mode': mode, 'game_mode': game_mode})
+    transport.emit('mode_changed', {'mode': mode, 'game_mode': session.game_mode}, to=sid)
+
+
+def _input_source(event, data):
+    """注入延迟统计来源：(事件类型, 客户端时间戳)
+
+    客户端时间戳 _t 已按 clock_sync 估计的偏移换算为服务端 time.time() 毫秒，未同步时为空
+    """
+    try:
+        client_ms = float(data.get('_t') or 0.0)
+    except (TypeError, ValueError):
+        client_ms = 0.0
+    return (event, client_ms)
+
 
+@input_event('mouse_move')
+def handle_mouse_move(sid, data):
+    """处理鼠标移动（绝对位置），由注入线程执行，连续移动只保留最新位置"""
+    session = sessions.get(sid)
+    x, y = session.map_point(data.get('x', 0), data.get('y', 0), get_screen_size())
+    input_injector.submit_absolute(x, y, session.game_mode, source=_input_source('mouse_move', data))
 
-@socketio.on('mouse_move')
-def handle_mouse_move(data):
-    """处理鼠标移动（绝对位置）"""
+
+def _inject_mouse_move(x, y, raw_input=False):
+    input_sender = _input_sender()
     try:
-        x = data.get('x', 0)
-        y = data.get('y', 0)
         # 确保坐标在屏幕范围内
-        screen_width, screen_height = pyautogui.size()
+        screen_width, screen_height = get_screen_size()
         x = max(0, min(x, screen_width))
         y = max(0, min(y, screen_height))
 
-        if game_mode and input_sender:
+        if raw_input and input_sender:
             input_sender.move_absolute(x, y)
         elif input_sender:
-            # 使用底层 SetCursorPos 替代 pyautogui.moveTo
+            # SetCursorPos 失败（可能因权限不足）时改用 SendInput 绝对移动
             if not input_sender.set_mouse_pos(x, y):
-                # 如果底层设置失败（可能因权限不足），尝试回退到 pyautogui
-                pyautogui.moveTo(x, y, duration=0)
+                input_sender.move_absolute(x, y)
         else:
-            pyautogui.moveTo(x, y, duration=0)
+            pg = _get_pyautogui()
+            if pg is not None:
+                pg.moveTo(x, y, duration=0)
     except Exception as e:
         print(f"鼠标移动错误: {e}")
 
 
-@socketio.on('mouse_move_relative')
-def handle_mouse_move_relative(data):
-    """处理鼠标相对移动（触摸板模式）"""
-    global game_mode
+@input_event('mouse_move_relative')
+def handle_mouse_move_relative(sid, data):
+    """处理鼠标相对移动（触摸板模式），由注入线程合并后执行"""
+    raw = data.get('raw', None)
+    raw_input = sessions.get(sid).game_mode if raw is None else bool(raw)
+    input_injector.submit_move(data.get('dx', 0), data.get('dy', 0), raw_input,
+                               source=_input_source('mouse_move_relative', data))
+
+
+def _inject_mouse_move_relative(dx, dy, raw_input):
+    input_sender = _input_sender()
     try:
-        dx = data.get('dx', 0)
-        dy = data.get('dy', 0)
-        raw = data.get('raw', None)
-        raw_input = bool(game_mode) if raw is None else bool(raw)
         if input_sender:
             input_sender.move_relative(dx, dy, raw_input=raw_input)
         else:
-            pyautogui.moveRel(dx, dy, duration=0)
+            pg = _get_pyautogui()
+            if pg is not None:
+                pg.moveRel(dx, dy, duration=0)
     except Exception as e:
         print(f"鼠标相对移动错误: {e}")
 
 
-@socketio.on('get_mouse_pos')
-def handle_get_mouse_pos(sid=None):
-    """获取当前鼠标位置"""
+def _read_cursor_pos():
+    input_sender = _input_sender()
+    if input_sender:
+        return input_sender.get_mouse_pos()
+    pg = _get_pyautogui()
+    if pg is None:
+        width, height = get_screen_size()
+        return width // 2, height // 2
+    x, y = pg.position()
+    return x, y
+
+
+@session_event('get_mouse_pos')
+def handle_get_mouse_pos(sid, data=None):
+    """获取当前鼠标位置（单次查询，持续同步由 cursor_watcher 推送）"""
     try:
-        if input_sender:
-            x, y = input_sender.get_mouse_pos()
-        else:
-            x, y = pyautogui.position()
-        emit('mouse_pos', {'x': x, 'y': y})
+        x, y = _read_cursor_pos()
+        transport.emit('mouse_pos', {'x': x, 'y': y}, to=sid)
     except Exception as e:
         print(f"获取鼠标位置错误: {e}")
 
 
-@socketio.on('mouse_click')
-def handle_mouse_click(data):
-    """处理鼠标点击"""
-    try:
-        button = data.get('button', 'left')
-        action = data.get('action', 'down')
+@session_event('cursor_subscribe')
+def handle_cursor_subscribe(sid, data=None):
+    """开关光标位置推送（连接时默认订阅）"""
+    if data is None or data.get('enabled', True):
+        _subscribe_cursor(sid)
+    else:
+        transport.leave_room(sid, CURSOR_ROOM)
+        cursor_watcher.unsubscribe(sid)
+
 
+@input_event('mouse_click')
+def handle_mouse_click(sid, data):
+    """处理鼠标点击（边沿事件，按序注入）"""
+    input_injector.submit(_inject_mouse_click, data.get('button', 'left'), data.get('action', 'down'),
+                          source=_input_source('mouse_click', data))
+
+
+def _inject_mouse_click(button, action):
+    input_sender = _input_sender()
+    try:
         if input_sender:
             if action == 'down':
                 if button == 'left':
@@ -758,320 +1612,234 @@ def handle_mouse_click(data):
                 elif button == 'middle':
                     input_sender.middle_up()
         else:
+            pg = _get_pyautogui()
+            if pg is None:
+                return
             if action == 'down':
-                pyautogui.mouseDown(button=button)
+                pg.mouseDown(button=button)
             else:
-                pyautogui.mouseUp(button=button)
+                pg.mouseUp(button=button)
     except Exception as e:
         print(f"鼠标点击错误: {e}")
 
 
-@socketio.on('mouse_scroll')
-def handle_mouse_scroll(data):
+@input_event('mouse_scroll')
+def handle_mouse_scroll(sid, data):
     """处理鼠标滚轮"""
-    try:
-        dx = data.get('dx', 0)
-        dy = data.get('dy', 0)
+    input_injector.submit(_inject_mouse_scroll, data.get('dx', 0), data.get('dy', 0), sessions.get(sid).game_mode,
+                          source=_input_source('mouse_scroll', data))
+
 
-        if game_mode and input_sender:
-            input_sender.scroll(dy, dx)
+def _inject_mouse_scroll(dx, dy, notches=False):
+    input_sender = _input_sender()
+    try:
+        if input_sender:
+            if notches:
+                # 游戏模式：单位为整格
+                input_sender.scroll(dy, dx)
+            else:
+                # 桌面模式：单位为 WHEEL_DELTA 的 1/120，高精度平滑滚动，余量累积
+                input_sender.smooth_scroll(dy, dx, notch_only=scroll_notch_only)
         else:
-            # 垂直滚动
+            pg = _get_pyautogui()
+            if pg is None:
+                return
             if dy != 0:
-                pyautogui.scroll(int(dy))
-            # 水平滚动 (Windows支持)
+                pg.scroll(int(dy))
             if dx != 0:
-                pyautogui.hscroll(int(dx))
+                pg.hscroll(int(dx))
     except Exception as e:
         print(f"鼠标滚轮错误: {e}")
 
 
-@socketio.on('key_event')
-def handle_key_event(data):
-    """处理键盘事件"""
-    try:
-        key = data.get('key', '')
-        action = data.get('action', 'down')
-
-        # 映射特殊键
-        key_map = {
-            'Enter': 'return',
-            'Return': 'return',
-            'Space': 'space',
-            'Tab': 'tab',
-            'Backspace': 'backspace',
-            'Delete': 'delete',
-            'Escape': 'esc',
-            'ArrowUp': 'up',
-            'ArrowDown': 'down',
-            'ArrowLeft': 'left',
-            'ArrowRight': 'right',
-            'Control': 'ctrl',
-            'Alt': 'alt',
-            'Shift': 'shift',
-            'Meta': 'win',
-            'Windows': 'win',
-        }
+@input_event('key_event')
+def handle_key_event(sid, data):
+    """处理键盘事件（边沿事件，按序注入）"""
+    input_injector.submit(_inject_key_event, data.get('key', ''), data.get('action', 'down'),
+                          source=_input_source('key_event', data))
 
-        mapped_key = key_map.get(key, key)
 
+def _inject_key_event(key, action):
+    input_sender = _input_sender()
+    try:
         if input_sender:
             if action == 'down':
-                input_sender.key_down(mapped_key)
+                input_sender.key_down(key)
             else:
-                input_sender.key_up(mapped_key)
+                input_sender.key_up(key)
         else:
-            if len(mapped_key) == 1 or mapped_key in key_map.values():
+            mapped_key = keymap.normalize_key(key)
+            pg = _get_pyautogui()
+            if pg is not None and (len(mapped_key) == 1 or mapped_key in keymap.KEY_VK):
                 if action == 'down':
-                    pyautogui.keyDown(mapped_key)
+                    pg.keyDown(mapped_key)
                 else:
-                    pyautogui.keyUp(mapped_key)
+                    pg.keyUp(mapped_key)
     except Exception as e:
         print(f"键盘事件错误: {e}")
 
 
-# 存储 WASD 当前状态
-wasd_state = {'w': False, 'a': False, 's': False, 'd': False}
+@input_event('type_text')
+def handle_type_text(sid, data):
+    """输入整段文本（粘贴），一次 SendInput 以 Unicode 事件提交"""
+    text = str(data.get('text', ''))[:TYPE_TEXT_MAX_CHARS]
+    if text:
+        input_injector.submit(_inject_type_text, text, source=_input_source('type_text', data))
+
+
+def _inject_type_text(text):
+    input_sender = _input_sender()
+    try:
+        if input_sender:
+            input_sender.type_text(text)
+        else:
+            pg = _get_pyautogui()
+            if pg is not None:
+                pg.write(text)
+    except Exception as e:
+        print(f"文本输入错误: {e}")
+
 
 def send_key(key, down):
     """统一按键发送函数"""
+    input_sender = _input_sender()
     if input_sender:
         if down:
             input_sender.key_down(key)
         else:
             input_sender.key_up(key)
     else:
+        pg = _get_pyautogui()
+        if pg is None:
+            return
         if down:
-            pyautogui.keyDown(key)
+            pg.keyDown(key)
         else:
-            pyautogui.keyUp(key)
-
-
-def _xinput_worker_loop():
-    global xinput_pad, xinput_last_buttons
-    global xinput_apply_count, xinput_apply_nonzero, xinput_apply_last_log
-    while True:
-        xinput_state_event.wait()
-        while True:
-            with xinput_lock:
-                if not xinput_state_queue:
-                    xinput_state_event.clear()
-                    break
-                item = xinput_state_queue.popleft()
-            sid, payload = item
-            pad = _xinput_ensure_for_sid(sid)
-            if pad is None:
-                continue
-            ok = _xinput_apply_state(pad, payload or {})
-            if ok:
-                xinput_apply_count += 1
-                if payload:
-                    if int(payload.get('buttons', 0) or 0) != 0 or \
-                       int(payload.get('lt', 0) or 0) != 0 or \
-                       int(payload.get('rt', 0) or 0) != 0 or \
-                       int(payload.get('lx', 0) or 0) != 0 or \
-                       int(payload.get('ly', 0) or 0) != 0 or \
-                       int(payload.get('rx', 0) or 0) != 0 or \
-                       int(payload.get('ry', 0) or 0) != 0:
-                        xinput_apply_nonzero += 1
-                now = time.time()
-                if now - xinput_apply_last_log >= 1.0:
-                    debug_log(f"[XInput] applied {xinput_apply_count}/s, non-zero {xinput_apply_nonzero}/s")
-                    xinput_apply_last_log = now
-                    xinput_apply_count = 0
-                    xinput_apply_nonzero = 0
-            if not ok:
-                with xinput_lock:
-                    if xinput_pad is pad:
-                        try:
-                            xinput_pad.reset()
-                            xinput_pad.update()
-                        except Exception:
-                            pass
-                        xinput_pad = None
-                        xinput_last_buttons = 0
-
-
-def _xinput_start_worker_once():
-    global xinput_worker_started
-    with xinput_lock:
-        if xinput_worker_started:
-            return
-        t = threading.Thread(target=_xinput_worker_loop, daemon=True, name="XInputWorker")
-        t.start()
-        xinput_worker_started = True
+            pg.keyUp(key)
 
 
-def _xinput_clamp_i16(v):
-    try:
-        x = int(v)
-    except Exception:
-        x = 0
-    return max(-32768, min(32767, x))
+def send_keys(changes):
+    """批量按键发送：changes 为 [(key, down), ...]，底层一次 SendInput 提交"""
+    input_sender = _input_sender()
+    if input_sender:
+        input_sender.send_batch([input_sender.key_event(key, down) for key, down in changes])
+    else:
+        for key, down in changes:
+            send_key(key, down)
 
 
-def _xinput_clamp_u8(v):
-    try:
-        x = int(v)
-    except Exception:
-        x = 0
-    return max(0, min(255, x))
-
-
-_XINPUT_BUTTON_MAP = {
-    0x0001: lambda: XUSB_BUTTON.XUSB_GAMEPAD_DPAD_UP,
-    0x0002: lambda: XUSB_BUTTON.XUSB_GAMEPAD_DPAD_DOWN,
-    0x0004: lambda: XUSB_BUTTON.XUSB_GAMEPAD_DPAD_LEFT,
-    0x0008: lambda: XUSB_BUTTON.XUSB_GAMEPAD_DPAD_RIGHT,
-    0x0010: lambda: XUSB_BUTTON.XUSB_GAMEPAD_START,
-    0x0020: lambda: XUSB_BUTTON.XUSB_GAMEPAD_BACK,
-    0x0040: lambda: XUSB_BUTTON.XUSB_GAMEPAD_LEFT_THUMB,
-    0x0080: lambda: XUSB_BUTTON.XUSB_GAMEPAD_RIGHT_THUMB,
-    0x0100: lambda: XUSB_BUTTON.XUSB_GAMEPAD_LEFT_SHOULDER,
-    0x0200: lambda: XUSB_BUTTON.XUSB_GAMEPAD_RIGHT_SHOULDER,
-    0x0400: lambda: XUSB_BUTTON.XUSB_GAMEPAD_GUIDE,
-    0x1000: lambda: XUSB_BUTTON.XUSB_GAMEPAD_A,
-    0x2000: lambda: XUSB_BUTTON.XUSB_GAMEPAD_B,
-    0x4000: lambda: XUSB_BUTTON.XUSB_GAMEPAD_X,
-    0x8000: lambda: XUSB_BUTTON.XUSB_GAMEPAD_Y,
-}
-
-
-def _xinput_ensure_for_sid(sid):
-    global xinput_pad, xinput_owner_sid, xinput_last_buttons
-    if not XINPUT_AVAILABLE or vg is None or XUSB_BUTTON is None:
-        return None
-    with xinput_lock:
-        if xinput_pad is None:
-            try:
-                xinput_pad = vg.VX360Gamepad()
-            except Exception as e:
-                print(f"[手柄] 创建虚拟手柄失败: {e}")
-                xinput_pad = None
-                xinput_owner_sid = None
-                xinput_last_buttons = 0
-                return None
-            try:
-                xinput_pad.reset()
-                xinput_pad.update()
-            except Exception:
-                pass
-        if xinput_owner_sid != sid:
-            # 仅移交控制权，不重建虚拟手柄，避免游戏端丢失设备绑定
-            try:
-                xinput_pad.reset()
-                xinput_pad.update()
-            except Exception:
-                pass
-            xinput_owner_sid = sid
-            xinput_last_buttons = 0
-        return xinput_pad
-
+def _xusb_button_bits(xusb):
+    """按键位 -> vgamepad 的 XUSB_BUTTON"""
+    return {
+        0x0001: xusb.XUSB_GAMEPAD_DPAD_UP,
+        0x0002: xusb.XUSB_GAMEPAD_DPAD_DOWN,
+        0x0004: xusb.XUSB_GAMEPAD_DPAD_LEFT,
+        0x0008: xusb.XUSB_GAMEPAD_DPAD_RIGHT,
+        0x0010: xusb.XUSB_GAMEPAD_START,
+        0x0020: xusb.XUSB_GAMEPAD_BACK,
+        0x0040: xusb.XUSB_GAMEPAD_LEFT_THUMB,
+        0x0080: xusb.XUSB_GAMEPAD_RIGHT_THUMB,
+        0x0100: xusb.XUSB_GAMEPAD_LEFT_SHOULDER,
+        0x0200: xusb.XUSB_GAMEPAD_RIGHT_SHOULDER,
+        0x0400: xusb.XUSB_GAMEPAD_GUIDE,
+        0x1000: xusb.XUSB_GAMEPAD_A,
+        0x2000: xusb.XUSB_GAMEPAD_B,
+        0x4000: xusb.XUSB_GAMEPAD_X,
+        0x8000: xusb.XUSB_GAMEPAD_Y,
+    }
 
-def _xinput_apply_state(pad, payload):
-    global xinput_last_buttons
 
-    lx = _xinput_clamp_i16(payload.get('lx', 0))
-    ly = _xinput_clamp_i16(payload.get('ly', 0))
-    rx = _xinput_clamp_i16(payload.get('rx', 0))
-    ry = _xinput_clamp_i16(payload.get('ry', 0))
-    lt = _xinput_clamp_u8(payload.get('lt', 0))
-    rt = _xinput_clamp_u8(payload.get('rt', 0))
-    buttons = payload.get('buttons', 0)
-    try:
-        buttons = int(buttons)
-    except Exception:
-        buttons = 0
+# 每个 (会话, 客户端手柄序号) 一个虚拟手柄，最多 4 个，共用一个固定频率的工作线程；
+# 真实的虚拟手柄在 load_vgamepad() 成功后换上
+gamepad_pool = GamepadPool(
+    MockGamepad if XINPUT_MOCK else None,
+    MOCK_BUTTON_BITS,
+    report_hz=xinput_report_hz,
+)
 
-    try:
-        pad.left_joystick(x_value=lx, y_value=ly)
-        pad.right_joystick(x_value=rx, y_value=ry)
-        pad.left_trigger(value=lt)
-        pad.right_trigger(value=rt)
-    except Exception as e:
-        print(f"[手柄] 设置摇杆/扳机失败: {e}")
-        return False
 
-    prev = xinput_last_buttons
-    for bit, btn_factory in _XINPUT_BUTTON_MAP.items():
+def load_vgamepad():
+    """延迟加载 vgamepad，返回虚拟手柄是否可用（结果会缓存）"""
+    global vg, XINPUT_AVAILABLE, _vgamepad_load_failed
+    if XINPUT_AVAILABLE or _vgamepad_load_failed:
+        return XINPUT_AVAILABLE
+    with _vgamepad_lock:
+        if XINPUT_AVAILABLE or _vgamepad_load_failed:
+            return XINPUT_AVAILABLE
         try:
-            btn = btn_factory()
-        except Exception:
-            continue
-        was = (prev & bit) != 0
-        now = (buttons & bit) != 0
-        if now and not was:
-            try:
-                pad.press_button(button=btn)
-            except Exception:
-                pass
-        elif was and not now:
-            try:
-                pad.release_button(button=btn)
-            except Exception:
-                pass
+            import vgamepad as _vg
+        except Exception as e:
+            _vgamepad_load_failed = True
+            print(f"[手柄] vgamepad 未启用: {e}")
+            return False
+        vg = _vg
+        gamepad_pool.set_backend(vg.VX360Gamepad, _xusb_button_bits(vg.XUSB_BUTTON))
+        XINPUT_AVAILABLE = True
+    return True
+
 
-    xinput_last_buttons = buttons
+def vgamepad_loaded():
+    """load_vgamepad() 是否已有结果（成功或失败），为 True 时 XINPUT_AVAILABLE 即最终结果"""
+    return XINPUT_AVAILABLE or _vgamepad_load_failed
+
+
+def _emit_xinput_status(sid):
+    # 与后台预热同时调用时在锁上等待其完成
+    transport.emit('xinput_status', {'available': load_vgamepad()}, to=sid)
+
+
+def _xinput_pad_index(data):
     try:
-        pad.update()
-    except Exception as e:
-        print(f"[手柄] 提交手柄状态失败: {e}")
-        return False
-    return True
+        return max(0, int((data or {}).get('pad', 0)))
+    except (TypeError, ValueError):
+        return 0
 
 
-@socketio.on('xinput_connect')
-def handle_xinput_connect(data):
-    sid = request.sid
-    if not XINPUT_AVAILABLE:
-        emit('xinput_status', {'available': False})
+@session_event('xinput_connect')
+def handle_xinput_connect(sid, data=None):
+    index = _xinput_pad_index(data)
+    if not load_vgamepad():
+        transport.emit('xinput_status', {'available': False, 'pad': index}, to=sid)
         return
-    _xinput_start_worker_once()
-    pad = _xinput_ensure_for_sid(sid)
-    if pad is None:
-        emit('xinput_status', {'available': False})
+    slot = gamepad_pool.attach(sid, index)
+    if slot is None:
+        transport.emit('xinput_status', {'available': False, 'pad': index, 'error': 'pool_full'}, to=sid)
         return
-    emit('xinput_status', {'available': True})
+    transport.emit('xinput_status', {'available': True, 'pad': index, 'player': slot + 1}, to=sid)
 
 
-@socketio.on('xinput_disconnect')
-def handle_xinput_disconnect(data=None):
-    sid = request.sid
-    global xinput_pad, xinput_owner_sid, xinput_last_buttons
-    with xinput_lock:
-        if xinput_owner_sid != sid:
-            return
-        try:
-            if xinput_pad is not None:
-                xinput_pad.reset()
-                xinput_pad.update()
-        except Exception:
-            pass
-        if xinput_state_queue:
-            xinput_state_queue.clear()
-        xinput_owner_sid = None
-        xinput_last_buttons = 0
+@session_event('xinput_disconnect')
+def handle_xinput_disconnect(sid, data=None):
+    gamepad_pool.release(sid, _xinput_pad_index(data))
 
 
-@socketio.on('xinput_state')
-def handle_xinput_state(data):
-    sid = request.sid
+@session_event('xinput_state')
+def handle_xinput_state(sid, data):
+    _xinput_push_state(sid, data)
+
+
+def _xinput_push_state(sid, data):
     global xinput_state_count, xinput_state_last_log
-    _xinput_start_worker_once()
+    if not XINPUT_AVAILABLE:
+        return
     xinput_state_count += 1
     now = time.time()
     if now - xinput_state_last_log >= 1.0:
-        debug_log(f"[XInput] recv {xinput_state_count}/s, owner={xinput_owner_sid == sid}")
+        debug_log(f"[XInput] recv {xinput_state_count}/s")
         xinput_state_last_log = now
         xinput_state_count = 0
-    with xinput_lock:
-        xinput_state_queue.append((sid, data or {}))
-    xinput_state_event.set()
-
-@socketio.on('gamepad_input')
-def handle_gamepad(data):
-    """处理游戏手柄/虚拟手柄输入"""
-    global wasd_state
+    data = data or {}
+    gamepad_pool.push(sid, _xinput_pad_index(data), xinput_normalize_state(data))
+
+
+@input_event('gamepad_input')
+def handle_gamepad(sid, data):
+    """处理游戏手柄/虚拟手柄输入（映射为按键，按序注入，WASD 状态按会话保存）"""
+    input_injector.submit(_inject_gamepad, sessions.get(sid).wasd_state, data,
+                          source=_input_source('gamepad_input', data))
+
+
+def _inject_gamepad(wasd_state, data):
     try:
         # WASD 移动
         if data.get('type') == 'movement':
@@ -1086,19 +1854,14 @@ def handle_gamepad(data):
             new_a = x < -deadzone
             new_d = x > deadzone
 
-            # 只在状态变化时发送按键
-            if new_w != wasd_state['w']:
-                send_key('w', new_w)
-                wasd_state['w'] = new_w
-            if new_s != wasd_state['s']:
-                send_key('s', new_s)
-                wasd_state['s'] = new_s
-            if new_a != wasd_state['a']:
-                send_key('a', new_a)
-                wasd_state['a'] = new_a
-            if new_d != wasd_state['d']:
-                send_key('d', new_d)
-                wasd_state['d'] = new_d
+            # 只在状态变化时发送按键，斜向变化合并为一次 SendInput
+            changes = []
+            for key, pressed in (('w', new_w), ('s', new_s), ('a', new_a), ('d', new_d)):
+                if pressed != wasd_state[key]:
+                    changes.append((key, pressed))
+                    wasd_state[key] = pressed
+            if changes:
+                send_keys(changes)
 
         # 动作按钮
         elif data.get('type') == 'action':
@@ -1122,40 +1885,264 @@ def handle_gamepad(data):
         print(f"手柄输入错误: {e}")
 
 
-@socketio.on('set_quality')
-def handle_set_quality(data, sid=None):
-    """设置图像质量"""
-    global quality
-    new_quality = max(10, min(95, data.get('quality', 60)))
-    quality = new_quality
-    print(f"[设置] 画质调整为: {quality}")
-    emit('quality_updated', {'quality': quality})
+# ============ 输入事件分发（Socket.IO / WebRTC DataChannel 共用） ============
+
+# 所有键鼠注入都在同一线程中按到达顺序执行，处理函数只负责入队
+input_injector = InputInjector(_inject_mouse_move_relative, _inject_mouse_move)
+
+# 光标位置：服务端按固定频率采样，变化时向订阅房间一次性广播
+CURSOR_ROOM = 'cursor'
+cursor_rate = int(os.getenv("RC_CURSOR_RATE", "60"))  # 采样频率 Hz
+
 
+def _broadcast_cursor(x, y):
+    transport.emit('mouse_pos', {'x': x, 'y': y}, to=CURSOR_ROOM)
 
-@socketio.on('set_fps')
-def handle_set_fps(data, sid=None):
-    """设置帧率"""
-    global fps
-    new_fps = max(10, min(60, data.get('fps', 30)))
-    fps = new_fps
-    print(f"[设置] 帧率调整为: {fps}")
-    emit('fps_updated', {'fps': fps})
 
+cursor_watcher = CursorWatcher(_read_cursor_pos, _broadcast_cursor, rate_hz=cursor_rate)
 
-@socketio.on('set_webrtc_scale')
-def handle_set_webrtc_scale(data):
-    global webrtc_scale
+
+def _subscribe_cursor(sid):
+    transport.enter_room(sid, CURSOR_ROOM)
+    cursor_watcher.subscribe(sid)
+
+
+# 通过无序通道发送的"状态型"消息，迟到的旧消息需要丢弃
+# gamepad_input 只有 movement（摇杆方向）是状态型，action 按钮边沿走可靠通道
+INPUT_CHANNEL_STATE_EVENTS = ('mouse_move', 'xinput_state', 'gamepad_input')
+
+
+def _input_state_key(event, data):
+    """状态型消息的序号比较键；非状态型（按钮边沿等）返回 None，始终处理"""
+    if event not in INPUT_CHANNEL_STATE_EVENTS:
+        return None
+    if not isinstance(data, dict):
+        return event
+    if event == 'xinput_state':
+        # 多个手柄各自独立判断
+        return event, data.get('pad', 0)
+    if event == 'gamepad_input' and data.get('type') != 'movement':
+        return None
+    return event
+
+
+def _dispatch_input_event(sid, event, data):
+    if event == 'xinput_state':
+        _xinput_push_state(sid, data)
+        return
+    handler = INPUT_CHANNEL_HANDLERS.get(event)
+    if handler is not None:
+        handler(sid, data or {})
+
+
+# 每帧记录数直方图桶
+INPUT_BATCH_BUCKETS = (1, 2, 3, 4, 6, 8, 12, 16, 32, 64, 128)
+
+
+def _dispatch_input_batch(sid, payload, last_seq=None, unordered=False):
+    """二进制输入帧：向量化解析与合并后，按原顺序交给注入线程
+
+    last_seq 为 DataChannel 的序号表（Socket.IO 有序，不传）：含绝对移动的帧与 JSON mouse_move
+    共用序号键，无序通道上迟到的帧跳过其中的绝对移动，避免光标跳回旧位置
+    """
     try:
-        scale = float(data.get('scale', webrtc_scale))
+        seq, records = input_protocol.decode(payload)
+    except input_protocol.ProtocolError as e:
+        metrics.get_counter('input.batch_rejected').inc()
+        debug_log(f"[输入] 丢弃二进制输入帧: {e}")
+        return
+    metrics.get_histogram('input.batch_records', INPUT_BATCH_BUCKETS).observe(len(records))
+    session = sessions.get(sid)
+    game_mode = session.game_mode
+
+    stale_absolute = False
+    if last_seq is not None and (records['type'] == input_protocol.MOVE_ABSOLUTE).any():
+        if unordered and seq <= last_seq.get('mouse_move', -1):
+            metrics.get_counter('input.datachannel_stale_dropped').inc()
+            stale_absolute = True
+        else:
+            last_seq['mouse_move'] = max(seq, last_seq.get('mouse_move', -1))
+
+    for kind, flags, a, b, client_ms in input_protocol.commands(records):
+        if stale_absolute and kind == input_protocol.MOVE_ABSOLUTE:
+            continue
+        if kind == input_protocol.MOVE_RELATIVE:
+            if flags & input_protocol.FLAG_RAW_SET:
+                raw_input = bool(flags & input_protocol.FLAG_RAW)
+            else:
+                raw_input = game_mode
+            input_injector.submit_move(a, b, raw_input, source=('mouse_move_relative', client_ms))
+        elif kind == input_protocol.MOVE_ABSOLUTE:
+            x, y = session.map_point(a, b, get_screen_size())
+            input_injector.submit_absolute(x, y, game_mode, source=('mouse_move', client_ms))
+        elif kind == input_protocol.CLICK:
+            button = input_protocol.CLICK_BUTTONS[min(flags & 0x03, 2)]
+            action = 'down' if flags & input_protocol.FLAG_DOWN else 'up'
+            input_injector.submit(_inject_mouse_click, button, action, source=('mouse_click', client_ms))
+        elif kind == input_protocol.SCROLL:
+            input_injector.submit(_inject_mouse_scroll, a, b, game_mode, source=('mouse_scroll', client_ms))
+
+
+@session_event('input_batch')
+def handle_input_batch(sid, data):
+    """二进制批量指针事件（见 input_protocol.py）"""
+    if isinstance(data, (bytes, bytearray)):
+        _dispatch_input_batch(sid, bytes(data))
+
+
+@session_event('input_ping')
+def handle_input_ping(sid, data=None):
+    """输入通道延迟测量：原样回显"""
+    transport.emit('input_pong', data, to=sid)
+
+
+@session_event('clock_sync')
+def handle_clock_sync(sid, data=None):
+    """时钟同步：回传客户端发送时间与服务端时间（ms），客户端据此估计时钟偏移"""
+    transport.emit('clock_sync', {'t0': (data or {}).get('t0'), 'ts': time.time() * 1000.0}, to=sid)
+
+
+def input_latency_summary():
+    """按事件类型汇总各阶段注入延迟（p50/p95/p99）"""
+    summary = {}
+    prefix = 'input.latency.'
+    for name, snap in metrics.snapshot(prefix)['histograms'].items():
+        event_type, stage = name[len(prefix):].rsplit('.', 1)
+        summary.setdefault(event_type, {})[stage] = {
+            'count': snap['count'], 'p50': snap['p50'], 'p95': snap['p95'], 'p99': snap['p99'],
+        }
+    return summary
+
+
+@session_event('get_input_latency')
+def handle_get_input_latency(sid, data=None):
+    transport.emit('input_latency', input_latency_summary(), to=sid)
+
+
+# 客户端回报 [条码值, 显示时刻（服务端时钟 ms）]：
+#     捕获到显示延迟 = 条码距今的毫秒数 - 显示时刻距今的毫秒数
+LATENCY_PROBE_TRANSPORTS = ('webrtc', 'mjpeg')
+LATENCY_PROBE_MAX_MS = 10000.0     # 超过则视为误码（8 位校验仍可能放过）或时钟未同步
+LATENCY_PROBE_MAX_SAMPLES = 256    # 单次回报的样本上限
+
+
+def latency_probe_payload():
+    return {
+        'enabled': latency_probe_enabled,
+        'block': frame_marker.DEFAULT_BLOCK,
+        'blocks': frame_marker.MARKER_BLOCKS,
+    }
+
+
+def record_latency_probe(name, samples, now_ms=None):
+    """按传输方式记录捕获到显示延迟，返回有效样本数"""
+    hist = metrics.get_histogram(f'probe.{name}_ms')
+    rejected = metrics.get_counter('probe.rejected')
+    now_value = frame_marker.now_value()
+    now_ms = time.time() * 1000.0 if now_ms is None else now_ms
+    accepted = 0
+    for sample in samples:
+        try:
+            value, displayed_at = int(sample[0]), float(sample[1])
+        except (TypeError, ValueError, IndexError):
+            rejected.inc()
+            continue
+        latency = frame_marker.age_ms(value, now_value) - (now_ms - displayed_at)
+        if not 0.0 <= latency <= LATENCY_PROBE_MAX_MS:
+            rejected.inc()
+            continue
+        hist.observe(latency)
+        accepted += 1
+    return accepted
+
+
+def latency_probe_summary():
+    """各传输方式的捕获到显示延迟（p50/p95/p99）"""
+    summary = {}
+    for name in LATENCY_PROBE_TRANSPORTS:
+        snap = metrics.get_histogram(f'probe.{name}_ms').snapshot()
+        if snap['count']:
+            summary[name] = {'count': snap['count'], 'p50': snap['p50'], 'p95': snap['p95'], 'p99': snap['p99']}
+    return summary
+
+
+@session_event('set_latency_probe')
+def handle_set_latency_probe(sid, data=None):
+    """开关延迟探针（全局：所有会话的画面都会带上条码），只有管理员会话可以开关"""
+    global latency_probe_enabled
+    if not sessions.get(sid).admin:
+        transport.emit('latency_probe_state', dict(latency_probe_payload(), admin=False, error='forbidden'), to=sid)
+        return
+    latency_probe_enabled = bool((data or {}).get('enabled'))
+    if capture_proc is not None:
+        capture_proc.set_probe(latency_probe_enabled)
+    print(f"[设置] 延迟探针: {'开启' if latency_probe_enabled else '关闭'}")
+    transport.emit('latency_probe_state', latency_probe_payload())
+
+
+@session_event('latency_probe')
+def handle_latency_probe(sid, data=None):
+    """客户端回报显示中的条码 {transport, samples: [[条码值, 显示时刻 ms], ...]}"""
+    data = data or {}
+    name = data.get('transport')
+    samples = data.get('samples')
+    if name not in LATENCY_PROBE_TRANSPORTS or not isinstance(samples, list):
+        return
+    record_latency_probe(name, samples[:LATENCY_PROBE_MAX_SAMPLES])
+    transport.emit('latency_probe_stats', latency_probe_summary(), to=sid)
+
+
+@session_event('set_quality')
+def handle_set_quality(sid, data):
+    """设置图像质量（仅该会话）"""
+    session = sessions.get(sid)
+    session.quality = max(10, min(95, int(data.get('quality', session.quality))))
+    print(f"[设置] {sid} 画质调整为: {session.quality}")
+    transport.emit('quality_updated', {'quality': session.quality}, to=sid)
+
+
+@session_event('set_fps')
+def handle_set_fps(sid, data):
+    """设置帧率（仅该会话）"""
+    session = sessions.get(sid)
+    session.fps = max(10, min(60, int(data.get('fps', session.fps))))
+    print(f"[设置] {sid} 帧率调整为: {session.fps}")
+    transport.emit('fps_updated', {'fps': session.fps}, to=sid)
+
+
+@session_event('set_webrtc_scale')
+def handle_set_webrtc_scale(sid, data):
+    session = sessions.get(sid)
+    try:
+        scale = float(data.get('scale', session.webrtc_scale))
     except Exception:
-        scale = webrtc_scale
+        scale = session.webrtc_scale
 
-    webrtc_scale = 0.5 if scale < 0.75 else 1.0
-    emit('webrtc_scale_updated', {'scale': webrtc_scale})
+    session.webrtc_scale = DEFAULT_WEBRTC_SCALE if scale < 0.75 else 1.0
+    transport.emit('webrtc_scale_updated', {'scale': session.webrtc_scale}, to=sid)
 
 
-@socketio.on('set_capture_mode')
-def handle_set_capture_mode(data):
+@session_event('set_capture_region')
+def handle_set_capture_region(sid, data=None):
+    """设置该会话的捕获区域 {x, y, w, h}（物理像素），为空时恢复全屏"""
+    session = sessions.get(sid)
+    data = data or {}
+    region = None
+    if data.get('w') and data.get('h'):
+        try:
+            region = (data.get('x', 0), data.get('y', 0), data['w'], data['h'])
+            region = session.set_region(region, get_screen_size())
+        except (TypeError, ValueError):
+            region = session.region
+    else:
+        session.set_region(None, get_screen_size())
+    if latency_probe_enabled and region and region[2] < frame_marker.marker_size()[0]:
+        print(f"[延迟探针] {sid} 捕获区域宽 {region[2]}px，放不下时间条码（{frame_marker.marker_size()[0]}px），该会话没有探针样本")
+    transport.emit('capture_region_updated', {'region': list(region) if region else None}, to=sid)
+
+
+@session_event('set_capture_mode')
+def handle_set_capture_mode(sid, data):
     """切换屏幕捕获模式 (dxgi/mss)"""
     global dxgi_capture_enabled, dxgi_failure_count, dxgi_retry_after
     mode = data.get('mode', 'auto')
@@ -1165,66 +2152,127 @@ def handle_set_capture_mode(data):
         dxgi_failure_count = 0
         dxgi_capture_enabled = init_dxgi_camera()
         if dxgi_capture_enabled:
-            emit('capture_mode_updated', {'mode': 'dxgi', 'status': 'ok'})
+            transport.emit('capture_mode_updated', {'mode': 'dxgi', 'status': 'ok'}, to=sid)
         else:
-            emit('capture_mode_updated', {'mode': 'mss', 'status': 'error', 'message': 'DXGI 初始化失败'})
+            transport.emit('capture_mode_updated', {'mode': 'mss', 'status': 'error', 'message': 'DXGI 初始化失败'}, to=sid)
     elif mode == 'mss':
         dxgi_capture_enabled = False
         release_dxgi_camera()
-        emit('capture_mode_updated', {'mode': 'mss', 'status': 'ok'})
+        transport.emit('capture_mode_updated', {'mode': 'mss', 'status': 'ok'}, to=sid)
     else:  # auto
         dxgi_capture_enabled = init_dxgi_camera()
-        emit('capture_mode_updated', {'mode': 'dxgi' if dxgi_capture_enabled else 'mss', 'status': 'ok'})
+        transport.emit('capture_mode_updated', {'mode': 'dxgi' if dxgi_capture_enabled else 'mss', 'status': 'ok'}, to=sid)
 
 
-@socketio.on('get_capture_info')
-def handle_get_capture_info():
+@session_event('get_capture_info')
+def handle_get_capture_info(sid, data=None):
     """获取当前捕获模式信息"""
-    emit('capture_info', {
+    transport.emit('capture_info', {
         'mode': 'dxgi' if dxgi_camera else 'mss',
         'dxgi_available': dxcam is not None,
-        'dxgi_active': dxgi_camera is not None
-    })
+        'dxgi_active': dxgi_camera is not None,
+        'capture_process': capture_proc is not None and capture_proc.is_running(),
+    }, to=sid)
+
+
+startup_timing.mark('模块级初始化', kind='init')
 
 
 # ============ 启动 ============
 
+def _background_startup(use_dxgi, prewarm, profile):
+    """监听之后在后台完成的初始化：输入后端、虚拟手柄、DXGI 相机、aiortc 导入与（可选）编码器预热"""
+    tasks = [('InputSender', _input_sender), ('vgamepad', load_vgamepad)]
+    if use_dxgi:
+        tasks.append(('DXGI 相机', init_dxgi_camera))
+    if webrtc_enabled:
+        tasks.append(('aiortc / av', load_webrtc))
+    for name, fn in tasks:
+        start = time.perf_counter()
+        try:
+            fn()
+        except Exception as e:
+            print(f"[启动] 后台初始化 {name} 失败: {e}")
+        startup_timing.record(name, start)
+    if prewarm:
+        start_webrtc_warmup()
+    if profile:
+        startup_timing.report("后台初始化", kinds=('background',))
+
+
+def _on_listening(use_dxgi, prewarm, profile):
+    """端口已绑定：记录启动耗时，其余初始化交给后台线程"""
+    startup_timing.mark('绑定端口', kind='init')
+    print(f"[启动] 已开始监听，启动耗时 {startup_timing.elapsed_ms():.0f}ms")
+    if profile:
+        startup_timing.report("监听前（导入与初始化）", kinds=('import', 'init'))
+        print("[启动耗时] 逐模块导入耗时: python -X importtime server.py")
+    threading.Thread(target=_background_startup, args=(use_dxgi, prewarm, profile), daemon=True,
+                     name="StartupWarmup").start()
+
+
 def main():
+    global capture_process_enabled, latency_probe_enabled
+    display_geometry.start()
     ip = get_local_ip()
-    port = 5000
+    port = SERVER_PORT
+    # threading: Flask-SocketIO（默认）；async: aiohttp + AsyncServer，见 async_server.py
+    server_mode = 'async' if '--async' in sys.argv else os.getenv("RC_SERVER_MODE", "threading")
 
     # 检查命令行参数
     use_dxgi = '--dxgi' in sys.argv
-
-    # 如果指定了 --dxgi，尝试初始化
-    if use_dxgi:
-        print("[启动] 尝试启用 DXGI 捕获...")
-        init_dxgi_camera()
+    capture_process_enabled = capture_process_enabled or '--capture-process' in sys.argv
+    prewarm = '--prewarm' in sys.argv or os.getenv("RC_WEBRTC_PREWARM", "0") == "1"
+    latency_probe_enabled = latency_probe_enabled or '--latency-probe' in sys.argv
+    profile = '--profile-startup' in sys.argv or os.getenv("RC_PROFILE_STARTUP", "0") == "1"
 
     print("=" * 50)
     print("    远程控制服务端已启动")
     print("=" * 50)
     print(f"  本机IP: {ip}")
     print(f"  端口: {port}")
-    print(f"  屏幕分辨率: {pyautogui.size()}")
-    print(f"  捕获模式: {'DXGI (硬件加速)' if dxgi_camera else 'MSS (软件捕获)'}")
+    print(f"  屏幕分辨率: {get_screen_size()}")
+    # DXGI 相机在监听后于后台初始化
+    print(f"  捕获模式: {'DXGI (硬件加速，后台初始化)' if use_dxgi else 'MSS (软件捕获)'}")
+    print(f"  服务模式: {server_mode}")
+    if capture_process_enabled:
+        print("  捕获/编码: 独立进程（共享内存）")
+    if latency_probe_enabled:
+        print("  延迟探针: 已开启（画面左上角带时间条码）")
     print("-" * 50)
     print(f"  控制界面: http://{ip}:{port}")
     print("=" * 50)
     print("\n请确保平板和电脑连接同一个热点/WiFi")
     print("在平板上用浏览器访问上述地址即可控制")
-    if dxgi_camera:
+    if use_dxgi:
         print("\n[提示] DXGI 模式已启用，管理员运行可捕获 UAC 弹窗")
     else:
         print("\n[提示] 使用: python server.py --dxgi 启用硬件加速捕获")
+    if not is_running_as_admin():
+        print("[提示] 当前未以管理员权限运行：对管理员权限窗口的鼠标/按键注入可能会失效")
+        print("[提示] 请使用 start_admin.bat 以管理员模式启动")
     print()
+    startup_timing.mark('启动信息', kind='init')
+
+    def on_listening():
+        _on_listening(use_dxgi, prewarm, profile)
 
     try:
         # 启动服务
-        socketio.run(app, host='0.0.0.0', port=port, debug=False, use_reloader=False)
+        if server_mode == 'async':
+            from . import async_server
+            async_server.run(host='0.0.0.0', port=port, on_listening=on_listening)
+        else:
+            # 与 socketio.run(threading 模式) 相同的 Werkzeug 多线程服务器，自行绑定以便在监听后立即开始后台初始化
+            from werkzeug.serving import make_server
+            server = make_server('0.0.0.0', port, app, threaded=True)
+            on_listening()
+            server.serve_forever()
     finally:
         # 清理资源
         release_dxgi_camera()
+        if capture_proc is not None:
+            capture_proc.stop()
 
 
 if __name__ == '__main__':
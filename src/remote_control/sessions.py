@@ -0,0 +1,115 @@
+"""
+客户端会话 - 每个 Socket.IO 连接一份独立的推流参数与输入模式
+画质、帧率、WebRTC 缩放、捕获区域、游戏模式与 WASD 状态都保存在会话中，
+手机调低画质不再影响同时连接的平板。推流阶段按会话的配置（缩放 + 区域）
+从共享捕获帧派生画面，相同配置的会话共用同一份缩放结果（见 frame_cache.py）。
+"""
+
+import threading
+import time
+
+DEFAULT_QUALITY = 60      # MJPEG 图像质量 1-95
+DEFAULT_FPS = 30          # MJPEG 目标帧率
+DEFAULT_WEBRTC_SCALE = 0.5
+
+MIN_REGION_SIZE = 64      # 捕获区域最小边长（像素）
+
+
+class ClientSession:
+    """单个客户端的推流配置与输入状态"""
+
+    def __init__(self, sid):
+        self.sid = sid
+        self.transport = 'mjpeg'   # 当前视频传输：mjpeg / webrtc
+        self.quality = DEFAULT_QUALITY
+        self.fps = DEFAULT_FPS
+        self.webrtc_scale = DEFAULT_WEBRTC_SCALE
+        self.region = None         # 捕获区域 (x, y, w, h)，物理像素；None 表示整个主屏
+        self.game_mode = False     # 游戏模式：使用底层 SendInput，禁用鼠标同步
+        self.wasd_state = {'w': False, 'a': False, 's': False, 'd': False}
+        self.admin = False         # 可使用全局开关（延迟探针等），连接时按来源地址 / 令牌判定
+        self.connected_at = time.time()
+
+    def stream_profile(self):
+        """WebRTC 推流配置 (缩放, 区域)：相同配置的会话共用派生帧"""
+        return self.webrtc_scale, self.region
+
+    def set_region(self, region, screen_size):
+        """设置捕获区域（裁剪到屏幕内，宽高取偶数以满足 YUV420），region 为空时恢复全屏"""
+        if not region:
+            self.region = None
+            return None
+        screen_w, screen_h = screen_size
+        x = max(0, min(int(region[0]), screen_w - MIN_REGION_SIZE))
+        y = max(0, min(int(region[1]), screen_h - MIN_REGION_SIZE))
+        w = max(MIN_REGION_SIZE, min(int(region[2]), screen_w - x)) & ~1
+        h = max(MIN_REGION_SIZE, min(int(region[3]), screen_h - y)) & ~1
+        self.region = None if (x, y, w, h) == (0, 0, screen_w & ~1, screen_h & ~1) else (x, y, w, h)
+        return self.region
+
+    def map_point(self, x, y, screen_size):
+        """绝对坐标换算：设置了区域时，客户端按整屏尺寸给出的坐标映射到区域内"""
+        region = self.region
+        if region is None:
+            return x, y
+        screen_w, screen_h = screen_size
+        rx, ry, rw, rh = region
+        return rx + x * rw / max(1, screen_w), ry + y * rh / max(1, screen_h)
+
+    def held_keys(self):
+        return [key for key, pressed in self.wasd_state.items() if pressed]
+
+    def to_dict(self):
+        return {
+            'sid': self.sid,
+            'transport': self.transport,
+            'quality': self.quality,
+            'fps': self.fps,
+            'webrtc_scale': self.webrtc_scale,
+            'region': list(self.region) if self.region else None,
+            'game_mode': self.game_mode,
+            'connected_s': round(time.time() - self.connected_at, 1),
+        }
+
+
+class SessionRegistry:
+    """按 sid 保存 ClientSession"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sessions = {}
+
+    def open(self, sid):
+        with self._lock:
+            session = self._sessions.get(sid)
+            if session is None:
+                session = ClientSession(sid)
+                self._sessions[sid] = session
+            return session
+
+    def close(self, sid):
+        with self._lock:
+            return self._sessions.pop(sid, None)
+
+    def get(self, sid):
+        """已注册的会话；未知 sid（断开后迟到的事件、测试直连）返回一个不登记的默认会话"""
+        session = self._sessions.get(sid)
+        return session if session is not None else ClientSession(sid)
+
+    def __len__(self):
+        return len(self._sessions)
+
+    def sessions(self):
+        with self._lock:
+            return list(self._sessions.values())
+
+    def profiles(self):
+        """WebRTC 会话的不同推流配置 -> 使用该配置的 sid 列表"""
+        profiles = {}
+        for session in self.sessions():
+            if session.transport == 'webrtc':
+                profiles.setdefault(session.stream_profile(), []).append(session.sid)
+        return profiles
+
+    def stats(self):
+        return [session.to_dict() for session in self.sessions()]
@@ -0,0 +1,52 @@
+"""
+启动耗时记录 - 导入、初始化与后台预热各阶段的耗时，--profile-startup 时打印
+
+起点为本模块首次导入的时刻：server.py / python -m remote_control 在导入 server_app 之前先导入本模块，
+因此包含全部依赖的导入时间（不含解释器自身启动）。
+    mark(阶段)            记录距上一个 mark 的耗时（顺序执行的导入与初始化）
+    record(阶段, 开始)    记录显式起止的耗时（后台线程中的预热任务）
+
+本模块只依赖标准库。
+"""
+
+import threading
+import time
+
+_origin = time.perf_counter()
+_last = _origin
+_lock = threading.Lock()
+_stages = []   # (阶段, 类型, 耗时 ms, 结束时距起点 ms)
+
+
+def elapsed_ms(now=None):
+    """距起点的毫秒数"""
+    return ((time.perf_counter() if now is None else now) - _origin) * 1000.0
+
+
+def mark(stage, kind='import'):
+    """记录从上一个 mark 到现在的耗时"""
+    global _last
+    now = time.perf_counter()
+    with _lock:
+        _stages.append((stage, kind, (now - _last) * 1000.0, elapsed_ms(now)))
+        _last = now
+
+
+def record(stage, start, kind='background'):
+    """记录 start（perf_counter）到现在的耗时，不影响 mark 的计时"""
+    now = time.perf_counter()
+    with _lock:
+        _stages.append((stage, kind, (now - start) * 1000.0, elapsed_ms(now)))
+
+
+def stages(kind=None):
+    with _lock:
+        return [s for s in _stages if kind is None or s[1] == kind]
+
+
+def report(title, kinds=None):
+    """打印各阶段耗时表"""
+    rows = [s for s in stages() if kinds is None or s[1] in kinds]
+    print(f"[启动耗时] {title}")
+    for stage, kind, cost, at in rows:
+        print(f"    {kind:<10} {stage:<28} {cost:8.1f}ms   @{at:8.1f}ms")
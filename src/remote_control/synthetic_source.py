@@ -0,0 +1,122 @@
+"""
+合成画面来源 - 无显示环境（Linux、基准测试、RC_CAPTURE_SOURCE=synthetic）下代替屏幕捕获
+grab() 与 mss / DXGI 路径一样返回 (高, 宽, 3) 的 RGB24 数组。
+
+画面类型（对编码器的压力从低到高）：
+    static    静止桌面：纯色背景、几个窗口与文字，每帧完全相同
+    text      滚动文字：整屏文本每帧上移一行，模拟浏览网页、滚动代码
+    gradient  平移渐变：整屏每帧水平平移 8 像素（捕获进程的默认合成画面）
+    video     视频：预生成的高熵帧循环播放，每帧大部分像素都在变化
+
+与真实捕获一样每次 grab() 都返回新的缓冲。marker=True 时在左上角写入捕获时刻的
+时间条码（frame_marker.py），接收端据此计算逐帧延迟。
+
+本模块只依赖 NumPy 与 Pillow，捕获进程的工作进程可以直接导入。
+"""
+
+import numpy as np
+
+from . import frame_marker
+
+CONTENT_TYPES = ('static', 'text', 'gradient', 'video')
+
+TEXT_LINE_HEIGHT = 16     # 文本行高（像素），text 画面每帧滚动一行
+VIDEO_CYCLE_FRAMES = 8    # video 画面预生成的帧数
+
+
+def _desktop(width, height):
+    """静止桌面：背景 + 带标题栏的窗口 + 窗口内文字"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    img = Image.new('RGB', (width, height), (32, 72, 120))
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default()
+    windows = (
+        (width // 16, height // 12, width // 2, height * 2 // 3),
+        (width * 2 // 5, height // 4, width * 15 // 16, height * 11 // 12),
+    )
+    for i, (x0, y0, x1, y1) in enumerate(windows):
+        draw.rectangle((x0, y0, x1, y1), fill=(250, 250, 250), outline=(90, 90, 90))
+        draw.rectangle((x0, y0, x1, y0 + 28), fill=(220, 226, 235))
+        draw.text((x0 + 10, y0 + 8), f"Window {i + 1}", fill=(20, 20, 20), font=font)
+        for row, y in enumerate(range(y0 + 40, y1 - TEXT_LINE_HEIGHT, TEXT_LINE_HEIGHT)):
+            draw.text((x0 + 12, y), f"{row:04d}  The quick brown fox jumps over the lazy dog",
+                      fill=(40, 40, 40), font=font)
+    draw.rectangle((0, height - 40, width, height), fill=(24, 24, 28))
+    return np.asarray(img, dtype=np.uint8).copy()
+
+
+def _text_page(width, height):
+    """滚动文字：白底黑字的整屏文本，高度取行高的整数倍以便无缝循环"""
+    from PIL import Image, ImageDraw, ImageFont
+
+    rows = (height + TEXT_LINE_HEIGHT - 1) // TEXT_LINE_HEIGHT
+    img = Image.new('RGB', (width, rows * TEXT_LINE_HEIGHT), (255, 255, 255))
+    draw = ImageDraw.Draw(img)
+    font = ImageFont.load_default()
+    words = "def grab(self): return np.roll(self.page, -self.offset, axis=0)  # scrolling text "
+    for row in range(rows):
+        line = (f"{row:5d}  " + words * (1 + width // 400))[:width // 6]
+        draw.text((8, row * TEXT_LINE_HEIGHT + 2), line, fill=(16, 16, 16), font=font)
+    return np.asarray(img, dtype=np.uint8).copy()
+
+
+def _gradient(width, height):
+    x = np.arange(width, dtype=np.uint16)
+    y = np.arange(height, dtype=np.uint16)[:, None]
+    base = np.empty((height, width, 3), dtype=np.uint8)
+    base[:, :, 0] = (x + y) & 0xFF
+    base[:, :, 1] = (x * 2) & 0xFF
+    base[:, :, 2] = (y * 2) & 0xFF
+    return base
+
+
+def _video_frames(width, height, count, seed=1):
+    """高熵画面：移动的低频色块叠加细颗粒噪声"""
+    rng = np.random.default_rng(seed)
+    block = 16
+    coarse = rng.integers(0, 256, size=((height + block - 1) // block + count, (width + block - 1) // block, 3),
+                          dtype=np.uint8)
+    frames = []
+    for i in range(count):
+        low = np.repeat(np.repeat(coarse[i:i + (height + block - 1) // block], block, axis=0), block, axis=1)
+        low = low[:height, :width].astype(np.int16)
+        grain = rng.integers(-24, 25, size=(height, width, 1), dtype=np.int16)
+        frames.append(np.clip(low + grain, 0, 255).astype(np.uint8))
+    return frames
+
+
+class SyntheticSource:
+    """按画面类型生成 RGB 帧"""
+
+    def __init__(self, width, height, content='gradient', marker=False):
+        if content not in CONTENT_TYPES:
+            raise ValueError(f"未知的合成画面类型: {content}（可选 {', '.join(CONTENT_TYPES)}）")
+        self.width = width
+        self.height = height
+        self.content = content
+        self.marker = marker
+        self.step = 0
+        if content == 'static':
+            self.base = _desktop(width, height)
+        elif content == 'text':
+            self.base = _text_page(width, height)
+        elif content == 'gradient':
+            self.base = _gradient(width, height)
+        else:
+            self.frames = _video_frames(width, height, VIDEO_CYCLE_FRAMES)
+
+    def grab(self):
+        self.step += 1
+        if self.content == 'static':
+            frame = self.base.copy()
+        elif self.content == 'text':
+            offset = (self.step * TEXT_LINE_HEIGHT) % self.base.shape[0]
+            frame = np.roll(self.base, -offset, axis=0)[:self.height]
+        elif self.content == 'gradient':
+            frame = np.roll(self.base, (self.step * 8) % self.width, axis=1)
+        else:
+            frame = self.frames[self.step % len(self.frames)].copy()
+        if self.marker:
+            frame_marker.stamp(frame, frame_marker.now_value())
+        return frame
@@ -0,0 +1,123 @@
+"""
+XInput 状态槽 - 每个控制者只保留最新状态，但不丢失按键边沿
+客户端以固定频率上报完整手柄状态。注入线程落后时，中间的摇杆/扳机位置没有意义，
+直接跳到最新状态即可；但按键状态变化（按下/抬起）必须逐个保留，否则短按会丢失。
+
+每个控制者一个待处理列表：新状态的按键位与列表末尾相同 -> 覆盖末尾（最新值优先）；
+按键位不同 -> 追加（保留边沿）。列表长度因此只随按键变化次数增长。
+"""
+
+import collections
+import threading
+import time
+
+from . import metrics
+
+# 状态元组 (buttons, lx, ly, rx, ry, lt, rt)
+BUTTONS = 0
+
+
+def _clamp_i16(v):
+    try:
+        x = int(v)
+    except Exception:
+        x = 0
+    return max(-32768, min(32767, x))
+
+
+def _clamp_u8(v):
+    try:
+        x = int(v)
+    except Exception:
+        x = 0
+    return max(0, min(255, x))
+
+
+def normalize_state(payload):
+    """客户端上报的字典 -> 状态元组（已裁剪到 XInput 取值范围）"""
+    try:
+        buttons = int(payload.get('buttons', 0)) & 0xFFFF
+    except Exception:
+        buttons = 0
+    return (
+        buttons,
+        _clamp_i16(payload.get('lx', 0)),
+        _clamp_i16(payload.get('ly', 0)),
+        _clamp_i16(payload.get('rx', 0)),
+        _clamp_i16(payload.get('ry', 0)),
+        _clamp_u8(payload.get('lt', 0)),
+        _clamp_u8(payload.get('rt', 0)),
+    )
+
+
+class XInputStateSlots:
+    """按控制者保存待应用的手柄状态"""
+
+    def __init__(self, name='xinput'):
+        self._lock = threading.Lock()
+        self._pending = collections.OrderedDict()  # owner -> [(state, 入队时间), ...]
+        self.event = threading.Event()
+
+        self.age_hist = metrics.get_histogram(f'{name}.queue_age_ms')
+        self.coalesced_counter = metrics.get_counter(f'{name}.coalesced')
+        self.applied_counter = metrics.get_counter(f'{name}.applied')
+        self.skipped_counter = metrics.get_counter(f'{name}.skipped')
+        self.applied_per_s = 0.0
+        self._rate_start = time.perf_counter()
+        self._rate_applied = 0
+
+    def push(self, owner, state):
+        now = time.perf_counter()
+        with self._lock:
+            pending = self._pending.get(owner)
+            if pending is None:
+                self._pending[owner] = [(state, now)]
+            elif pending[-1][0][BUTTONS] == state[BUTTONS]:
+                # 仅模拟量变化：覆盖，保留原入队时间以统计真实排队时长
+                pending[-1] = (state, pending[-1][1])
+                self.coalesced_counter.inc()
+            else:
+                pending.append((state, now))
+        self.event.set()
+
+    def take(self):
+        """取出全部待处理状态：[(owner, [(state, 入队时间), ...]), ...]"""
+        with self._lock:
+            if not self._pending:
+                self.event.clear()
+                return []
+            items = list(self._pending.items())
+            self._pending.clear()
+            return items
+
+    def discard(self, owner):
+        with self._lock:
+            self._pending.pop(owner, None)
+
+    def depth(self):
+        with self._lock:
+            return sum(len(p) for p in self._pending.values())
+
+    def record(self, enqueued, applied):
+        """记录一次处理结果：applied=False 表示状态未变化、跳过了 update()"""
+        self.age_hist.observe((time.perf_counter() - enqueued) * 1000.0)
+        if applied:
+            self.applied_counter.inc()
+            self._rate_applied += 1
+        else:
+            self.skipped_counter.inc()
+        now = time.perf_counter()
+        elapsed = now - self._rate_start
+        if elapsed >= 1.0:
+            self.applied_per_s = self._rate_applied / elapsed
+            self._rate_start = now
+            self._rate_applied = 0
+
+    def stats(self):
+        stats = metrics.snapshot('xinput.')
+        stats['pending'] = self.depth()
+        elapsed = time.perf_counter() - self._rate_start
+        # 超过一个统计窗口没有新状态时按当前窗口计算，避免显示过期的速率
+        rate = self._rate_applied / elapsed if elapsed >= 1.0 else self.applied_per_s
+        stats['applied_per_s'] = round(rate, 1)
+        return stats
@@ -19,6 +19,7 @@ function debugLog(...args) {
 const state = {
     socket: null,
     connected: false,
+    inputProtocol: 0, // 服务端支持的二进制输入协议版本，0 表示只用 JSON
     currentMode: 'touch', // touch, gamepad, keyboard
     screenWidth: 1920,
     screenHeight: 1080,
@@ -38,6 +39,39 @@ const state = {
     webrtc: {
         pc: null,
         using: false,
+        connectAt: 0,
+        offerAt: 0,
+        firstFrameReported: false,
+        inputUnreliable: null,
+        inputReliable: null,
+        inputSeq: 0,
+        lastXinputButtons: -1,
+        lastGamepadKeys: -1,
+    },
+    // 客户端 -> 服务端时钟偏移（ms），由 clock_sync 往返估计，用于输入延迟统计
+    clock: {
+        offset: 0,
+        synced: false,
+        samples: [],
+        timer: null,
+    },
+    inputLatency: {
+        p50: 0,
+        p95: 0,
+        timer: null,
+    },
+    // 延迟探针：解码画面左上角的时间条码，回报给服务端计算捕获到显示延迟
+    latencyProbe: {
+        enabled: false,
+        block: 16,
+        blocks: 42,
+        canvas: null,
+        ctx: null,
+        lastValue: null,
+        samples: { webrtc: [], mjpeg: [] },
+        stats: {},
+        rafId: null,
+        timer: null,
     },
     webrtcStats: {
         bitrateMbps: 0,
@@ -108,12 +142,86 @@ function startMJPEG() {
     }
     if (screenImg) {
         screenImg.classList.remove('hidden');
-        screenImg.src = '/video?' + Date.now();
+        // 带上 sid，MJPEG 使用本会话的画质/帧率设置
+        const sid = state.socket && state.socket.id ? state.socket.id : '';
+        screenImg.src = '/video?sid=' + encodeURIComponent(sid) + '&t=' + Date.now();
     }
     state.webrtc.using = false;
 }
 
+// WebRTC DataChannel 输入通道：运动/摇杆走无序不重传通道，按键边沿走可靠通道
+function openInputChannels(pc) {
+    state.webrtc.inputUnreliable = pc.createDataChannel('input-unreliable', { ordered: false, maxRetransmits: 0 });
+    state.webrtc.inputReliable = pc.createDataChannel('input-reliable', { ordered: true });
+    state.webrtc.inputSeq = 0;
+    state.webrtc.lastXinputButtons = -1;
+    state.webrtc.lastGamepadKeys = -1;
+    [state.webrtc.inputUnreliable, state.webrtc.inputReliable].forEach((channel) => {
+        channel.onmessage = (e) => {
+            try {
+                const msg = JSON.parse(e.data);
+                if (msg[0] === 'input_pong') handleInputPong(msg[1], 'datachannel');
+            } catch (err) {
+            }
+        };
+    });
+}
+
+function closeInputChannels() {
+    [state.webrtc.inputUnreliable, state.webrtc.inputReliable].forEach((channel) => {
+        if (!channel) return;
+        try {
+            channel.close();
+        } catch (e) {
+        }
+    });
+    state.webrtc.inputUnreliable = null;
+    state.webrtc.inputReliable = null;
+}
+
+const INPUT_CHANNEL_UNRELIABLE_EVENTS = new Set(['mouse_move', 'mouse_move_relative']);
+const INPUT_CHANNEL_RELIABLE_EVENTS = new Set(['mouse_click', 'mouse_scroll', 'key_event', 'type_text', 'gamepad_input']);
+
+// 虚拟摇杆方向对应的 WASD 按下状态（位掩码），死区与服务端 _inject_gamepad 一致
+const GAMEPAD_STICK_DEADZONE = 0.3;
+
+function gamepadMovementKeys(data) {
+    const x = data.x || 0;
+    const y = data.y || 0;
+    return (y < -GAMEPAD_STICK_DEADZONE ? 1 : 0) | (y > GAMEPAD_STICK_DEADZONE ? 2 : 0) |
+        (x < -GAMEPAD_STICK_DEADZONE ? 4 : 0) | (x > GAMEPAD_STICK_DEADZONE ? 8 : 0);
+}
+
+// 选择 DataChannel，不可用时返回 null（回退到 Socket.IO）
+function pickInputChannel(event, data) {
+    let channel = null;
+    if (event === 'xinput_state') {
+        // 按钮变化的报告必须可靠送达，纯摇杆变化走无序通道
+        const buttons = data ? data.buttons : 0;
+        channel = buttons !== state.webrtc.lastXinputButtons ?
+            state.webrtc.inputReliable : state.webrtc.inputUnreliable;
+        if (channel && channel.readyState === 'open') {
+            state.webrtc.lastXinputButtons = buttons;
+        }
+    } else if (event === 'gamepad_input' && data && data.type === 'movement') {
+        // 改变按下状态的方向（含松开回中）必须可靠送达，否则丢包会让按键一直按住
+        const keys = gamepadMovementKeys(data);
+        channel = keys !== state.webrtc.lastGamepadKeys ?
+            state.webrtc.inputReliable : state.webrtc.inputUnreliable;
+        if (channel && channel.readyState === 'open') {
+            state.webrtc.lastGamepadKeys = keys;
+        }
+    } else if (INPUT_CHANNEL_UNRELIABLE_EVENTS.has(event)) {
+        channel = state.webrtc.inputUnreliable;
+    } else if (INPUT_CHANNEL_RELIABLE_EVENTS.has(event) || event === 'input_ping') {
+        channel = state.webrtc.inputReliable;
+    }
+    if (!channel || channel.readyState !== 'open') return null;
+    return channel;
+}
+
 function stopWebRTC() {
+    closeInputChannels();
     if (state.webrtcStats.timer) {
         clearInterval(state.webrtcStats.timer);
         state.webrtcStats.timer = null;
@@ -197,8 +305,17 @@ async function startWebRTC() {
 
     const pc = new RTCPeerConnection({ iceServers: [] });
     state.webrtc.pc = pc;
+    state.webrtc.offerAt = performance.now();
+    state.webrtc.firstFrameReported = false;
 
     pc.addTransceiver('video', { direction: 'recvonly' });
+    openInputChannels(pc);
+
+    // trickle ICE：候选一产生就发给服务端，不等待收集完成
+    pc.onicecandidate = (e) => {
+        if (state.webrtc.pc !== pc) return;
+        emit('webrtc_ice_candidate', e.candidate ? e.candidate.toJSON() : { candidate: '' });
+    };
 
     pc.ontrack = (e) => {
         if (e.streams && e.streams[0]) {
@@ -208,6 +325,7 @@ async function startWebRTC() {
             state.webrtc.using = true;
             startVideoFrameMonitor();
             startWebRTCStats();
+            reportFirstVideoFrame(videoEl);
         }
     };
 
@@ -223,12 +341,33 @@ async function startWebRTC() {
     await pc.setLocalDescription(offer);
     emit('webrtc_offer', { sdp: offer.sdp, type: offer.type });
 
-    const answer = await socketOnce('webrtc_answer', 12000);
+    const answer = await socketOnce('webrtc_answer', 5000);
     if (!answer || !answer.sdp) throw new Error('bad_answer');
     await pc.setRemoteDescription(answer);
     return true;
 }
 
+// 记录 连接 -> 首帧 耗时并上报服务端
+function reportFirstVideoFrame(videoEl) {
+    const pc = state.webrtc.pc;
+    const onFirstFrame = () => {
+        if (state.webrtc.pc !== pc || state.webrtc.firstFrameReported) return;
+        state.webrtc.firstFrameReported = true;
+        const now = performance.now();
+        const result = {
+            connect_to_first_frame_ms: state.webrtc.connectAt ? Math.round(now - state.webrtc.connectAt) : null,
+            offer_to_first_frame_ms: Math.round(now - state.webrtc.offerAt),
+        };
+        debugLog('[WebRTC] 首帧耗时:', result);
+        emit('webrtc_first_frame', result);
+    };
+    if (typeof videoEl.requestVideoFrameCallback === 'function') {
+        videoEl.requestVideoFrameCallback(onFirstFrame);
+    } else {
+        videoEl.addEventListener('playing', onFirstFrame, { once: true });
+    }
+}
+
 async function startVideoTransport() {
     try {
         await startWebRTC();
@@ -243,16 +382,20 @@ function initSocket() {
     statusEl.textContent = '连接中...';
     statusEl.className = 'connecting';
 
+    // 页面地址带 ?token= 时作为管理员令牌随握手发送（服务端设置了 RC_ADMIN_TOKEN 时用于全局开关）
+    const adminToken = new URLSearchParams(location.search).get('token');
     state.socket = io({
         transports: ['websocket', 'polling'],
         reconnection: true,
         reconnectionAttempts: 10,
         reconnectionDelay: 1000,
+        auth: adminToken ? { token: adminToken } : {},
     });
 
     state.socket.on('connect', () => {
         debugLog('[Socket] 已连接');
         state.connected = true;
+        state.webrtc.connectAt = performance.now();
         statusEl.textContent = '已连接';
         statusEl.className = 'connected';
         if (state.currentMode === 'controller' &&
@@ -265,6 +408,9 @@ function initSocket() {
     state.socket.on('disconnect', () => {
         debugLog('[Socket] 已断开');
         state.connected = false;
+        state.inputProtocol = 0;
+        stopClockSync();
+        stopLatencyProbe();
         if (state.physicalGamepad) {
             state.physicalGamepad.serverAttached = false;
             state.physicalGamepad.connected = false;
@@ -283,6 +429,7 @@ function initSocket() {
     state.socket.on('connected', (data) => {
         state.screenWidth = data.screen_width;
         state.screenHeight = data.screen_height;
+        state.inputProtocol = data.input_protocol || 0;
         debugLog('[Socket] 屏幕尺寸:', state.screenWidth, 'x', state.screenHeight);
 
         // 初始化虚拟鼠标位置为屏幕中心
@@ -290,8 +437,8 @@ function initSocket() {
             state.virtualMouse = { x: state.screenWidth / 2, y: state.screenHeight / 2 };
         }
 
-        // 开始同步鼠标位置
-        startMouseSync();
+        // 鼠标位置由服务端在变化时推送（mouse_pos），无需轮询
+        startClockSync();
 
         const qualitySlider = document.getElementById('quality-slider');
         if (qualitySlider) {
@@ -309,7 +456,19 @@ function initSocket() {
         startVideoTransport();
     });
 
-    // 监听服务端返回的鼠标位置
+    // 分辨率或显示器布局变化时服务端推送新的几何信息
+    state.socket.on('display_changed', (data) => {
+        state.screenWidth = data.screen_width;
+        state.screenHeight = data.screen_height;
+        debugLog('[Socket] 屏幕尺寸变化:', state.screenWidth, 'x', state.screenHeight);
+        if (state.virtualMouse) {
+            state.virtualMouse.x = Math.max(0, Math.min(state.virtualMouse.x, state.screenWidth));
+            state.virtualMouse.y = Math.max(0, Math.min(state.virtualMouse.y, state.screenHeight));
+            updateVirtualCursorDisplay();
+        }
+    });
+
+    // 监听服务端推送的鼠标位置（仅在位置变化时发送）
     state.socket.on('mouse_pos', (data) => {
         if (!state.virtualMouse) return;
 
@@ -333,24 +492,204 @@ function initSocket() {
     state.socket.on('webrtc_error', () => {
         startMJPEG();
     });
+
+    state.socket.on('input_pong', (data) => {
+        handleInputPong(data, 'socketio');
+    });
+
+    state.socket.on('clock_sync', handleClockSync);
+
+    state.socket.on('latency_probe_state', handleLatencyProbeState);
+
+    state.socket.on('latency_probe_stats', (data) => {
+        state.latencyProbe.stats = data || {};
+    });
+
+    state.socket.on('input_latency', (data) => {
+        // 覆盖层显示指针移动的端到端延迟，没有样本时取任一事件类型
+        const entry = (data && (data.mouse_move_relative || data.mouse_move)) ||
+            Object.values(data || {}).find((v) => v.total_ms);
+        const total = entry && entry.total_ms;
+        state.inputLatency.p50 = total ? total.p50 : 0;
+        state.inputLatency.p95 = total ? total.p95 : 0;
+    });
+
+    state.socket.on('webrtc_ice_candidate', (data) => {
+        const pc = state.webrtc.pc;
+        if (!pc || !data) return;
+        pc.addIceCandidate(data.candidate ? data : null).catch(() => {});
+    });
+}
+
+// ============ 时钟同步与输入延迟 ============
+// 单调时钟（performance.now 基于固定的 timeOrigin），换算到服务端 time.time() 毫秒
+function clientNow() {
+    return performance.timeOrigin + performance.now();
 }
 
-// 定期同步鼠标位置（每50ms）
-let mouseSyncInterval = null;
+function serverNow() {
+    return state.clock.synced ? clientNow() + state.clock.offset : 0;
+}
+
+const CLOCK_SYNC_WINDOW = 8;
+
+function handleClockSync(data) {
+    if (!data || typeof data.t0 !== 'number') return;
+    const t1 = clientNow();
+    const rtt = t1 - data.t0;
+    state.clock.samples.push({ rtt: rtt, offset: data.ts - (data.t0 + t1) / 2 });
+    if (state.clock.samples.length > CLOCK_SYNC_WINDOW) state.clock.samples.shift();
+    // 取最近窗口内往返时间最短的样本，排队延迟对它的影响最小
+    const best = state.clock.samples.reduce((a, b) => (b.rtt < a.rtt ? b : a));
+    state.clock.offset = best.offset;
+    state.clock.synced = true;
+}
+
+function startClockSync() {
+    if (state.clock.timer) return;
+    state.clock.samples = [];
+    const ping = () => {
+        if (state.connected && state.socket) state.socket.emit('clock_sync', { t0: clientNow() });
+    };
+    // 连接后先密集采样，之后每 10 秒一次跟踪漂移
+    for (let i = 0; i < CLOCK_SYNC_WINDOW; i++) setTimeout(ping, i * 50);
+    state.clock.timer = setInterval(ping, 10000);
+    state.inputLatency.timer = setInterval(() => {
+        if (state.connected && state.socket) state.socket.emit('get_input_latency');
+    }, 2000);
+}
+
+function stopClockSync() {
+    if (state.clock.timer) {
+        clearInterval(state.clock.timer);
+        state.clock.timer = null;
+    }
+    if (state.inputLatency.timer) {
+        clearInterval(state.inputLatency.timer);
+        state.inputLatency.timer = null;
+    }
+    state.clock.synced = false;
+}
+
+// ============ 延迟探针 ============
+// 条码格式与 frame_marker.py 一致：[白][黑] 参考块 + 32 位时间值（高位在前）+ 8 位校验（四字节异或）。
+// 每个动画帧把条码区域绘制到小画布上逐块取样，值变化时记下显示时刻（服务端时钟），
+// 显示时刻取动画帧回调时间，误差不超过一个刷新周期。
+const PROBE_SAMPLE_PX = 4;     // 解码画布上每个方块的边长
+const PROBE_DATA_BITS = 32;
+const PROBE_CHECK_BITS = 8;
+const PROBE_REPORT_INTERVAL = 500;
+
+function probeChecksum(value) {
+    return (value ^ (value >>> 8) ^ (value >>> 16) ^ (value >>> 24)) & 0xFF;
+}
+
+function decodeProbeMarker(el) {
+    const probe = state.latencyProbe;
+    const sourceWidth = el.videoWidth || el.naturalWidth;
+    if (!sourceWidth || !state.screenWidth) return null;
+    // 缩放推流时条码随画面缩放（0.5x -> 方块边长减半）
+    const block = probe.block * sourceWidth / state.screenWidth;
+    if (block < 2) return null;
+    const width = probe.blocks * PROBE_SAMPLE_PX;
+    if (!probe.canvas) {
+        probe.canvas = document.createElement('canvas');
+        probe.canvas.width = width;
+        probe.canvas.height = PROBE_SAMPLE_PX;
+        probe.ctx = probe.canvas.getContext('2d', { willReadFrequently: true });
+    }
+    try {
+        probe.ctx.drawImage(el, 0, 0, probe.blocks * block, block, 0, 0, width, PROBE_SAMPLE_PX);
+    } catch (e) {
+        return null;
+    }
+    const pixels = probe.ctx.getImageData(0, 0, width, PROBE_SAMPLE_PX).data;
+    const row = (PROBE_SAMPLE_PX >> 1) * width;
+    const levels = [];
+    for (let i = 0; i < probe.blocks; i++) {
+        const idx = (row + i * PROBE_SAMPLE_PX + (PROBE_SAMPLE_PX >> 1)) * 4;
+        levels.push((pixels[idx] + pixels[idx + 1] + pixels[idx + 2]) / 3);
+    }
+    const white = levels[0];
+    const black = levels[1];
+    if (white - black < 64) return null;
+    const threshold = (white + black) / 2;
+    let value = 0;
+    for (let i = 0; i < PROBE_DATA_BITS; i++) {
+        value = ((value << 1) | (levels[2 + i] > threshold ? 1 : 0)) >>> 0;
+    }
+    let check = 0;
+    for (let i = 0; i < PROBE_CHECK_BITS; i++) {
+        check = (check << 1) | (levels[2 + PROBE_DATA_BITS + i] > threshold ? 1 : 0);
+    }
+    return check === probeChecksum(value) ? value : null;
+}
 
-function startMouseSync() {
-    if (mouseSyncInterval) return;
-    mouseSyncInterval = setInterval(() => {
-        if (state.connected && !state.isTouching) {
-            emit('get_mouse_pos');
+function probeTick() {
+    const probe = state.latencyProbe;
+    if (!probe.enabled) {
+        probe.rafId = null;
+        return;
+    }
+    const el = getScreenElement();
+    const value = el ? decodeProbeMarker(el) : null;
+    if (value !== null && value !== probe.lastValue) {
+        probe.lastValue = value;
+        if (state.clock.synced) {
+            probe.samples[state.webrtc.using ? 'webrtc' : 'mjpeg'].push([value, serverNow()]);
         }
-    }, 50);
+    }
+    probe.rafId = requestAnimationFrame(probeTick);
+}
+
+function reportLatencyProbe() {
+    const probe = state.latencyProbe;
+    if (!state.connected || !state.socket) return;
+    for (const transport of Object.keys(probe.samples)) {
+        const samples = probe.samples[transport];
+        if (!samples.length) continue;
+        probe.samples[transport] = [];
+        state.socket.emit('latency_probe', { transport: transport, samples: samples });
+    }
+}
+
+function startLatencyProbe() {
+    const probe = state.latencyProbe;
+    if (probe.rafId === null) probe.rafId = requestAnimationFrame(probeTick);
+    if (!probe.timer) probe.timer = setInterval(reportLatencyProbe, PROBE_REPORT_INTERVAL);
+}
+
+function stopLatencyProbe() {
+    const probe = state.latencyProbe;
+    if (probe.rafId !== null) {
+        cancelAnimationFrame(probe.rafId);
+        probe.rafId = null;
+    }
+    if (probe.timer) {
+        clearInterval(probe.timer);
+        probe.timer = null;
+    }
+    probe.lastValue = null;
+    probe.samples = { webrtc: [], mjpeg: [] };
 }
 
-function stopMouseSync() {
-    if (mouseSyncInterval) {
-        clearInterval(mouseSyncInterval);
-        mouseSyncInterval = null;
+function handleLatencyProbeState(data) {
+    const probe = state.latencyProbe;
+    probe.enabled = !!(data && data.enabled);
+    if (data && data.block) probe.block = data.block;
+    if (data && data.blocks) probe.blocks = data.blocks;
+    const checkbox = document.getElementById('latency-probe');
+    if (checkbox) {
+        checkbox.checked = probe.enabled;
+        // 只有管理员会话可以开关（连接时下发 admin）
+        if (data && 'admin' in data) checkbox.disabled = !data.admin;
+    }
+    if (data && data.error === 'forbidden') debugLog('[探针] 无权限开关延迟探针');
+    if (probe.enabled) {
+        startLatencyProbe();
+    } else {
+        stopLatencyProbe();
+        probe.stats = {};
     }
 }
 
@@ -1437,6 +1776,25 @@ function initKeyboardMode() {
         }, { passive: false });
     });
 
+    // 整段文本输入（可粘贴），服务端一次性以 Unicode 事件注入
+    const textInput = document.getElementById('kb-text-input');
+    const textSend = document.getElementById('kb-text-send');
+    if (textInput && textSend) {
+        const sendText = () => {
+            const text = textInput.value;
+            if (!text) return;
+            emit('type_text', { text });
+            textInput.value = '';
+        };
+        textSend.addEventListener('click', sendText);
+        textInput.addEventListener('keydown', (e) => {
+            if (e.key === 'Enter') {
+                e.preventDefault();
+                sendText();
+            }
+        });
+    }
+
     // 防止键盘区域的默认触摸行为
     const keyboardControls = document.getElementById('keyboard-controls');
     if (keyboardControls) {
@@ -1606,6 +1964,14 @@ function initSettings() {
         }
     }
 
+    // 延迟探针（服务端全局开关，状态由 latency_probe_state 回推）
+    const latencyProbeCheckbox = document.getElementById('latency-probe');
+    if (latencyProbeCheckbox) {
+        latencyProbeCheckbox.addEventListener('change', () => {
+            if (state.socket) state.socket.emit('set_latency_probe', { enabled: latencyProbeCheckbox.checked });
+        });
+    }
+
     // 低延迟模式
     const lowLatencyCheckbox = document.getElementById('low-latency-mode');
     if (lowLatencyCheckbox) {
@@ -1673,13 +2039,174 @@ function initSettings() {
     });
 }
 
+// ============ 二进制输入批量协议 ============
+// 指针类事件编码为定长记录（格式见 src/remote_control/input_protocol.py），
+// 每个动画帧合并为一帧发送；点击立即发送，按键等 JSON 事件发送前先清空批次以保持顺序
+const INPUT_PROTOCOL_VERSION = 2;
+const INPUT_HEADER_SIZE = 8;
+const INPUT_RECORD_SIZE = 20;
+const INPUT_BATCH_CAPACITY = 128;
+const INPUT_RECORD_TYPES = { mouse_move_relative: 1, mouse_move: 2, mouse_click: 3, mouse_scroll: 4 };
+const INPUT_CLICK_BUTTONS = { left: 0, right: 1, middle: 2 };
+const inputBatch = {
+    buffer: new ArrayBuffer(INPUT_HEADER_SIZE + INPUT_RECORD_SIZE * INPUT_BATCH_CAPACITY),
+    view: null,
+    count: 0,
+    hasEdge: false,
+    scheduled: false,
+};
+inputBatch.view = new DataView(inputBatch.buffer);
+
+function queueInputRecord(event, data) {
+    if (inputBatch.count >= INPUT_BATCH_CAPACITY) flushInputBatch();
+    const view = inputBatch.view;
+    const offset = INPUT_HEADER_SIZE + inputBatch.count * INPUT_RECORD_SIZE;
+    let flags = 0;
+    let a = 0;
+    let b = 0;
+    if (event === 'mouse_move_relative') {
+        a = data.dx;
+        b = data.dy;
+        if (data.raw !== undefined && data.raw !== null) flags = 0x01 | (data.raw ? 0x02 : 0);
+    } else if (event === 'mouse_move') {
+        a = data.x;
+        b = data.y;
+    } else if (event === 'mouse_click') {
+        flags = (INPUT_CLICK_BUTTONS[data.button] || 0) | (data.action === 'down' ? 0x80 : 0);
+        inputBatch.hasEdge = true;
+    } else {
+        a = data.dx;
+        b = data.dy;
+        inputBatch.hasEdge = true;
+    }
+    view.setUint8(offset, INPUT_RECORD_TYPES[event]);
+    view.setUint8(offset + 1, flags);
+    view.setUint16(offset + 2, 0, true);
+    view.setFloat32(offset + 4, a || 0, true);
+    view.setFloat32(offset + 8, b || 0, true);
+    view.setFloat64(offset + 12, serverNow(), true);
+    inputBatch.count++;
+
+    if (event === 'mouse_click') {
+        flushInputBatch();
+    } else if (!inputBatch.scheduled) {
+        inputBatch.scheduled = true;
+        requestAnimationFrame(flushInputBatch);
+    }
+}
+
+function flushInputBatch() {
+    inputBatch.scheduled = false;
+    if (!inputBatch.count) return;
+    const view = inputBatch.view;
+    view.setUint8(0, INPUT_PROTOCOL_VERSION);
+    view.setUint8(1, 0);
+    view.setUint16(2, inputBatch.count, true);
+    // 与 DataChannel JSON 消息共用序号，服务端据此丢弃无序通道上迟到的绝对移动
+    view.setUint32(4, state.webrtc.inputSeq++, true);
+    const frame = inputBatch.buffer.slice(0, INPUT_HEADER_SIZE + inputBatch.count * INPUT_RECORD_SIZE);
+    // 含点击/滚轮的批次走可靠通道，纯移动走无序通道
+    const channel = inputBatch.hasEdge ? state.webrtc.inputReliable : state.webrtc.inputUnreliable;
+    inputBatch.count = 0;
+    inputBatch.hasEdge = false;
+    if (channel && channel.readyState === 'open') {
+        try {
+            channel.send(frame);
+            return;
+        } catch (e) {
+        }
+    }
+    if (state.connected && state.socket) {
+        state.socket.emit('input_batch', frame);
+    }
+}
+
 // ============ 辅助函数 ============
+// 附带客户端时间戳 _t 的输入事件（服务端按事件类型统计注入延迟）
+const INPUT_TIMED_EVENTS = new Set(['mouse_move', 'mouse_move_relative', 'mouse_click', 'mouse_scroll', 'key_event', 'type_text', 'gamepad_input']);
+
 function emit(event, data) {
+    if (state.inputProtocol === INPUT_PROTOCOL_VERSION && INPUT_RECORD_TYPES[event]) {
+        queueInputRecord(event, data);
+        return;
+    }
+    flushInputBatch();
+    if (data && state.clock.synced && INPUT_TIMED_EVENTS.has(event)) {
+        data._t = serverNow();
+    }
+    const channel = pickInputChannel(event, data);
+    if (channel) {
+        try {
+            channel.send(JSON.stringify([event, data, state.webrtc.inputSeq++]));
+            return;
+        } catch (e) {
+        }
+    }
     if (state.connected && state.socket) {
         state.socket.emit(event, data);
     }
 }
 
+// ============ 输入通道延迟对比 ============
+// 在控制台调用 compareInputLatency() 分别测量 Socket.IO 与 DataChannel 的往返时延
+const inputPingWaiters = new Map();
+let inputPingId = 0;
+
+function handleInputPong(data, transport) {
+    if (!data) return;
+    const waiter = inputPingWaiters.get(transport + ':' + data.id);
+    if (!waiter) return;
+    inputPingWaiters.delete(transport + ':' + data.id);
+    waiter(performance.now() - data.t);
+}
+
+function pingInput(transport, timeoutMs = 1000) {
+    return new Promise((resolve) => {
+        const id = ++inputPingId;
+        const payload = { id: id, t: performance.now() };
+        const timer = setTimeout(() => {
+            inputPingWaiters.delete(transport + ':' + id);
+            resolve(null);
+        }, timeoutMs);
+        inputPingWaiters.set(transport + ':' + id, (rtt) => {
+            clearTimeout(timer);
+            resolve(rtt);
+        });
+        if (transport === 'datachannel') {
+            const channel = pickInputChannel('input_ping', payload);
+            if (!channel) {
+                clearTimeout(timer);
+                inputPingWaiters.delete(transport + ':' + id);
+                resolve(null);
+                return;
+            }
+            channel.send(JSON.stringify(['input_ping', payload]));
+        } else if (state.socket) {
+            state.socket.emit('input_ping', payload);
+        }
+    });
+}
+
+async function compareInputLatency(count = 100, intervalMs = 20) {
+    const summarize = (samples) => {
+        const ok = samples.filter((v) => v !== null).sort((a, b) => a - b);
+        const pick = (q) => ok.length ? ok[Math.min(ok.length - 1, Math.floor(q * ok.length))].toFixed(1) : '-';
+        return { sent: samples.length, received: ok.length, p50: pick(0.5), p95: pick(0.95), max: pick(1) };
+    };
+    const result = {};
+    for (const transport of ['socketio', 'datachannel']) {
+        const samples = [];
+        for (let i = 0; i < count; i++) {
+            samples.push(await pingInput(transport));
+            await new Promise((r) => setTimeout(r, intervalMs));
+        }
+        result[transport] = summarize(samples);
+    }
+    console.table(result);
+    return result;
+}
+window.compareInputLatency = compareInputLatency;
+
 // FPS 计算
 function updateFPS() {
     state.frameCount++;
@@ -1697,6 +2224,16 @@ function updateFPS() {
             } else {
                 fpsEl.textContent = displayFps + ' FPS';
             }
+            if (state.inputLatency.p50) {
+                fpsEl.textContent += ' 输入 ' + state.inputLatency.p50.toFixed(0) + '/' +
+                    state.inputLatency.p95.toFixed(0) + 'ms';
+            }
+            const probeStats = state.latencyProbe.enabled &&
+                state.latencyProbe.stats[state.webrtc.using ? 'webrtc' : 'mjpeg'];
+            if (probeStats) {
+                fpsEl.textContent += ' 画面 ' + probeStats.p50.toFixed(0) + '/' +
+                    probeStats.p95.toFixed(0) + 'ms';
+            }
         }
         state.frameCount = 0;
         state.lastFpsUpdate = now;
@@ -0,0 +1,449 @@
+#!/usr/bin/env python3
+"""
+推流管线基准（可在无显示的 Linux 上运行）
+用合成画面逐阶段单独计时，并测量 MJPEG / WebRTC 两条端到端链路：
+
+    capture_rgb   mss BGRA 缓冲 -> RGB24（与 capture_screen_rgb_np 的 mss 路径相同）
+    scale         按 WebRTC 默认缩放抽取（frame_cache.derive_frame）
+    jpeg          PIL JPEG 编码（generate_video_stream 的参数：画质 60，无 optimize / progressive）
+    yuv           RGB24 -> yuv420p（ScreenVideoTrack 的转换）
+    h264          aiortc H264Encoder 编码 + 分包
+    rtp_srtp      RTP 序列化 + SRTP 加密（pylibsrtp，AES128_CM_SHA1_80）
+    mjpeg_e2e     capture_rgb -> jpeg
+    webrtc_e2e    capture_rgb -> scale -> yuv -> h264 -> rtp_srtp
+
+场景为 分辨率 x 画面类型（static / text / gradient / video）x 线程数，每个线程独立的输入与编码器，
+多线程场景反映 GIL 与多核下的聚合吞吐。
+
+比较用的耗时 cost_ms：单线程为 p50；多线程为按聚合吞吐折算的每帧耗时（1000 / 帧率）。
+多线程的单帧延迟主要取决于 GIL 在帧中间是否切换线程，短阶段上呈双峰分布，不能反映代码快慢。
+每个场景重复 3 轮取 cost_ms 居中的一轮（最低值会让基线偏乐观）。
+结果以 JSON 输出，可与保存的基线比较：
+cost_ms 比基线慢超过阈值（默认 25%，且绝对差值超过 1.5ms）的场景重新测量，重测仍超过阈值才视为回归，退出码为 1。
+帧数、轮数等配置与基线不同时拒绝比较，退出码为 2（两者的结果没有可比性）；--quick 不与基线比较。
+
+用法:
+    python tools/bench/pipeline_bench.py                          # 默认矩阵，与 tools/bench/baseline.json 比较
+    python tools/bench/pipeline_bench.py --quick
+    python tools/bench/pipeline_bench.py --stages h264,webrtc_e2e --resolutions 1920x1080 --threads 1,4
+    python tools/bench/pipeline_bench.py --runs 3 --save-baseline tools/bench/baseline.json   # 基线取 3 次完整运行的中位
+"""
+
+import argparse
+import datetime
+import io
+import json
+import os
+import platform
+import sys
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+# Windows 部署使用仓库内的 py312 依赖；Linux 上使用系统安装的 aiortc / av
+VENDOR_DIR = os.path.join(ROOT, "vendor", "py312")
+if os.name == "nt" and os.path.isdir(VENDOR_DIR):
+    sys.path.insert(0, VENDOR_DIR)
+
+import numpy as np
+
+from remote_control.frame_cache import derive_frame
+from remote_control.sessions import DEFAULT_QUALITY, DEFAULT_WEBRTC_SCALE
+from remote_control.synthetic_source import CONTENT_TYPES, SyntheticSource
+
+DEFAULT_BASELINE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+
+STAGES = ('capture_rgb', 'scale', 'jpeg', 'yuv', 'h264', 'rtp_srtp', 'mjpeg_e2e', 'webrtc_e2e')
+DEFAULT_RESOLUTIONS = ((1280, 720), (1920, 1080))
+DEFAULT_CONTENTS = ('static', 'text', 'video')
+DEFAULT_THREADS = (1, 2)
+
+INPUT_FRAMES = 8        # 每个线程预生成的输入帧数，循环使用
+WARMUP_STEPS = 3        # 不计时的预热次数（编码器打开、首个关键帧）
+DEFAULT_STEPS = 30
+DEFAULT_REPEATS = 3
+DEFAULT_THRESHOLD = 0.25
+MIN_DELTA_MS = 1.5      # 小于此绝对差值的变化视为噪声（几毫秒的阶段在共享主机上单次运行可差 1ms 以上）
+CONFIRM_RUNS = 2        # 疑似回归的场景最多重新测量的次数，每次都超过阈值才计为回归
+COST_METRIC = 'p50@t1,wall@tN'   # cost_ms 的定义，见模块说明
+# 必须与基线一致才能比较的配置项（runs 只让中位更稳定，不影响可比性）
+COMPARABLE_CONFIG = ('steps', 'repeats', 'warmup', 'input_frames', 'jpeg_quality', 'webrtc_scale', 'cost_metric')
+
+PTS_STEP = 3000         # 90kHz 时钟下 30fps 的一帧
+RTP_PAYLOAD_TYPE = 102
+
+
+# ============ 各阶段 ============
+
+def _rgb_to_bgra(frame):
+    h, w, _ = frame.shape
+    bgra = np.empty((h, w, 4), dtype=np.uint8)
+    bgra[:, :, :3] = frame[:, :, ::-1]
+    bgra[:, :, 3] = 255
+    return bgra
+
+
+def _bgra_to_rgb(bgra):
+    return np.ascontiguousarray(bgra[:, :, [2, 1, 0]])
+
+
+def _jpeg(frame):
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.fromarray(frame).save(buffer, format='JPEG', quality=DEFAULT_QUALITY, optimize=False, progressive=False)
+    return len(buffer.getvalue())
+
+
+def _to_yuv(frame, index):
+    from av import VideoFrame
+    from aiortc.mediastreams import VIDEO_TIME_BASE
+
+    vf = VideoFrame.from_ndarray(frame, format="rgb24").reformat(format="yuv420p")
+    vf.pts = index * PTS_STEP
+    vf.time_base = VIDEO_TIME_BASE
+    return vf
+
+
+class _RtpSender:
+    """RTCRtpSender 发送路径的最小复现：组 RTP 包、序列化、SRTP 加密"""
+
+    def __init__(self):
+        from pylibsrtp import Policy, Session
+
+        policy = Policy(key=os.urandom(30), ssrc_type=Policy.SSRC_ANY_OUTBOUND,
+                        srtp_profile=Policy.SRTP_PROFILE_AES128_CM_SHA1_80)
+        self.srtp = Session(policy)
+        self.ssrc = int.from_bytes(os.urandom(4), 'big')
+        self.sequence = 0
+
+    def send(self, payloads, timestamp):
+        from aiortc.rtp import RtpPacket
+
+        sent = 0
+        for i, payload in enumerate(payloads):
+            packet = RtpPacket(payload_type=RTP_PAYLOAD_TYPE, sequence_number=self.sequence, timestamp=timestamp,
+                               ssrc=self.ssrc, marker=int(i == len(payloads) - 1), payload=payload)
+            self.sequence = (self.sequence + 1) & 0xFFFF
+            sent += len(self.srtp.protect(packet.serialize()))
+        return sent
+
+
+def _h264_encoder():
+    from aiortc.codecs.h264 import H264Encoder
+    return H264Encoder()
+
+
+def prepare_stage(stage, frames):
+    """返回 step(i) -> 产出字节数；所有输入在计时前准备好"""
+    bgra = [_rgb_to_bgra(f) for f in frames] if stage in ('capture_rgb', 'mjpeg_e2e', 'webrtc_e2e') else None
+
+    if stage == 'capture_rgb':
+        return lambda i: _bgra_to_rgb(bgra[i % len(bgra)]).nbytes
+    if stage == 'scale':
+        return lambda i: derive_frame(frames[i % len(frames)], DEFAULT_WEBRTC_SCALE).nbytes
+    if stage == 'jpeg':
+        return lambda i: _jpeg(frames[i % len(frames)])
+    if stage == 'mjpeg_e2e':
+        return lambda i: _jpeg(_bgra_to_rgb(bgra[i % len(bgra)]))
+
+    scaled = [derive_frame(f, DEFAULT_WEBRTC_SCALE) for f in frames]
+    if stage == 'yuv':
+        return lambda i: _to_yuv(scaled[i % len(scaled)], i).planes[0].buffer_size
+
+    encoder = _h264_encoder()
+    if stage == 'h264':
+        yuv = [_to_yuv(f, 0) for f in scaled]
+
+        def encode(i):
+            vf = yuv[i % len(yuv)]
+            vf.pts = i * PTS_STEP
+            payloads, _ = encoder.encode(vf)
+            return sum(len(p) for p in payloads)
+        return encode
+
+    sender = _RtpSender()
+    if stage == 'rtp_srtp':
+        encoded = [encoder.encode(_to_yuv(f, i), force_keyframe=(i == 0)) for i, f in enumerate(scaled)]
+        return lambda i: sender.send(encoded[i % len(encoded)][0], encoded[i % len(encoded)][1])
+
+    def webrtc(i):
+        frame = derive_frame(_bgra_to_rgb(bgra[i % len(bgra)]), DEFAULT_WEBRTC_SCALE)
+        payloads, timestamp = encoder.encode(_to_yuv(frame, i))
+        return sender.send(payloads, timestamp)
+    return webrtc
+
+
+# ============ 运行 ============
+
+def _percentile(samples, q):
+    return samples[min(len(samples) - 1, int(q * len(samples)))] if samples else 0.0
+
+
+def _timed_round(workers, first, steps):
+    """所有线程在屏障处同时开始，各自计时 steps 次；返回 (耗时样本, 产出字节, 墙钟秒)"""
+    threads = len(workers)
+    barrier = threading.Barrier(threads + 1)
+    latencies = [[] for _ in range(threads)]
+    produced = [0] * threads
+
+    def worker(index):
+        step = workers[index]
+        samples = latencies[index]
+        barrier.wait()
+        total = 0
+        for i in range(first, first + steps):
+            t0 = time.perf_counter()
+            total += step(i)
+            samples.append((time.perf_counter() - t0) * 1000.0)
+        produced[index] = total
+
+    pool = [threading.Thread(target=worker, args=(i,), daemon=True) for i in range(threads)]
+    for t in pool:
+        t.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for t in pool:
+        t.join()
+    return sorted(s for per_thread in latencies for s in per_thread), sum(produced), time.perf_counter() - started
+
+
+def run_case(stage, size, content, threads, steps, repeats=1):
+    """threads 个线程同时运行同一阶段，重复 repeats 轮取 cost_ms 居中的一轮（抑制宿主机抖动）"""
+    source = SyntheticSource(size[0], size[1], content)
+    inputs = [np.array(source.grab()) for _ in range(INPUT_FRAMES)]
+    workers = [prepare_stage(stage, inputs) for _ in range(threads)]
+    for step in workers:
+        for i in range(WARMUP_STEPS):
+            step(i)
+
+    rounds = []
+    for round_index in range(repeats):
+        samples, produced, wall = _timed_round(workers, WARMUP_STEPS + round_index * steps, steps)
+        result = {
+            'p50_ms': round(_percentile(samples, 0.50), 3),
+            'p95_ms': round(_percentile(samples, 0.95), 3),
+            'mean_ms': round(sum(samples) / len(samples), 3),
+            'fps': round(len(samples) / wall, 1),
+            'kb_per_frame': round(produced / len(samples) / 1024.0, 1),
+        }
+        result['cost_ms'] = result['p50_ms'] if threads == 1 else round(1000.0 / max(result['fps'], 1e-3), 3)
+        rounds.append(result)
+    rounds.sort(key=lambda r: r['cost_ms'])
+    return rounds[(len(rounds) - 1) // 2]
+
+
+def case_key(stage, size, content, threads):
+    return f"{stage}/{size[0]}x{size[1]}/{content}/t{threads}"
+
+
+def parse_case_key(key):
+    stage, size, content, threads = key.split('/')
+    return stage, _parse_sizes(size)[0], content, int(threads[1:])
+
+
+def environment():
+    info = {
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'machine': platform.machine(),
+        'cpu_count': os.cpu_count(),
+        'numpy': np.__version__,
+        'created': datetime.datetime.now().isoformat(timespec='seconds'),
+    }
+    for module in ('av', 'PIL', 'aiortc'):
+        try:
+            info[module] = __import__(module).__version__
+        except Exception:
+            info[module] = None
+    return info
+
+
+def median_runs(runs):
+    """多次完整运行的结果按场景取 cost_ms 居中的一次"""
+    merged = {}
+    for key in runs[0]:
+        results = sorted((run[key] for run in runs if key in run), key=lambda r: r['cost_ms'])
+        merged[key] = results[(len(results) - 1) // 2]
+    return merged
+
+
+def run_matrix(stages, resolutions, contents, thread_counts, steps, repeats):
+    results = {}
+    for stage in stages:
+        for size in resolutions:
+            for content in contents:
+                for threads in thread_counts:
+                    key = case_key(stage, size, content, threads)
+                    try:
+                        results[key] = run_case(stage, size, content, threads, steps, repeats)
+                    except ImportError as e:
+                        print(f"  {key:<40} 跳过（缺少依赖: {e.name}）")
+                        continue
+                    r = results[key]
+                    print(f"  {key:<40} p50 {r['p50_ms']:8.3f}ms  p95 {r['p95_ms']:8.3f}ms  "
+                          f"{r['fps']:7.1f} 帧/秒  {r['kb_per_frame']:8.1f} KB/帧")
+    return results
+
+
+# ============ 基线比较 ============
+
+def config_mismatch(config, baseline):
+    """本次配置与基线不同的项：[(名称, 基线值, 本次值)]"""
+    base_config = baseline.get('config') or {}
+    return [(name, base_config.get(name), config.get(name)) for name in COMPARABLE_CONFIG
+            if base_config.get(name) != config.get(name)]
+
+
+def compare(results, baseline, threshold=None):
+    """按 cost_ms 与基线比较；基线的 thresholds 可按阶段覆盖默认阈值。返回回归项列表"""
+    thresholds = dict(baseline.get('thresholds') or {})
+    default = threshold if threshold is not None else thresholds.get('default', DEFAULT_THRESHOLD)
+    base_results = baseline.get('results', {})
+    regressions = []
+
+    print(f"\n与基线比较（{baseline.get('environment', {}).get('created', '?')}，默认阈值 +{default:.0%}）")
+    for key, current in results.items():
+        base = base_results.get(key)
+        if base is None:
+            print(f"  {key:<40} 新增")
+            continue
+        limit = thresholds.get(key.split('/')[0], default)
+        before, after = base['cost_ms'], current['cost_ms']
+        ratio = after / before if before > 0 else 1.0
+        regressed = _regressed(before, after, limit)
+        status = '回归' if regressed else ('改善' if ratio < 1.0 - limit else '持平')
+        print(f"  {key:<40} {before:8.3f}ms -> {after:8.3f}ms  {ratio - 1.0:+7.1%}  {status}")
+        if regressed:
+            regressions.append({'case': key, 'baseline_ms': before, 'current_ms': after, 'limit': limit})
+    return regressions
+
+
+def _regressed(before, after, limit):
+    return after > before * (1.0 + limit) and after - before > MIN_DELTA_MS
+
+
+def confirm_regressions(regressions, steps, repeats):
+    """重新测量疑似回归的场景，只保留每次重测都超过阈值的
+
+    共享主机上的瞬时抖动常让个别场景慢 2~3 倍，且每次运行落在不同场景上，单次测量不足以判定回归
+    """
+    if regressions:
+        print(f"\n重新测量 {len(regressions)} 个疑似回归的场景（最多 {CONFIRM_RUNS} 次）")
+    confirmed = []
+    for item in regressions:
+        stage, size, content, threads = parse_case_key(item['case'])
+        retries = []
+        for _ in range(CONFIRM_RUNS):
+            retries.append(run_case(stage, size, content, threads, steps, repeats)['cost_ms'])
+            if not _regressed(item['baseline_ms'], retries[-1], item['limit']):
+                break
+        still = _regressed(item['baseline_ms'], retries[-1], item['limit'])
+        print(f"  {item['case']:<40} {item['baseline_ms']:8.3f}ms -> 重测 "
+              f"{', '.join(f'{v:.3f}ms' for v in retries)}  {'回归' if still else '抖动'}")
+        if still:
+            confirmed.append(dict(item, retries_ms=retries))
+    return confirmed
+
+
+def _parse_sizes(text):
+    return tuple(tuple(int(v) for v in item.lower().split('x')) for item in text.split(',') if item)
+
+
+def _parse_list(text, allowed=None):
+    items = tuple(item.strip() for item in text.split(',') if item.strip())
+    for item in items:
+        if allowed is not None and item not in allowed:
+            raise argparse.ArgumentTypeError(f"未知取值 {item}（可选 {', '.join(allowed)}）")
+    return items
+
+
+def main():
+    parser = argparse.ArgumentParser(description="推流管线基准")
+    parser.add_argument('--stages', type=lambda s: _parse_list(s, STAGES), default=STAGES)
+    parser.add_argument('--resolutions', type=_parse_sizes, default=DEFAULT_RESOLUTIONS)
+    parser.add_argument('--content', type=lambda s: _parse_list(s, CONTENT_TYPES), default=DEFAULT_CONTENTS)
+    parser.add_argument('--threads', type=lambda s: tuple(int(v) for v in _parse_list(s)), default=DEFAULT_THREADS)
+    parser.add_argument('--steps', type=int, default=DEFAULT_STEPS, help="每个线程计时的帧数")
+    parser.add_argument('--repeat', type=int, default=DEFAULT_REPEATS, help="每个场景重复轮数，取 cost_ms 居中的一轮")
+    parser.add_argument('--runs', type=int, default=1,
+                        help="整个矩阵重复运行次数，每个场景取 cost_ms 居中的一次（保存基线时建议 3）")
+    parser.add_argument('--quick', action='store_true', help="720p、单线程、15 帧、一轮（配置与基线不同，不与基线比较）")
+    parser.add_argument('--output', help="结果 JSON 写入路径（默认只打印）")
+    parser.add_argument('--baseline', default=DEFAULT_BASELINE, help="基线 JSON 路径")
+    parser.add_argument('--threshold', type=float, help="覆盖基线中的默认回归阈值（0.25 = 慢 25%%）")
+    parser.add_argument('--no-compare', action='store_true', help="不与基线比较")
+    parser.add_argument('--save-baseline', metavar='PATH', help="把本次结果保存为基线")
+    args = parser.parse_args()
+
+    if args.quick:
+        args.resolutions, args.threads, args.steps, args.repeat = ((1280, 720),), (1,), 15, 1
+        args.no_compare = True
+    try:
+        # aiortc 导入时会恢复 libav 默认日志回调，须在其后设置级别以屏蔽 libx264 关闭编码器时的统计输出
+        import aiortc  # noqa: F401
+        import av.logging
+        av.logging.set_level(av.logging.ERROR)
+    except ImportError:
+        pass
+
+    print("=" * 100)
+    print(f"推流管线基准：{len(args.stages)} 个阶段 x {len(args.resolutions)} 个分辨率 x "
+          f"{len(args.content)} 种画面 x 线程 {','.join(map(str, args.threads))}，每线程 {args.steps} 帧 x {args.repeat} 轮")
+    print("=" * 100)
+    report = {
+        'environment': environment(),
+        'config': {'steps': args.steps, 'repeats': args.repeat, 'warmup': WARMUP_STEPS, 'input_frames': INPUT_FRAMES,
+                   'jpeg_quality': DEFAULT_QUALITY, 'webrtc_scale': DEFAULT_WEBRTC_SCALE, 'cost_metric': COST_METRIC,
+                   'runs': args.runs},
+    }
+    runs = []
+    for run_index in range(max(1, args.runs)):
+        if args.runs > 1:
+            print(f"\n第 {run_index + 1}/{args.runs} 次运行")
+        runs.append(run_matrix(args.stages, args.resolutions, args.content, args.threads, args.steps, args.repeat))
+    report['results'] = median_runs(runs)
+
+    regressions = []
+    mismatch = None
+    if not args.no_compare and not args.save_baseline:
+        if os.path.exists(args.baseline):
+            with open(args.baseline, 'r', encoding='utf-8') as f:
+                baseline = json.load(f)
+            mismatch = config_mismatch(report['config'], baseline)
+            if mismatch:
+                print(f"\n[✗] 配置与基线 {args.baseline} 不同，无法比较：")
+                for name, before, after in mismatch:
+                    print(f"    {name}: 基线 {before}，本次 {after}")
+            else:
+                regressions = compare(report['results'], baseline, args.threshold)
+                regressions = confirm_regressions(regressions, args.steps, args.repeat)
+                report['regressions'] = regressions
+        else:
+            print(f"\n[!] 未找到基线 {args.baseline}，跳过比较")
+
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.output}")
+    if args.save_baseline:
+        previous = {}
+        if os.path.exists(args.save_baseline):
+            with open(args.save_baseline, 'r', encoding='utf-8') as f:
+                previous = json.load(f)
+        report['thresholds'] = previous.get('thresholds') or {'default': DEFAULT_THRESHOLD}
+        with open(args.save_baseline, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n基线已保存到 {args.save_baseline}")
+
+    print("=" * 100)
+    if regressions:
+        print(f"[✗] {len(regressions)} 项性能回归")
+        sys.exit(1)
+    if mismatch:
+        sys.exit(2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,414 @@
+#!/usr/bin/env python3
+"""
+WebRTC 端到端基准（进程内，可在无显示的 Linux 上运行）
+走真实产品路径：server_app._webrtc_handle_offer -> ScreenVideoTrack -> 编码 -> RTP -> SRTP，
+接收端是同一进程内的 aiortc peer（独立事件循环），两者经本机 UDP 连接。
+
+- 捕获来源为合成画面（RC_CAPTURE_SOURCE=synthetic），每帧左上角写入捕获时刻的时间条码
+  （frame_marker.py），接收端解码后得到 捕获 -> 解码完成 的逐帧延迟
+- 服务端发出的数据包经损伤层转发：固定延迟 + 抖动、随机丢包、带宽上限（排队超过 --queue 毫秒尾部丢弃）；
+  --symmetric 时接收端发出的 RTCP 反馈经同样的损伤
+- 统计：到达帧率、帧延迟分位数、卡顿次数（帧间隔 > max(3 x 平均间隔, 平均间隔 + 150ms)）、
+  关键帧数（按 RTP 负载识别）、无法解码的条码数、进程 CPU（含接收端解码）、服务端各阶段直方图与发送码率；
+  系统安装的 aiortc 没有阶段钩子（vendor/py312 中的版本才有），此时不输出编码 / 发送阶段
+
+用法:
+    python tools/bench/webrtc_e2e.py                                  # 1280x720 gradient，无损伤，10 秒
+    python tools/bench/webrtc_e2e.py --delay 40 --jitter 10 --loss 2 --rate 4000
+    python tools/bench/webrtc_e2e.py --codec VP8 --content video --output result.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+os.environ.setdefault("RC_INPUT_BACKEND", "recording")
+os.environ["RC_CAPTURE_SOURCE"] = "synthetic"
+
+HARNESS_SID = "bench-webrtc-e2e"
+STARTUP_TIMEOUT = 15.0
+MAX_PLAUSIBLE_LATENCY_MS = 10000  # 丢包造成的花屏偶尔能通过条码校验，超过此值视为无法解码
+
+
+def _percentile(samples, q):
+    return samples[min(len(samples) - 1, int(q * len(samples)))] if samples else 0.0
+
+
+class Impairment:
+    """单向链路损伤，包装 RTCIceTransport._send（DTLS / SRTP / SCTP 都经由它发出）"""
+
+    def __init__(self, delay_ms=0.0, jitter_ms=0.0, loss=0.0, rate_kbps=0.0, queue_ms=200.0, seed=1):
+        self.delay = delay_ms / 1000.0
+        self.jitter = jitter_ms / 1000.0
+        self.loss = loss
+        self.rate_bps = rate_kbps * 1000.0
+        self.queue = queue_ms / 1000.0
+        self.rng = random.Random(seed)
+        self.packets = 0
+        self.bytes = 0
+        self.lost = 0
+        self.queue_dropped = 0
+
+    @property
+    def active(self):
+        return bool(self.delay or self.jitter or self.loss or self.rate_bps)
+
+    def install(self, ice_transport):
+        """须在该传输所属的事件循环中调用"""
+        if not self.active:
+            return
+        loop = asyncio.get_running_loop()
+        send = ice_transport._send
+        state = {'busy_until': 0.0, 'last_delivery': 0.0}
+
+        async def deliver(data):
+            try:
+                await send(data)
+            except Exception:
+                pass
+
+        async def impaired_send(data):
+            self.packets += 1
+            self.bytes += len(data)
+            if self.loss and self.rng.random() < self.loss:
+                self.lost += 1
+                return
+            now = loop.time()
+            depart = now
+            if self.rate_bps:
+                start = max(now, state['busy_until'])
+                if start - now > self.queue:
+                    self.queue_dropped += 1
+                    return
+                depart = state['busy_until'] = start + len(data) * 8 / self.rate_bps
+            arrival = depart + self.delay
+            if self.jitter:
+                arrival += self.rng.uniform(-self.jitter, self.jitter)
+            # 抖动不造成乱序：晚发的包不早于前一个包到达
+            arrival = state['last_delivery'] = max(arrival, state['last_delivery'], now)
+            if arrival <= now:
+                await deliver(data)
+            else:
+                loop.call_at(arrival, lambda: loop.create_task(deliver(data)))
+
+        ice_transport._send = impaired_send
+
+    def stats(self):
+        return {'packets': self.packets, 'bytes': self.bytes, 'lost': self.lost, 'queue_dropped': self.queue_dropped}
+
+
+def _ice_transports(pc):
+    transports = []
+    for transceiver in pc.getTransceivers():
+        dtls = transceiver.sender.transport
+        if dtls is not None and dtls.transport not in transports:
+            transports.append(dtls.transport)
+    if pc.sctp is not None and pc.sctp.transport.transport not in transports:
+        transports.append(pc.sctp.transport.transport)
+    return transports
+
+
+async def _outbound_stats(pc):
+    sent = {'bytesSent': 0, 'packetsSent': 0}
+    for sender in pc.getSenders():
+        if sender.kind != 'video':
+            continue
+        for stats in (await sender.getStats()).values():
+            if getattr(stats, 'type', '') == 'outbound-rtp':
+                sent['bytesSent'] += stats.bytesSent
+                sent['packetsSent'] += stats.packetsSent
+    return sent
+
+
+def _payload_types(sdp):
+    """answer 中 payload type -> 编码名称（小写）"""
+    types = {}
+    for line in sdp.splitlines():
+        if line.startswith('a=rtpmap:'):
+            pt, _, rest = line[len('a=rtpmap:'):].partition(' ')
+            types[int(pt)] = rest.split('/')[0].lower()
+    return types
+
+
+def _is_keyframe(codec, payload):
+    """RTP 负载是否属于关键帧：H.264 IDR（单 NAL / STAP-A / FU-A 起始分片），VP8 关键帧首分区"""
+    if not payload:
+        return False
+    if codec == 'h264':
+        nal = payload[0] & 0x1F
+        if nal == 28:
+            return len(payload) > 1 and bool(payload[1] & 0x80) and payload[1] & 0x1F == 5
+        if nal == 24:
+            offset = 1
+            while offset + 2 < len(payload):
+                size = int.from_bytes(payload[offset:offset + 2], 'big')
+                if payload[offset + 2] & 0x1F == 5:
+                    return True
+                offset += 2 + size
+            return False
+        return nal == 5
+    if codec == 'vp8':
+        from aiortc.codecs.vpx import VpxPayloadDescriptor
+
+        descriptor, rest = VpxPayloadDescriptor.parse(payload)
+        return descriptor.partition_start and descriptor.partition_id == 0 and bool(rest) and not rest[0] & 1
+    return False
+
+
+class Receiver:
+    """接收端：解码时间条码，记录到达时间、延迟与关键帧（按 RTP 负载识别）"""
+
+    def __init__(self, marker_block, warmup):
+        self.marker_block = marker_block
+        self.warmup = warmup
+        self.started = time.perf_counter()
+        self.first_frame = None
+        self.arrivals = []
+        self.latencies = []
+        self.unreadable = 0
+        self.key_timestamps = set()
+        self.sizes = set()
+
+    def watch_keyframes(self, rtp_receiver, payload_types):
+        """包装 RTCRtpReceiver._handle_rtp_packet，按 RTP 时间戳统计关键帧"""
+        handle = rtp_receiver._handle_rtp_packet
+
+        async def handle_rtp_packet(packet, arrival_time_ms):
+            codec = payload_types.get(packet.payload_type)
+            if codec and packet.timestamp not in self.key_timestamps and _is_keyframe(codec, packet.payload):
+                self.key_timestamps.add(packet.timestamp)
+            return await handle(packet, arrival_time_ms)
+
+        rtp_receiver._handle_rtp_packet = handle_rtp_packet
+
+    async def consume(self, track, frame_marker):
+        import numpy as np
+
+        while True:
+            try:
+                frame = await track.recv()
+            except Exception:
+                return
+            now = time.perf_counter()
+            stamp_now = frame_marker.now_value()
+            if self.first_frame is None:
+                self.first_frame = now
+            self.arrivals.append(now)
+            self.sizes.add((frame.width, frame.height))
+            plane = frame.planes[0]
+            luma = np.frombuffer(plane, dtype=np.uint8).reshape(frame.height, plane.line_size)[:, :frame.width]
+            value = frame_marker.read(luma, self.marker_block)
+            latency = None if value is None else frame_marker.age_ms(value, stamp_now)
+            if latency is None or latency > MAX_PLAUSIBLE_LATENCY_MS:
+                self.unreadable += 1
+            elif now - self.first_frame >= self.warmup:
+                self.latencies.append(latency)
+
+    def summary(self, ended):
+        arrivals = [t for t in self.arrivals if t - self.first_frame >= self.warmup] if self.first_frame else []
+        gaps = [b - a for a, b in zip(arrivals, arrivals[1:])]
+        avg_gap = sum(gaps) / len(gaps) if gaps else 0.0
+        freeze_gap = max(3 * avg_gap, avg_gap + 0.150)
+        freezes = [g for g in gaps if g > freeze_gap]
+        window = ended - (self.first_frame + self.warmup) if self.first_frame else 0.0
+        latencies = sorted(self.latencies)
+        return {
+            'first_frame_ms': round((self.first_frame - self.started) * 1000.0, 1) if self.first_frame else None,
+            'frames': len(self.arrivals),
+            'fps': round(len(arrivals) / window, 1) if window > 0 else 0.0,
+            'latency_ms': {
+                'samples': len(latencies),
+                'p50': _percentile(latencies, 0.50),
+                'p95': _percentile(latencies, 0.95),
+                'p99': _percentile(latencies, 0.99),
+                'max': latencies[-1] if latencies else 0,
+            },
+            'freezes': len(freezes),
+            'freeze_total_ms': round(sum(freezes) * 1000.0, 1),
+            'max_gap_ms': round(max(gaps) * 1000.0, 1) if gaps else 0.0,
+            'key_frames': len(self.key_timestamps),
+            'unreadable_markers': self.unreadable,
+            'resolutions': sorted(f"{w}x{h}" for w, h in self.sizes),
+        }
+
+
+async def run(args, server_app, impairment):
+    from aiortc import RTCPeerConnection, RTCSessionDescription
+    from remote_control import frame_marker, metrics
+
+    server_loop = server_app.webrtc_loop
+    session = server_app.sessions.open(HARNESS_SID)
+    session.webrtc_scale = args.scale
+    step = max(1, int(round(1.0 / args.scale)))
+    receiver = Receiver(max(2, frame_marker.DEFAULT_BLOCK // step), args.warmup)
+
+    pc = RTCPeerConnection()
+    pc.addTransceiver('video', direction='recvonly')
+    tasks = []
+
+    @pc.on('track')
+    def _on_track(track):
+        if track.kind == 'video':
+            tasks.append(asyncio.ensure_future(receiver.consume(track, frame_marker)))
+
+    await pc.setLocalDescription(await pc.createOffer())
+
+    async def server_offer():
+        answer = await server_app._webrtc_handle_offer(HARNESS_SID, pc.localDescription.sdp, pc.localDescription.type)
+        for ice in _ice_transports(server_app.webrtc_peers[HARNESS_SID]):
+            impairment.install(ice)
+        return answer
+
+    answer = await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(server_offer(), server_loop))
+    uplink = Impairment(args.delay, args.jitter, args.loss / 100.0, 0, args.queue, seed=2) if args.symmetric else None
+    for rtp_receiver in pc.getReceivers():
+        receiver.watch_keyframes(rtp_receiver, _payload_types(answer['sdp']))
+    await pc.setRemoteDescription(RTCSessionDescription(sdp=answer['sdp'], type=answer['type']))
+    if uplink is not None:
+        for ice in _ice_transports(pc):
+            uplink.install(ice)
+
+    deadline = time.perf_counter() + STARTUP_TIMEOUT
+    while receiver.first_frame is None and time.perf_counter() < deadline:
+        await asyncio.sleep(0.05)
+    if receiver.first_frame is None:
+        await pc.close()
+        raise RuntimeError(f"{STARTUP_TIMEOUT:.0f} 秒内未收到视频帧（连接状态 {pc.connectionState}）")
+
+    await asyncio.sleep(args.warmup)
+    cpu0, wall0 = time.process_time(), time.perf_counter()
+    sent0 = await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(
+        _outbound_stats(server_app.webrtc_peers[HARNESS_SID]), server_loop))
+    for name in ('webrtc.capture_ms', 'webrtc.scale_ms', 'webrtc.convert_ms', 'webrtc.encode_ms', 'webrtc.send_ms',
+                 'webrtc.frame_age_ms'):
+        metrics.get_histogram(name).reset()
+
+    await asyncio.sleep(args.duration)
+
+    ended = time.perf_counter()
+    cpu = (time.process_time() - cpu0) / (ended - wall0) * 100.0
+    sent1 = await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(
+        _outbound_stats(server_app.webrtc_peers[HARNESS_SID]), server_loop))
+    inbound = {}
+    for stats in (await pc.getStats()).values():
+        if getattr(stats, 'type', '') == 'inbound-rtp':
+            inbound = {'packetsReceived': stats.packetsReceived, 'packetsLost': stats.packetsLost,
+                       'jitter': stats.jitter}
+
+    await asyncio.wrap_future(asyncio.run_coroutine_threadsafe(server_app._webrtc_close_peer(HARNESS_SID), server_loop))
+    await pc.close()
+    for task in tasks:
+        task.cancel()
+
+    snapshot = metrics.snapshot('webrtc.')
+    stages = {name[len('webrtc.'):]: {k: v for k, v in hist.items() if k != 'buckets'}
+              for name, hist in snapshot['histograms'].items()
+              if hist['count'] and name.split('.')[1] in ('capture_ms', 'scale_ms', 'convert_ms', 'encode_ms', 'send_ms', 'frame_age_ms')}
+    return {
+        'receiver': receiver.summary(ended),
+        'cpu_percent': round(cpu, 1),
+        'bitrate_kbps': round((sent1['bytesSent'] - sent0['bytesSent']) * 8 / 1000.0 / (ended - wall0), 1),
+        'packets_sent': sent1['packetsSent'] - sent0['packetsSent'],
+        'inbound': inbound,
+        'server_stages': stages,
+        'frames_dropped_age': snapshot['counters'].get('webrtc.frames_dropped_age', 0),
+        'frames_duplicated': snapshot['counters'].get('webrtc.frames_duplicated', 0),
+        'codec': server_app.codec_select.selected_codec() or server_app.webrtc_default_codec,
+        'impairment': impairment.stats(),
+    }
+
+
+def _print_report(report):
+    r = report['receiver']
+    lat = r['latency_ms']
+    print(f"  首帧           {r['first_frame_ms']} ms（offer 到首帧解码）")
+    print(f"  帧率           {r['fps']} 帧/秒（共 {r['frames']} 帧，分辨率 {', '.join(r['resolutions'])}）")
+    print(f"  帧延迟         p50 {lat['p50']}ms  p95 {lat['p95']}ms  p99 {lat['p99']}ms  max {lat['max']}ms"
+          f"（{lat['samples']} 个样本，{r['unreadable_markers']} 个条码无法解码）")
+    print(f"  卡顿           {r['freezes']} 次，共 {r['freeze_total_ms']}ms，最大帧间隔 {r['max_gap_ms']}ms")
+    print(f"  关键帧         {r['key_frames']}")
+    print(f"  编码器 / 码率  {report['codec']}  {report['bitrate_kbps']} kbps，{report['packets_sent']} 个包")
+    print(f"  CPU            {report['cpu_percent']}%（单核百分比，含接收端解码）")
+    if report['inbound']:
+        print(f"  接收端 RTP     收到 {report['inbound']['packetsReceived']}，丢失 {report['inbound']['packetsLost']}")
+    print(f"  损伤层         {report['impairment']}")
+    for name, hist in report['server_stages'].items():
+        print(f"  服务端 {name:<14} p50 {hist['p50']:7.2f}ms  p95 {hist['p95']:7.2f}ms  ({hist['count']} 次)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="WebRTC 端到端基准（进程内，带网络损伤）")
+    parser.add_argument('--resolution', default='1280x720', help="合成画面分辨率（宽x高）")
+    parser.add_argument('--content', default='gradient', help="合成画面类型: static / text / gradient / video")
+    parser.add_argument('--scale', type=float, default=None, help="WebRTC 推流缩放（默认会话默认值）")
+    parser.add_argument('--fps', type=int, default=None, help="捕获目标帧率（默认 server_app.webrtc_target_fps）")
+    parser.add_argument('--codec', default=None, help="首选编码器 H264 / VP8")
+    parser.add_argument('--duration', type=float, default=10.0, help="计时秒数")
+    parser.add_argument('--warmup', type=float, default=1.0, help="首帧后不计入统计的秒数")
+    parser.add_argument('--delay', type=float, default=0.0, help="单向延迟（毫秒）")
+    parser.add_argument('--jitter', type=float, default=0.0, help="抖动（± 毫秒，均匀分布）")
+    parser.add_argument('--loss', type=float, default=0.0, help="丢包率（百分比）")
+    parser.add_argument('--rate', type=float, default=0.0, help="带宽上限（kbps，0 为不限）")
+    parser.add_argument('--queue', type=float, default=200.0, help="带宽受限时的最大排队时长（毫秒）")
+    parser.add_argument('--symmetric', action='store_true', help="接收端发出的 RTCP 同样经过延迟/抖动/丢包")
+    parser.add_argument('--seed', type=int, default=1)
+    parser.add_argument('--output', help="结果 JSON 写入路径")
+    args = parser.parse_args()
+
+    width, height = (int(v) for v in args.resolution.lower().split('x'))
+    try:
+        from remote_control import server_app
+        from remote_control.synthetic_source import SyntheticSource
+    except Exception as e:
+        print(f"[✗] 导入失败: {e}")
+        sys.exit(1)
+    if not server_app.load_webrtc():
+        print("[✗] WebRTC 依赖不可用（需要 aiortc 与 av）")
+        sys.exit(1)
+
+    try:
+        import av.logging
+        av.logging.set_level(av.logging.ERROR)
+    except ImportError:
+        pass
+
+    server_app.synthetic_source = SyntheticSource(width, height, args.content, marker=True)
+    if args.fps:
+        server_app.webrtc_target_fps = args.fps
+    if args.codec:
+        server_app.webrtc_default_codec = args.codec.upper()
+    if args.scale is None:
+        args.scale = server_app.DEFAULT_WEBRTC_SCALE
+    server_app.ensure_webrtc_runtime()
+
+    impairment = Impairment(args.delay, args.jitter, args.loss / 100.0, args.rate, args.queue, args.seed)
+    print("=" * 80)
+    print(f"WebRTC 端到端基准：{width}x{height} {args.content}，缩放 {args.scale}，"
+          f"延迟 {args.delay}±{args.jitter}ms，丢包 {args.loss}%，带宽 {args.rate or '不限'} kbps，{args.duration}s")
+    print("=" * 80)
+    try:
+        report = asyncio.run(run(args, server_app, impairment))
+    except RuntimeError as e:
+        print(f"[✗] {e}")
+        sys.exit(1)
+    finally:
+        if server_app.webrtc_frame_pump is not None:
+            server_app.webrtc_frame_pump.stop()
+
+    report['config'] = {k: v for k, v in vars(args).items() if k != 'output'}
+    _print_report(report)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"\n结果已写入 {args.output}")
+    print("=" * 80)
+
+
+if __name__ == "__main__":
+    main()
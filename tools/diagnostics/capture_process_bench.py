@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+捕获进程基准（可在 Linux 上运行）
+在满载的捕获 + 编码负载下测量输入 处理函数 -> 注入 延迟，对比两种模式：
+- 进程内：捕获、缩放与 1080p JPEG 编码线程与 Socket.IO 处理函数共用一个解释器（GIL）
+- 捕获进程：同样的负载由 CaptureProcess 工作进程完成，控制进程只读取共享内存帧与 JPEG 结果
+
+使用合成画面（RC_CAPTURE_SOURCE=synthetic 的同一来源）与记录输入后端，不会移动鼠标。
+
+用法:
+    python tools/diagnostics/capture_process_bench.py [按键事件数] [负载线程数]
+"""
+
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+os.environ.setdefault("RC_INPUT_BACKEND", "recording")
+
+FRAME_SIZE = (1920, 1080)
+JPEG_QUALITY = 60
+
+
+def pick(samples, q):
+    return samples[min(len(samples) - 1, int(q * len(samples)))] if samples else 0.0
+
+
+def measure_input(server_app, input_backend, count):
+    """单客户端按键边沿：emit 时间与注入时间一一对应"""
+    inject_times = []
+    backend = input_backend.RecordingInputBackend(
+        on_inject=lambda now, events: inject_times.extend(now for e in events if e[0] == input_backend.INPUT_KEYBOARD))
+    input_backend.set_backend(backend)
+    server_app.get_input_sender().backend = backend
+
+    client = server_app.socketio.test_client(server_app.app)
+    emit_times = []
+    for i in range(count):
+        emit_times.append(time.perf_counter())
+        client.emit('key_event', {'key': 'a', 'action': 'down' if i % 2 == 0 else 'up'})
+        time.sleep(0.002)
+    deadline = time.perf_counter() + 10.0
+    while len(inject_times) < count and time.perf_counter() < deadline:
+        time.sleep(0.001)
+    client.disconnect()
+    return sorted((b - a) * 1000.0 for a, b in zip(emit_times, inject_times))
+
+
+def in_process_load(stop, counter):
+    """进程内负载：合成捕获 -> 隔行缩放 -> 1080p JPEG"""
+    import io
+
+    import numpy as np
+    from PIL import Image
+    from remote_control.synthetic_source import SyntheticSource
+
+    source = SyntheticSource(*FRAME_SIZE)
+    while not stop.is_set():
+        frame = source.grab()
+        np.ascontiguousarray(frame[::2, ::2, :])
+        buffer = io.BytesIO()
+        Image.fromarray(frame).save(buffer, format='JPEG', quality=JPEG_QUALITY)
+        counter[0] += 1
+
+
+def process_load(proc, stop, counter):
+    """捕获进程模式下控制进程的剩余工作：读共享内存帧、缩放、取 JPEG"""
+    import numpy as np
+
+    seq = 0
+    while not stop.is_set():
+        seq, frame, _ = proc.wait_newer(seq, 0.05)
+        if frame is not None:
+            np.ascontiguousarray(frame[::2, ::2, :])
+        if proc.encode_jpeg(JPEG_QUALITY):
+            counter[0] += 1
+
+
+def run_mode(name, server_app, input_backend, count, start_load):
+    stop = threading.Event()
+    counter = [0]
+    cleanup = start_load(stop, counter)
+    time.sleep(0.5)
+    started = time.perf_counter()
+    frames_before = counter[0]
+    latencies = measure_input(server_app, input_backend, count)
+    elapsed = time.perf_counter() - started
+    rate = (counter[0] - frames_before) / elapsed
+    stop.set()
+    if cleanup:
+        cleanup()
+    print(f"  {name:<8} 按键 emit -> 注入  p50 {pick(latencies, 0.50):7.3f}ms  p95 {pick(latencies, 0.95):7.3f}ms  "
+          f"p99 {pick(latencies, 0.99):7.3f}ms   编码 {rate:6.1f} 帧/秒")
+
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    threads = int(sys.argv[2]) if len(sys.argv) > 2 else 2
+
+    try:
+        from remote_control import input_backend, server_app
+        from remote_control.capture_process import CaptureProcess
+    except Exception as e:
+        print(f"[✗] 导入失败: {e}")
+        sys.exit(1)
+
+    def start_threads(target, *args):
+        def start(stop, counter):
+            workers = [threading.Thread(target=target, args=(*args, stop, counter), daemon=True)
+                       for _ in range(threads)]
+            for t in workers:
+                t.start()
+            return lambda: [t.join() for t in workers]
+        return start
+
+    def start_process(stop, counter):
+        proc = CaptureProcess(FRAME_SIZE, source='synthetic', fps=60)
+        proc.start()
+        proc.wait_newer(0, 10.0)
+        join = start_threads(process_load, proc)(stop, counter)
+        return lambda: (join(), proc.stop())
+
+    print("=" * 72)
+    print(f"捕获进程基准（{FRAME_SIZE[0]}x{FRAME_SIZE[1]} 合成画面，{threads} 个负载线程，{count} 个按键事件）")
+    print("=" * 72)
+    run_mode('空载', server_app, input_backend, count, lambda stop, counter: None)
+    run_mode('进程内', server_app, input_backend, count, start_threads(in_process_load))
+    run_mode('捕获进程', server_app, input_backend, count, start_process)
+    print("=" * 72)
+
+
+if __name__ == "__main__":
+    main()
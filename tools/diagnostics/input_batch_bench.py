@@ -0,0 +1,78 @@
+#!/usr/bin/env python3
+"""
+SendInput 批量注入基准测试
+对比逐个事件调用 SendInput（每次新建 INPUT 结构）与 InputSender.send_batch()
+使用预分配数组一次提交的事件吞吐量
+
+注入的是 0 像素相对移动事件，不会移动鼠标指针
+
+用法:
+    python tools/diagnostics/input_batch_bench.py [事件数]
+"""
+
+import ctypes
+import os
+import sys
+import time
+from ctypes import wintypes
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+
+try:
+    from remote_control import input_backend
+    from remote_control import input_sender as isend
+except Exception as e:
+    print(f"[✗] 导入失败（仅支持 Windows）: {e}")
+    sys.exit(1)
+
+
+def send_unbatched(count):
+    """旧实现：每个事件分配 INPUT 与 dwExtraInfo，单独调用一次 SendInput"""
+    backend = input_backend.get_backend()
+    for _ in range(count):
+        extra = ctypes.pointer(wintypes.ULONG(0))
+        inp = input_backend.INPUT()
+        inp.type = input_backend.INPUT_MOUSE
+        inp.mi.dx = 0
+        inp.mi.dy = 0
+        inp.mi.mouseData = 0
+        inp.mi.dwFlags = input_backend.MOUSEEVENTF_MOVE
+        inp.mi.time = 0
+        inp.mi.dwExtraInfo = extra
+        backend.SendInput(1, ctypes.pointer(inp), ctypes.sizeof(inp))
+
+
+def send_batched(count, batch_size):
+    sender = isend.get_input_sender()
+    events = [isend.mouse_event(0, 0, isend.MOUSEEVENTF_MOVE)] * batch_size
+    for _ in range(count // batch_size):
+        sender.send_batch(events)
+
+
+def measure(name, fn, count):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    rate = count / elapsed if elapsed > 0 else 0.0
+    print(f"  {name:<22} {rate:12,.0f} 事件/秒  ({elapsed * 1000.0:8.1f}ms)")
+    return rate
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    if input_backend.get_backend().name != 'windows':
+        print("[✗] 需要 Windows SendInput 后端（RC_INPUT_BACKEND=windows）")
+        sys.exit(1)
+
+    print("=" * 60)
+    print(f"SendInput 吞吐量测试（{count} 个事件）")
+    print("=" * 60)
+    baseline = measure("逐个调用 (旧实现)", lambda: send_unbatched(count), count)
+    measure("send_batch x1", lambda: send_batched(count, 1), count)
+    for size in (4, 16, input_backend.WindowsInputBackend.BATCH_CAPACITY):
+        n = count - count % size
+        rate = measure(f"send_batch x{size}", lambda: send_batched(n, size), n)
+        if baseline:
+            print(f"  {'':<22} 相对旧实现 {rate / baseline:5.1f}x")
+    print("=" * 60)
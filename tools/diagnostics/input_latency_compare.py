@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+输入通道延迟对比工具
+分别通过 Socket.IO 和 WebRTC DataChannel 向服务端发送 input_ping，
+统计往返时延（RTT）与丢包
+
+用法:
+    python tools/diagnostics/input_latency_compare.py [http://服务器IP:5000] [次数]
+
+依赖: python-socketio[client]（需要 websocket-client）, aiortc
+"""
+
+import asyncio
+import json
+import os
+import sys
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+VENDOR_DIR = os.path.join(ROOT, "vendor", "py312")
+if os.path.isdir(VENDOR_DIR) and VENDOR_DIR not in sys.path:
+    sys.path.insert(0, VENDOR_DIR)
+
+try:
+    import socketio
+    from aiortc import RTCConfiguration, RTCPeerConnection, RTCSessionDescription
+except ImportError as e:
+    print(f"[✗] 导入失败: {e}")
+    print("请运行: python -m pip install \"python-socketio[client]\" aiortc")
+    sys.exit(1)
+
+
+def summarize(name, samples, sent):
+    ok = sorted(s for s in samples if s is not None)
+    if not ok:
+        print(f"  {name:<12} 全部超时 ({sent} 次)")
+        return
+
+    def pick(q):
+        return ok[min(len(ok) - 1, int(q * len(ok)))]
+
+    print(f"  {name:<12} 收到 {len(ok)}/{sent}  "
+          f"p50 {pick(0.50):6.2f}ms  p95 {pick(0.95):6.2f}ms  p99 {pick(0.99):6.2f}ms  max {ok[-1]:6.2f}ms")
+
+
+async def run(url, count, interval):
+    loop = asyncio.get_running_loop()
+    sio = socketio.Client()
+    pending = {}
+
+    def resolve(transport, data):
+        fut = pending.pop((transport, (data or {}).get('id')), None)
+        if fut is not None:
+            rtt_ms = (time.perf_counter() - data['t']) * 1000.0
+            loop.call_soon_threadsafe(lambda: fut.done() or fut.set_result(rtt_ms))
+
+    answer_fut = loop.create_future()
+    sio.on('input_pong', lambda data: resolve('socketio', data))
+    sio.on('webrtc_answer', lambda data: loop.call_soon_threadsafe(
+        lambda: answer_fut.done() or answer_fut.set_result(data)))
+    sio.on('webrtc_error', lambda data: loop.call_soon_threadsafe(
+        lambda: answer_fut.done() or answer_fut.set_exception(RuntimeError(str(data)))))
+
+    print(f"[1/3] 连接 {url} ...")
+    await loop.run_in_executor(None, lambda: sio.connect(url, transports=['websocket']))
+
+    print("[2/3] 建立 WebRTC DataChannel ...")
+    pc = RTCPeerConnection(RTCConfiguration(iceServers=[]))
+    pc.addTransceiver('video', direction='recvonly')
+    channel = pc.createDataChannel('input-reliable', ordered=True)
+    opened = asyncio.Event()
+    channel.on('open', opened.set)
+
+    @channel.on('message')
+    def _on_message(message):
+        msg = json.loads(message)
+        if msg[0] == 'input_pong':
+            resolve('datachannel', msg[1])
+
+    await pc.setLocalDescription(await pc.createOffer())
+    sio.emit('webrtc_offer', {'sdp': pc.localDescription.sdp, 'type': pc.localDescription.type})
+    answer = await asyncio.wait_for(answer_fut, 10)
+    await pc.setRemoteDescription(RTCSessionDescription(sdp=answer['sdp'], type=answer['type']))
+    await asyncio.wait_for(opened.wait(), 10)
+
+    print(f"[3/3] 每个通道发送 {count} 次 input_ping ...")
+    results = {}
+    for transport in ('socketio', 'datachannel'):
+        samples = []
+        for i in range(count):
+            payload = {'id': i, 't': time.perf_counter()}
+            fut = loop.create_future()
+            pending[(transport, i)] = fut
+            if transport == 'socketio':
+                sio.emit('input_ping', payload)
+            else:
+                channel.send(json.dumps(['input_ping', payload]))
+            try:
+                samples.append(await asyncio.wait_for(fut, 1.0))
+            except asyncio.TimeoutError:
+                pending.pop((transport, i), None)
+                samples.append(None)
+            await asyncio.sleep(interval)
+        results[transport] = samples
+
+    print("\n" + "=" * 50)
+    for transport, samples in results.items():
+        summarize(transport, samples, count)
+    print("=" * 50)
+
+    await pc.close()
+    sio.disconnect()
+
+
+if __name__ == "__main__":
+    url = sys.argv[1] if len(sys.argv) > 1 else "http://127.0.0.1:5000"
+    count = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    asyncio.run(run(url, count, interval=0.01))
@@ -0,0 +1,139 @@
+#!/usr/bin/env python3
+"""
+输入路径基准测试（可在 Linux 上运行）
+使用记录后端（RC_INPUT_BACKEND=recording）代替 SendInput，通过 Flask-SocketIO 测试客户端
+驱动真实的 Socket.IO 处理函数，测量 处理函数 -> 注入 的延迟与吞吐
+
+用法:
+    python tools/diagnostics/input_path_bench.py [客户端数] [每客户端事件数]
+"""
+
+import os
+import sys
+import threading
+import time
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+os.environ.setdefault("RC_INPUT_BACKEND", "recording")
+
+try:
+    from remote_control import input_backend, input_protocol, metrics
+    from remote_control import server_app
+except Exception as e:
+    print(f"[✗] 导入失败: {e}")
+    sys.exit(1)
+
+
+def pick(samples, q):
+    return samples[min(len(samples) - 1, int(q * len(samples)))] if samples else 0.0
+
+
+def wait_injected(backend, total, timeout=10.0):
+    deadline = time.perf_counter() + timeout
+    while backend.total < total and time.perf_counter() < deadline:
+        time.sleep(0.001)
+
+
+def bench_latency(count):
+    """单客户端按键边沿：逐个对应 emit 时间与注入时间"""
+    inject_times = []
+    backend = input_backend.RecordingInputBackend(
+        on_inject=lambda now, events: inject_times.extend(now for e in events if e[0] == input_backend.INPUT_KEYBOARD))
+    input_backend.set_backend(backend)
+    server_app.get_input_sender().backend = backend
+
+    client = server_app.socketio.test_client(server_app.app)
+    emit_times = []
+    for i in range(count):
+        emit_times.append(time.perf_counter())
+        client.emit('key_event', {'key': 'a', 'action': 'down' if i % 2 == 0 else 'up'})
+        time.sleep(0.0005)
+    wait_injected(backend, count)
+    client.disconnect()
+
+    latencies = sorted((b - a) * 1000.0 for a, b in zip(emit_times, inject_times))
+    print(f"  按键 emit -> 注入   收到 {len(inject_times)}/{count}  "
+          f"p50 {pick(latencies, 0.50):.3f}ms  p95 {pick(latencies, 0.95):.3f}ms  "
+          f"p99 {pick(latencies, 0.99):.3f}ms")
+
+
+def bench_throughput(clients, per_client):
+    """多客户端并发：相对移动为主，夹杂点击"""
+    backend = input_backend.RecordingInputBackend()
+    input_backend.set_backend(backend)
+    server_app.get_input_sender().backend = backend
+    metrics.get_histogram('input.inject_latency_ms').reset()
+    merged_before = metrics.get_counter('input.moves_merged').value
+
+    test_clients = [server_app.socketio.test_client(server_app.app) for _ in range(clients)]
+    clicks = per_client // 20 * 2
+
+    def drive(client):
+        for i in range(per_client):
+            if i % 20 == 0:
+                client.emit('mouse_click', {'button': 'left', 'action': 'down'})
+                client.emit('mouse_click', {'button': 'left', 'action': 'up'})
+            client.emit('mouse_move_relative', {'dx': 1, 'dy': 1, 'raw': True})
+
+    start = time.perf_counter()
+    threads = [threading.Thread(target=drive, args=(c,)) for c in test_clients]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+    handled = time.perf_counter() - start
+    # 点击不会被合并，等待全部点击注入完成
+    deadline = time.perf_counter() + 10.0
+    while sum(1 for e in list(backend.events) if e[4] & input_backend.MOUSEEVENTF_LEFTUP) < clicks * clients // 2 \
+            and time.perf_counter() < deadline:
+        time.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    for c in test_clients:
+        c.disconnect()
+
+    emitted = clients * (per_client + clicks)
+    lat = metrics.get_histogram('input.inject_latency_ms').snapshot()
+    print(f"  并发 {clients} 客户端 x {per_client} 事件")
+    print(f"    处理吞吐  {emitted / handled:12,.0f} 事件/秒")
+    print(f"    端到端    {emitted / elapsed:12,.0f} 事件/秒  ({elapsed * 1000.0:.1f}ms)")
+    print(f"    注入事件  {backend.total} 个（合并 {metrics.get_counter('input.moves_merged').value - merged_before} 个移动）")
+    print(f"    入队->注入 p50 {lat['p50']:.3f}ms  p95 {lat['p95']:.3f}ms  p99 {lat['p99']:.3f}ms")
+
+
+def bench_protocol(count, per_frame=8):
+    """JSON 逐事件 vs 二进制批量帧：处理 CPU 时间与帧数"""
+    backend = input_backend.RecordingInputBackend()
+    input_backend.set_backend(backend)
+    server_app.get_input_sender().backend = backend
+    client = server_app.socketio.test_client(server_app.app)
+
+    start = time.process_time()
+    for _ in range(count):
+        client.emit('mouse_move_relative', {'dx': 1, 'dy': 1})
+    json_cpu = time.process_time() - start
+
+    frames = count // per_frame
+    now = time.time() * 1000.0
+    payload = input_protocol.encode([(input_protocol.MOVE_RELATIVE, 0, 1.0, 1.0, now)] * per_frame)
+    start = time.process_time()
+    for _ in range(frames):
+        client.emit('input_batch', payload)
+    binary_cpu = time.process_time() - start
+    client.disconnect()
+
+    print(f"  JSON   {count} 帧  {json_cpu / count * 1e6:8.1f}us/事件")
+    print(f"  二进制 {frames} 帧  {binary_cpu / (frames * per_frame) * 1e6:8.1f}us/事件  ({per_frame} 条/帧)")
+
+
+if __name__ == "__main__":
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 4
+    per_client = int(sys.argv[2]) if len(sys.argv) > 2 else 2000
+
+    print("=" * 60)
+    print(f"输入路径基准（后端: {input_backend.get_backend().name}）")
+    print("=" * 60)
+    bench_latency(1000)
+    bench_throughput(clients, per_client)
+    bench_protocol(per_client)
+    print("=" * 60)
@@ -0,0 +1,289 @@
+#!/usr/bin/env python3
+"""
+延迟探针自动化客户端
+按浏览器端同样的方式工作：接收 MJPEG / WebRTC 画面，解码左上角的时间条码（frame_marker.py），
+把 [条码值, 显示时刻] 经 Socket.IO latency_probe 事件回报，服务端计算捕获到显示延迟
+（probe.mjpeg_ms / probe.webrtc_ms，见 /api/metrics）。这里的“显示时刻”取解码完成时刻。
+
+服务端未开启探针时会发送 set_latency_probe 开启，结束后恢复。开关探针需要管理员会话：
+本机连接，或服务端设置了 RC_ADMIN_TOKEN 时用 --token 传入同一令牌。
+--spawn 在本机启动合成画面服务端子进程（RC_CAPTURE_SOURCE=synthetic，记录输入后端），
+无显示环境下也可运行。
+
+用法:
+    python tools/diagnostics/latency_probe_client.py [http://服务器IP:5000] [--transport mjpeg|webrtc|both] [--token 令牌]
+    python tools/diagnostics/latency_probe_client.py --spawn --duration 10 --output probe.json
+
+依赖: python-socketio[asyncio_client]（aiohttp）, Pillow, NumPy；WebRTC 另需 aiortc
+"""
+
+import argparse
+import asyncio
+import io
+import json
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+SRC_DIR = os.path.join(ROOT, "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+VENDOR_DIR = os.path.join(ROOT, "vendor", "py312")
+if os.name == 'nt' and os.path.isdir(VENDOR_DIR) and VENDOR_DIR not in sys.path:
+    sys.path.insert(0, VENDOR_DIR)
+
+try:
+    import aiohttp
+    import numpy as np
+    import socketio
+    from PIL import Image
+except ImportError as e:
+    print(f"[✗] 导入失败: {e}")
+    print("请运行: python -m pip install \"python-socketio[asyncio_client]\" pillow numpy")
+    sys.exit(1)
+
+from remote_control import frame_marker
+
+CLOCK_SYNC_SAMPLES = 8
+REPORT_INTERVAL = 0.5
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(port, content, timeout=30.0):
+    env = dict(os.environ, RC_INPUT_BACKEND="recording", RC_PORT=str(port), RC_CAPTURE_SOURCE="synthetic",
+               RC_SYNTHETIC_CONTENT=content, RC_LATENCY_PROBE="1")
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, "server.py")], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"服务端启动失败（退出码 {proc.returncode}）")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/api/info", timeout=1).read()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError("服务端启动超时")
+
+
+class ProbeClient:
+    """Socket.IO 连接：时钟同步、探针开关与样本回报"""
+
+    def __init__(self, url, token=None):
+        self.url = url.rstrip('/')
+        self.token = token
+        self.sio = socketio.AsyncClient()
+        self.screen_width = 0
+        self.probe_state = None
+        self.stats = {}
+        self.offset = 0.0
+        self.samples = {'mjpeg': [], 'webrtc': []}
+        self.decoded = {'mjpeg': 0, 'webrtc': 0}
+        self._events = {}
+        for name in ('connected', 'latency_probe_state', 'clock_sync', 'webrtc_answer', 'webrtc_error'):
+            self.sio.on(name, self._handler(name))
+        self.sio.on('latency_probe_stats', self._on_stats)
+
+    def _handler(self, name):
+        async def handler(data=None):
+            if name == 'connected':
+                self.screen_width = data['screen_width']
+            elif name == 'latency_probe_state':
+                self.probe_state = data
+            waiter = self._events.pop(name, None)
+            if waiter is not None and not waiter.done():
+                waiter.set_result(data)
+        return handler
+
+    async def _on_stats(self, data):
+        self.stats = data or {}
+
+    def expect(self, name):
+        self._events[name] = asyncio.get_running_loop().create_future()
+        return self._events[name]
+
+    async def connect(self):
+        connected = self.expect('connected')
+        await self.sio.connect(self.url, transports=['websocket'], auth={'token': self.token} if self.token else None)
+        await asyncio.wait_for(connected, 10)
+        await self.sync_clock()
+
+    async def sync_clock(self):
+        """与 app.js 相同：取往返时间最短的样本估计服务端时钟偏移"""
+        best = None
+        for _ in range(CLOCK_SYNC_SAMPLES):
+            reply = self.expect('clock_sync')
+            t0 = time.time() * 1000.0
+            await self.sio.emit('clock_sync', {'t0': t0})
+            data = await asyncio.wait_for(reply, 5)
+            t1 = time.time() * 1000.0
+            if best is None or t1 - t0 < best[0]:
+                best = (t1 - t0, data['ts'] - (t0 + t1) / 2)
+            await asyncio.sleep(0.02)
+        self.offset = best[1]
+
+    async def set_probe(self, enabled):
+        state = self.expect('latency_probe_state')
+        await self.sio.emit('set_latency_probe', {'enabled': enabled})
+        data = await asyncio.wait_for(state, 5)
+        if (data or {}).get('error') == 'forbidden':
+            raise RuntimeError("无权开关延迟探针：请在服务端本机运行，或用 --token 传入 RC_ADMIN_TOKEN")
+
+    def record(self, transport, luma, recording):
+        """解码一帧的条码；recording 为 False（预热阶段）时只计数不回报"""
+        block = round(frame_marker.DEFAULT_BLOCK * luma.shape[1] / max(1, self.screen_width))
+        value = frame_marker.read(luma, block)
+        if value is None:
+            return
+        self.decoded[transport] += 1
+        if recording:
+            self.samples[transport].append([value, time.time() * 1000.0 + self.offset])
+
+    async def report(self):
+        for transport, samples in self.samples.items():
+            if samples:
+                self.samples[transport] = []
+                await self.sio.emit('latency_probe', {'transport': transport, 'samples': samples})
+
+    async def report_loop(self, stop):
+        while not stop.is_set():
+            await asyncio.sleep(REPORT_INTERVAL)
+            await self.report()
+
+
+async def run_mjpeg(client, stop, recording):
+    url = f"{client.url}/video?sid={client.sio.get_sid()}"
+    async with aiohttp.ClientSession() as http:
+        async with http.get(url) as resp:
+            reader = resp.content
+            while not stop.is_set():
+                line = await reader.readline()
+                if not line:
+                    break
+                if not line.lower().startswith(b'content-length:'):
+                    continue
+                length = int(line.split(b':', 1)[1])
+                await reader.readline()
+                data = await reader.readexactly(length)
+                luma = np.asarray(Image.open(io.BytesIO(data)).convert('L'))
+                client.record('mjpeg', luma, recording.is_set())
+
+
+async def run_webrtc(client, stop, recording):
+    from aiortc import RTCConfiguration, RTCPeerConnection, RTCSessionDescription
+
+    pc = RTCPeerConnection(RTCConfiguration(iceServers=[]))
+    pc.addTransceiver('video', direction='recvonly')
+    track_fut = asyncio.get_running_loop().create_future()
+    pc.on('track', lambda track: track_fut.done() or track_fut.set_result(track))
+    try:
+        await pc.setLocalDescription(await pc.createOffer())
+        answer = client.expect('webrtc_answer')
+        await client.sio.emit('webrtc_offer', {'sdp': pc.localDescription.sdp, 'type': pc.localDescription.type})
+        data = await asyncio.wait_for(answer, 15)
+        await pc.setRemoteDescription(RTCSessionDescription(sdp=data['sdp'], type=data['type']))
+        track = await asyncio.wait_for(track_fut, 10)
+        while not stop.is_set():
+            frame = await asyncio.wait_for(track.recv(), 5)
+            luma = frame.to_ndarray(format='yuv420p')[:frame.height]
+            client.record('webrtc', luma, recording.is_set())
+    finally:
+        await pc.close()
+
+
+async def run(url, transports, duration, warmup, token=None):
+    client = ProbeClient(url, token)
+    print(f"[1/3] 连接 {url} ...")
+    await client.connect()
+    print(f"      时钟偏移 {client.offset:+.1f}ms，屏幕宽度 {client.screen_width}")
+    was_enabled = bool(client.probe_state and client.probe_state.get('enabled'))
+    if not was_enabled:
+        try:
+            await client.set_probe(True)
+        except RuntimeError:
+            await client.sio.disconnect()
+            raise
+
+    results = {}
+    try:
+        for transport in transports:
+            print(f"[2/3] {transport}: 预热 {warmup:.0f}s，采样 {duration:.0f}s ...")
+            stop = asyncio.Event()
+            recording = asyncio.Event()
+            runner = run_mjpeg if transport == 'mjpeg' else run_webrtc
+            task = asyncio.create_task(runner(client, stop, recording))
+            reporter = asyncio.create_task(client.report_loop(stop))
+            await asyncio.sleep(warmup)
+            recording.set()
+            await asyncio.sleep(duration)
+            stop.set()
+            await asyncio.gather(task, reporter, return_exceptions=True)
+            if task.done() and task.exception() is not None:
+                print(f"      {transport} 失败: {task.exception()!r}")
+            await client.report()
+            # 等待最后一次回报的统计回包
+            await asyncio.sleep(REPORT_INTERVAL)
+            results[transport] = dict(client.stats.get(transport, {}), decoded=client.decoded[transport])
+    finally:
+        if not was_enabled:
+            await client.set_probe(False)
+        await client.sio.disconnect()
+
+    print("\n[3/3] 捕获到显示延迟（服务端统计，含本次运行前已有样本）")
+    print("=" * 60)
+    for transport, stats in results.items():
+        if stats.get('count'):
+            print(f"  {transport:<7} 样本 {stats['count']:5d}  p50 {stats['p50']:7.1f}ms  "
+                  f"p95 {stats['p95']:7.1f}ms  p99 {stats['p99']:7.1f}ms")
+        else:
+            print(f"  {transport:<7} 无有效样本（解码 {stats['decoded']} 帧）")
+    print("=" * 60)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description="延迟探针自动化客户端")
+    parser.add_argument("url", nargs="?", default="http://127.0.0.1:5000")
+    parser.add_argument("--transport", choices=("mjpeg", "webrtc", "both"), default="both")
+    parser.add_argument("--duration", type=float, default=10.0, help="每种传输的采样时长（秒）")
+    parser.add_argument("--warmup", type=float, default=2.0, help="采样前的预热时长（秒），期间样本不回报")
+    parser.add_argument("--spawn", action="store_true", help="启动本机合成画面服务端子进程")
+    parser.add_argument("--content", default="gradient", help="--spawn 时的合成画面类型")
+    parser.add_argument("--output", help="结果写入 JSON 文件")
+    parser.add_argument("--token", default=os.getenv("RC_ADMIN_TOKEN"), help="管理员令牌（服务端 RC_ADMIN_TOKEN）")
+    args = parser.parse_args()
+
+    transports = ('mjpeg', 'webrtc') if args.transport == 'both' else (args.transport,)
+    proc = None
+    url = args.url
+    if args.spawn:
+        port = free_port()
+        proc = start_server(port, args.content)
+        url = f"http://127.0.0.1:{port}"
+    try:
+        results = asyncio.run(run(url, transports, args.duration, args.warmup, args.token))
+    except RuntimeError as e:
+        print(f"[✗] {e}")
+        sys.exit(1)
+    finally:
+        if proc is not None:
+            proc.terminate()
+            proc.wait(10)
+    if args.output:
+        with open(args.output, 'w', encoding='utf-8') as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+        print(f"结果已写入 {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+服务模式对比基准（可在 Linux 上运行）
+分别以 threading（Flask-SocketIO）与 async（aiohttp + AsyncServer）模式启动服务端子进程
+（记录输入后端，不会移动鼠标），用多个 Socket.IO 客户端并发测量：
+- 处理函数往返时延：clock_sync 请求 -> 回包 的 p50/p95/p99
+- 输入事件吞吐：每个客户端连发相对移动，最后以 input_ping 确认全部处理完毕
+
+用法:
+    python tools/diagnostics/server_mode_bench.py [客户端数] [每客户端往返次数] [每客户端事件数]
+
+依赖: python-socketio[asyncio_client]（aiohttp）
+"""
+
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+import urllib.request
+
+ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", ".."))
+
+try:
+    import socketio
+    import aiohttp  # noqa: F401
+except ImportError as e:
+    print(f"[✗] 导入失败: {e}")
+    print("请运行: python -m pip install \"python-socketio[asyncio_client]\"")
+    sys.exit(1)
+
+
+def pick(samples, q):
+    return samples[min(len(samples) - 1, int(q * len(samples)))] if samples else 0.0
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+def start_server(mode, port, timeout=30.0):
+    env = dict(os.environ, RC_INPUT_BACKEND="recording", RC_PORT=str(port), RC_SERVER_MODE=mode)
+    proc = subprocess.Popen([sys.executable, os.path.join(ROOT, "server.py")], env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{mode} 模式服务端启动失败（退出码 {proc.returncode}）")
+        try:
+            urllib.request.urlopen(f"http://127.0.0.1:{port}/api/info", timeout=1).read()
+            return proc
+        except OSError:
+            time.sleep(0.2)
+    proc.kill()
+    raise RuntimeError(f"{mode} 模式服务端启动超时")
+
+
+class BenchClient:
+    def __init__(self):
+        self.sio = socketio.AsyncClient()
+        self.waiter = None
+        self.sio.on('clock_sync', self._reply)
+        self.sio.on('input_pong', self._reply)
+
+    def _reply(self, data):
+        if self.waiter is not None and not self.waiter.done():
+            self.waiter.set_result(time.perf_counter())
+
+    async def request(self, event, payload):
+        self.waiter = asyncio.get_running_loop().create_future()
+        sent = time.perf_counter()
+        await self.sio.emit(event, payload)
+        return (await asyncio.wait_for(self.waiter, 10.0)) - sent
+
+
+async def run_clients(url, clients, rounds, per_client):
+    bench = [BenchClient() for _ in range(clients)]
+    await asyncio.gather(*(c.sio.connect(url, transports=['websocket']) for c in bench))
+
+    async def ping_loop(c):
+        samples = []
+        for _ in range(rounds):
+            samples.append(await c.request('clock_sync', {'t0': time.time() * 1000.0}) * 1000.0)
+        return samples
+
+    rtts = sorted(s for r in await asyncio.gather(*(ping_loop(c) for c in bench)) for s in r)
+
+    async def flood(c):
+        for _ in range(per_client):
+            await c.sio.emit('mouse_move_relative', {'dx': 1, 'dy': 1, 'raw': True})
+        # 同一连接上的事件按顺序处理，收到回显即代表前面的事件都已处理
+        await c.request('input_ping', {})
+
+    start = time.perf_counter()
+    await asyncio.gather(*(flood(c) for c in bench))
+    elapsed = time.perf_counter() - start
+
+    await asyncio.gather(*(c.sio.disconnect() for c in bench))
+    return rtts, clients * per_client / elapsed
+
+
+def bench_mode(mode, clients, rounds, per_client):
+    port = free_port()
+    proc = start_server(mode, port)
+    try:
+        rtts, rate = asyncio.run(run_clients(f"http://127.0.0.1:{port}", clients, rounds, per_client))
+    finally:
+        proc.terminate()
+        try:
+            proc.wait(5)
+        except subprocess.TimeoutExpired:
+            proc.kill()
+    print(f"  {mode:<10} 往返 p50 {pick(rtts, 0.50):7.3f}ms  p95 {pick(rtts, 0.95):7.3f}ms  "
+          f"p99 {pick(rtts, 0.99):7.3f}ms   输入 {rate:10,.0f} 事件/秒")
+
+
+if __name__ == "__main__":
+    clients = int(sys.argv[1]) if len(sys.argv) > 1 else 12
+    rounds = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    per_client = int(sys.argv[3]) if len(sys.argv) > 3 else 1000
+
+    print("=" * 60)
+    print(f"服务模式对比（{clients} 客户端，每客户端 {rounds} 次往返 / {per_client} 个输入事件）")
+    print("=" * 60)
+    for mode in ('threading', 'async'):
+        try:
+            bench_mode(mode, clients, rounds, per_client)
+        except Exception as e:
+            print(f"  {mode:<10} 失败: {e}")
+    print("=" * 60)